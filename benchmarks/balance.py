@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Time the shard balance analysis and plan on a large synthetic cluster.
+
+    python benchmarks/balance.py [--shards 500000] [--nodes 200]
+"""
+
+import argparse
+import random
+import time
+
+from escli.balance import BalancePlanner, ShardTable, skew
+
+
+def cat_shards(shards, nodes):
+    rows = []
+    index = 0
+
+    while len(rows) < shards:
+        primaries = random.choice([1, 3, 5, 10])
+        # Skewed placement, a few nodes hold most of the shards
+        for shard in range(primaries):
+            holders = random.sample(range(nodes), 2)
+            if random.random() < 0.3:
+                holders[0] = random.randrange(nodes // 10)
+            if holders[0] == holders[1]:
+                holders[1] = (holders[1] + 1) % nodes
+            for copy, node in enumerate(holders):
+                rows.append({
+                    'index': 'logs-{:06d}'.format(index),
+                    'shard': str(shard),
+                    'prirep': 'p' if copy == 0 else 'r',
+                    'state': 'STARTED',
+                    'store': str(random.randint(10 ** 6, 5 * 10 ** 10)),
+                    'node': 'node-{:03d}'.format(node),
+                })
+        index += 1
+
+    return rows[:shards]
+
+
+def cat_allocation(nodes):
+    return [{
+        'node': 'node-{:03d}'.format(node),
+        'disk.used': '0',
+        'disk.total': str(10 ** 14),
+    } for node in range(nodes)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', type=int, default=500000)
+    parser.add_argument('--nodes', type=int, default=200)
+    parser.add_argument('--moves', type=int, default=1000)
+    args = parser.parse_args()
+
+    shards = cat_shards(args.shards, args.nodes)
+    allocation = cat_allocation(args.nodes)
+
+    for by in ['shards', 'disk']:
+        start = time.perf_counter()
+        table = ShardTable.from_cat(shards, allocation)
+        loaded = time.perf_counter()
+        loads = table.loads()
+        table.hot_spots()
+        analyzed = time.perf_counter()
+        moves = BalancePlanner(table, by=by, max_moves=args.moves).plan()
+        planned = time.perf_counter()
+
+        print('{:<6} load {:6.0f}ms  analyze {:6.0f}ms  plan {:6.0f}ms'
+              '  {} moves, skew {:.1%}'.format(
+                  by,
+                  (loaded - start) * 1000,
+                  (analyzed - loaded) * 1000,
+                  (planned - analyzed) * 1000,
+                  len(moves),
+                  skew(loads[0 if by == 'shards' else 2])
+              ))
+
+
+if __name__ == '__main__':
+    main()
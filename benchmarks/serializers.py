@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""Compare json and orjson on large Elasticsearch responses.
+
+    python benchmarks/serializers.py [response.json ...]
+
+Pass recorded responses (e.g. saved `_cat/shards?format=json`,
+`_cluster/stats` or `_cluster/state` bodies). Without files, synthetic
+`cat shards` and `cluster state` like responses are generated.
+"""
+
+import argparse
+import json
+import random
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def cat_shards(count):
+    return [{
+        'index': 'logs-{:04d}'.format(n // 10),
+        'shard': str(n % 10),
+        'prirep': random.choice(['p', 'r']),
+        'state': 'STARTED',
+        'docs': str(random.randint(0, 10 ** 8)),
+        'store': '{:.1f}gb'.format(random.random() * 50),
+        'ip': '10.0.{}.{}'.format(n % 250, n % 200),
+        'node': 'node-{:03d}'.format(n % 90),
+    } for n in range(count)]
+
+
+def cluster_state(indices):
+    return {
+        'cluster_name': 'benchmark',
+        'metadata': {'indices': dict(
+            ('logs-{:04d}'.format(n), {
+                'state': 'open',
+                'settings': {'index': {
+                    'number_of_shards': '10',
+                    'number_of_replicas': '1',
+                    'refresh_interval': '30s',
+                    'uuid': '{:032x}'.format(random.getrandbits(128)),
+                }},
+                'mappings': {'properties': dict(
+                    ('field_{}'.format(f), {'type': 'keyword'})
+                    for f in range(50)
+                )},
+            }) for n in range(indices)
+        )},
+    }
+
+
+def measure(function, argument, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    samples = []
+    for path in args.files:
+        with open(path, 'rb') as response_file:
+            samples.append((path, response_file.read().decode('utf-8')))
+
+    if not samples:
+        samples = [
+            ('cat shards (200k)', json.dumps(cat_shards(200000))),
+            ('cluster state (2k indices)', json.dumps(cluster_state(2000))),
+        ]
+
+    print('{:<30} {:>8} {:>12} {:>12} {:>12} {:>12}'.format(
+        'Response', 'MB', 'json load', 'orjson load', 'json dump',
+        'orjson dump'
+    ))
+
+    for name, raw in samples:
+        data = json.loads(raw)
+        results = [
+            measure(json.loads, raw, args.runs),
+            measure(orjson.loads, raw, args.runs) if orjson else None,
+            measure(json.dumps, data, args.runs),
+            measure(orjson.dumps, data, args.runs) if orjson else None,
+        ]
+        print('{:<30} {:>8.1f} {}'.format(
+            name,
+            len(raw) / 1024 / 1024,
+            ' '.join(
+                '{:>10.1f}ms'.format(result) if result is not None
+                else '{:>12}'.format('-')
+                for result in results
+            )
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""Track escli cold-start time.
+
+Runs a few escli invocations in fresh interpreters and reports the wall
+time and the number of imported modules for each of them.
+
+    python benchmarks/startup.py [-n RUNS] [-e http://localhost:9200]
+
+`cluster health` needs a reachable cluster to measure the full path; when
+none is available it still measures startup up to the connection error.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+RUNNER = """
+import atexit
+import sys
+
+atexit.register(
+    lambda: sys.stderr.write('\\nescli-bench-modules %d\\n' % len(sys.modules))
+)
+
+from escli.main import main
+sys.exit(main(sys.argv[1:]))
+"""
+
+SCENARIOS = [
+    ('escli --version', ['--version']),
+    ('escli cluster health', ['cluster', 'health']),
+]
+
+
+def run_once(argv):
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-c', RUNNER] + argv,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+    elapsed = time.perf_counter() - start
+
+    modules = None
+    for line in process.stderr.splitlines():
+        if line.startswith('escli-bench-modules '):
+            modules = int(line.split()[1])
+
+    return elapsed, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('-e', '--elasticsearch', default=None)
+    args = parser.parse_args()
+
+    print('{:<25} {:>10} {:>10} {:>10}'.format(
+        'Scenario', 'Median ms', 'Min ms', 'Modules'
+    ))
+
+    for name, argv in SCENARIOS:
+        if args.elasticsearch and argv != ['--version']:
+            argv = ['-e', args.elasticsearch] + argv
+
+        # Warm up the filesystem cache and bytecode files
+        run_once(argv)
+
+        timings = []
+        modules = None
+        for _ in range(args.runs):
+            elapsed, modules = run_once(argv)
+            timings.append(elapsed * 1000)
+
+        print('{:<25} {:>10.1f} {:>10.1f} {:>10}'.format(
+            name,
+            statistics.median(timings),
+            min(timings),
+            modules if modules is not None else '-'
+        ))
+
+
+if __name__ == '__main__':
+    main()
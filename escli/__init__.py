@@ -0,0 +1,2 @@
+__project__ = 'Escli'
+__version__ = '1.0'
@@ -1,9 +1,13 @@
 import logging
+import sys
 
 from cliff.command import Command
 from cliff.lister import Lister
 from cliff.show import ShowOne
 from escli.main import Escli
+from escli.progress import Progress, format_duration
+from escli.snapshot import RecoveryFollower, RetentionRule, \
+    SnapshotFollower, SnapshotPruner, expired_snapshots, restored_indices
 from escli.utils import Color, JSONFormatter, print_output, colorize
 
 
@@ -84,6 +88,14 @@ class SnapshotCreate(Command):
 
         print_output(status.get('accepted'))
 
+        if parsed_args.follow:
+            SnapshotFollower(
+                Escli._es,
+                parsed_args.repository,
+                parsed_args.name,
+                slowest=parsed_args.slowest
+            ).follow(parsed_args.interval)
+
     def build_body(self, parsed_args):
         return {
             'ignore_unavailable': parsed_args.ignore_unavailable,
@@ -108,6 +120,26 @@ class SnapshotCreate(Command):
             choices=[True, False],
             default=True
         )
+        parser.add_argument(
+            '--follow',
+            action='store_true',
+            help=("Report bytes, files and throughput per index and node"
+                  " until the snapshot ends")
+        )
+        parser.add_argument(
+            '--interval',
+            action='store',
+            type=float,
+            default=5,
+            help=("Seconds between two progress reports (Default: 5)")
+        )
+        parser.add_argument(
+            '--slowest',
+            action='store',
+            type=int,
+            default=5,
+            help=("Number of slowest running shards to report (Default: 5)")
+        )
         parser.add_argument(
             '-r', '--repository',
             action='store',
@@ -151,6 +183,128 @@ class SnapshotDelete(Command):
         return parser
 
 
+class SnapshotPrune(Lister):
+    """Delete the snapshots expired by retention rules."""
+
+    log = logging.getLogger(__name__)
+
+    def take_action(self, parsed_args):
+        try:
+            rules = [RetentionRule.parse(rule) for rule in parsed_args.rule]
+        except ValueError as err:
+            self.log.critical(err)
+            sys.exit(1)
+
+        snapshots = Escli._es.cat.snapshots(
+            repository=parsed_args.repository,
+            format="json",
+            h='id,status,start_epoch,end_epoch'
+        )
+        expired = expired_snapshots(snapshots, rules)
+        results = {}
+
+        if parsed_args.dry_run:
+            self.log.info('{} of {} snapshots would be deleted'.format(
+                len(expired),
+                len(snapshots)
+            ))
+        elif expired:
+            results = self.prune(
+                parsed_args,
+                [snapshot.get('id') for snapshot, _, _ in expired]
+            )
+
+        return (
+            ('Snapshot', 'Rule', 'Reason', 'Result'),
+            (
+                (
+                    snapshot.get('id'),
+                    str(rule),
+                    reason,
+                    results.get(snapshot.get('id'), 'dry run')
+                )
+                for snapshot, rule, reason in expired
+            )
+        )
+
+    def prune(self, parsed_args, names):
+        pruner = SnapshotPruner(
+            Escli._es,
+            parsed_args.repository,
+            batch_size=parsed_args.batch_size,
+            workers=parsed_args.workers,
+            max_retries=parsed_args.max_retries
+        )
+        progress = Progress(total=len(names))
+        results = {}
+
+        for name, error in pruner.delete(names):
+            if error is None:
+                results[name] = 'deleted'
+            else:
+                results[name] = colorize(error, Color.RED)
+                self.log.error('Cannot delete {} : {}'.format(name, error))
+
+            progress.update(len(results))
+            self.log.info('{}/{} snapshots - ETA {}'.format(
+                len(results),
+                len(names),
+                format_duration(progress.eta)
+            ))
+
+        return results
+
+    def get_parser(self, prog_name):
+        parser = super(SnapshotPrune, self).get_parser(prog_name)
+        parser.add_argument(
+            '-r', '--repository',
+            action='store',
+            help='Repository',
+            required=True
+        )
+        parser.add_argument(
+            '--rule',
+            action='append',
+            required=True,
+            metavar='<pattern>:<conditions>',
+            help=("Retention rule, e.g. 'nightly-*:keep=30' or"
+                  " 'hourly-*:keep=24,age=2d'. Snapshots beyond the keep"
+                  " most recent or older than age are deleted. A snapshot"
+                  " follows the first rule it matches, snapshots matching"
+                  " none are kept. Can be repeated")
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help=("List the snapshots to delete without deleting them")
+        )
+        parser.add_argument(
+            '--batch-size',
+            action='store',
+            type=int,
+            default=50,
+            help=("Snapshots per delete request when the cluster can"
+                  " delete several at once (Default: 50)")
+        )
+        parser.add_argument(
+            '--workers',
+            action='store',
+            type=int,
+            default=2,
+            help=("Parallel deletes on clusters deleting one snapshot per"
+                  " request (Default: 2)")
+        )
+        parser.add_argument(
+            '--max-retries',
+            action='store',
+            type=int,
+            default=10,
+            help=("Retries of a delete refused because another snapshot"
+                  " operation is running (Default: 10)")
+        )
+        return parser
+
+
 class SnapshotList(Lister):
     """List snapshots."""
 
@@ -213,10 +367,72 @@ class SnapshotRestore(Command):
         ret = Escli._es.snapshot.restore(
             repository=parsed_args.repository,
             snapshot=parsed_args.snapshot,
+            body=self.build_body(parsed_args),
             format="json"
         )
         print(ret)
 
+        if not parsed_args.follow and parsed_args.replicas_after is None:
+            return
+
+        indices = self.indices(parsed_args)
+        if not indices:
+            self.log.warning('No index of {} is restored, nothing to follow'
+                             .format(parsed_args.snapshot))
+            return
+
+        follower = RecoveryFollower(Escli._es, indices)
+
+        if parsed_args.replicas_after is None:
+            follower.follow('green', parsed_args.interval)
+            return
+
+        # Primaries are restored, replicas are copied from them
+        follower.follow('yellow', parsed_args.interval)
+        self.log.info('Primaries restored, setting {} replicas'.format(
+            parsed_args.replicas_after
+        ))
+        for batch in follower.batches:
+            Escli._es.indices.put_settings(
+                index=batch,
+                body={'index.number_of_replicas': parsed_args.replicas_after}
+            )
+
+        if parsed_args.follow:
+            follower.follow('green', parsed_args.interval)
+
+    def build_body(self, parsed_args):
+        body = {}
+        index_settings = dict(
+            setting.split('=', 1) for setting in parsed_args.index_setting
+        )
+
+        if parsed_args.replicas_after is not None:
+            index_settings['index.number_of_replicas'] = 0
+        if parsed_args.indices:
+            body['indices'] = parsed_args.indices
+        if parsed_args.rename_pattern:
+            body['rename_pattern'] = parsed_args.rename_pattern
+            body['rename_replacement'] = parsed_args.rename_replacement
+        if index_settings:
+            body['index_settings'] = index_settings
+
+        return body
+
+    def indices(self, parsed_args):
+        snapshot = Escli._es.snapshot.get(
+            repository=parsed_args.repository,
+            snapshot=parsed_args.snapshot,
+            filter_path='snapshots.indices'
+        ).get('snapshots')[0]
+
+        return restored_indices(
+            snapshot.get('indices'),
+            parsed_args.indices.split(',') if parsed_args.indices else None,
+            parsed_args.rename_pattern,
+            parsed_args.rename_replacement
+        )
+
     def get_parser(self, prog_name):
         parser = super(SnapshotRestore, self).get_parser(prog_name)
         parser.add_argument(
@@ -225,6 +441,54 @@ class SnapshotRestore(Command):
             help='Repository',
             required=True
         )
+        parser.add_argument(
+            '--indices',
+            action='store',
+            metavar='<indices>',
+            help=("Comma separated indices to restore, wildcards and"
+                  " '-' exclusions allowed (Default: all)")
+        )
+        parser.add_argument(
+            '--rename-pattern',
+            action='store',
+            metavar='<regex>',
+            help=("Regular expression matching the restored index names")
+        )
+        parser.add_argument(
+            '--rename-replacement',
+            action='store',
+            metavar='<replacement>',
+            help=("Replacement of --rename-pattern, e.g. 'restored-$1'")
+        )
+        parser.add_argument(
+            '--index-setting',
+            action='append',
+            default=[],
+            metavar='<key>=<value>',
+            help=("Index setting overridden on the restored indices, can be"
+                  " repeated")
+        )
+        parser.add_argument(
+            '--replicas-after',
+            action='store',
+            type=int,
+            metavar='<n>',
+            help=("Restore without replicas and set <n> replicas once the"
+                  " primaries are restored")
+        )
+        parser.add_argument(
+            '--follow',
+            action='store_true',
+            help=("Report the recovery throughput of the restored indices"
+                  " until they are green")
+        )
+        parser.add_argument(
+            '--interval',
+            action='store',
+            type=float,
+            default=5,
+            help=("Seconds between two progress reports (Default: 5)")
+        )
         parser.add_argument(
             "snapshot",
             metavar="<snapshot>",
@@ -239,6 +503,14 @@ class SnapshotShow(ShowOne):
     log = logging.getLogger(__name__)
 
     def take_action(self, parsed_args):
+        if parsed_args.follow:
+            SnapshotFollower(
+                Escli._es,
+                parsed_args.repository,
+                parsed_args.snapshot,
+                slowest=parsed_args.slowest
+            ).follow(parsed_args.interval)
+
         self.snapshot = Escli._es.snapshot.get(
             repository=parsed_args.repository,
             snapshot=parsed_args.snapshot,
@@ -323,4 +595,24 @@ class SnapshotShow(ShowOne):
             metavar="<snapshot>",
             help=("Snapshot to get details")
         )
+        parser.add_argument(
+            '--follow',
+            action='store_true',
+            help=("Report bytes, files and throughput per index and node"
+                  " until the snapshot ends")
+        )
+        parser.add_argument(
+            '--interval',
+            action='store',
+            type=float,
+            default=5,
+            help=("Seconds between two progress reports (Default: 5)")
+        )
+        parser.add_argument(
+            '--slowest',
+            action='store',
+            type=int,
+            default=5,
+            help=("Number of slowest running shards to report (Default: 5)")
+        )
         return parser
@@ -0,0 +1,415 @@
+import bisect
+import collections
+import itertools
+import operator
+from array import array
+
+
+def skew(values):
+    """How much the most loaded value exceeds the mean, 0.25 is 25%."""
+    if not values:
+        return 0.0
+
+    mean = sum(values) / len(values)
+    if mean == 0:
+        return 0.0
+
+    return max(values) / mean - 1
+
+
+def intern(names):
+    """Return the distinct ``names`` in order and the id of each name."""
+    distinct = list(dict.fromkeys(names))
+    ids = dict(zip(distinct, range(len(distinct))))
+
+    return distinct, array('i', map(ids.__getitem__, names))
+
+
+class ShardTable:
+    """Shards of ``cat shards`` stored as columns.
+
+    Index and node names are interned, each column is an ``array`` so half
+    a million shards stay compact and are aggregated with C level loops.
+    Nodes listed by ``cat allocation`` are known even without shards, with
+    their disk usage and capacity.
+    """
+
+    def __init__(self):
+        super(ShardTable, self).__init__()
+        self.indices = []
+        self.nodes = []
+        self.index = array('i')
+        self.shard = array('i')
+        self.primary = array('b')
+        self.started = array('b')
+        self.size = array('q')
+        # -1 for unassigned shards
+        self.node = array('i')
+        self.disk_used = array('q')
+        self.disk_total = array('q')
+        # Aggregates of the columns, computed once
+        self._loads = None
+        self._copies = None
+
+    @classmethod
+    def from_cat(cls, shards, allocation=()):
+        """Build the table from ``cat shards`` and ``cat allocation`` JSON
+        rows, both requested with ``bytes=b``."""
+        table = cls()
+        column = operator.itemgetter
+
+        table.indices, table.index = intern(list(map(column('index'),
+                                                     shards)))
+        table.shard = array('i', map(int, map(column('shard'), shards)))
+        table.primary = array('b', [
+            prirep == 'p' for prirep in map(column('prirep'), shards)
+        ])
+        table.started = array('b', [
+            state == 'STARTED' for state in map(column('state'), shards)
+        ])
+        table.size = array('q', map(int, [
+            store or '0' for store in map(column('store'), shards)
+        ]))
+
+        # Nodes of cat allocation first, they may hold no shard. Relocating
+        # shards read 'source -> ip id target', unassigned ones have no node
+        allocated = dict(
+            (row.get('node'), row) for row in allocation
+            if row.get('node') != 'UNASSIGNED'
+        )
+        names = [
+            (node.split(' -> ', 1)[0] if ' -> ' in node else node)
+            if node else ''
+            for node in map(column('node'), shards)
+        ]
+        table.nodes, node_ids = intern([''] + list(allocated) + names)
+        del table.nodes[0]
+        table.node = array('i', map(
+            operator.sub,
+            node_ids[len(allocated) + 1:],
+            itertools.repeat(1)
+        ))
+
+        for name in table.nodes:
+            row = allocated.get(name, {})
+            table.disk_used.append(int(row.get('disk.used') or 0))
+            table.disk_total.append(int(row.get('disk.total') or 0))
+
+        return table
+
+    def __len__(self):
+        return len(self.index)
+
+    def loads(self):
+        """Return the shards, primaries and bytes of each node."""
+        if self._loads is None:
+            self._loads = self.aggregate_loads()
+
+        return self._loads
+
+    def aggregate_loads(self):
+        counts = collections.Counter(self.node)
+        primary_counts = collections.Counter(
+            itertools.compress(self.node, self.primary)
+        )
+        # The extra last slot collects unassigned shards
+        disk = [0] * (len(self.nodes) + 1)
+        for node, size in zip(self.node, self.size):
+            disk[node] += size
+
+        return (
+            [counts[node] for node in range(len(self.nodes))],
+            [primary_counts[node] for node in range(len(self.nodes))],
+            disk[:-1]
+        )
+
+    def copy_key(self, index, node):
+        return index * (len(self.nodes) + 1) + node + 1
+
+    def copies(self):
+        """Count the shards of each index on each node, keyed by
+        ``copy_key``."""
+        if self._copies is None:
+            stride = len(self.nodes) + 1
+            self._copies = collections.Counter(map(
+                operator.add,
+                map(operator.mul, self.index, itertools.repeat(stride)),
+                map(operator.add, self.node, itertools.repeat(1))
+            ))
+
+        return self._copies
+
+    def hot_spots(self, limit=10):
+        """Return ``(index, node, shards, expected)`` of the nodes holding
+        more shards of an index than an even spread would give them."""
+        copies = self.copies()
+        stride = len(self.nodes) + 1
+        nodes = max(len(self.nodes), 1)
+        totals = collections.Counter(self.index)
+
+        hot_spots = []
+        # An even spread gives at least one shard to each node
+        for key, count in [item for item in copies.items() if item[1] > 1]:
+            index, node = divmod(key, stride)
+            expected = -(-totals[index] // nodes)
+            if node > 0 and count > expected:
+                hot_spots.append((count - expected, index, node - 1, count,
+                                  expected))
+
+        hot_spots.sort(reverse=True)
+
+        return [
+            (self.indices[index], self.nodes[node], count, expected)
+            for _, index, node, count, expected in hot_spots[:limit]
+        ]
+
+
+class BalancePlanner:
+    """Plan shard moves bringing the skew of nodes under ``target``.
+
+    The plan is greedy: each move takes a started shard from the most
+    loaded node to the least loaded one which can hold it, and moved shards
+    are not moved again. Balancing shard counts moves shards of the index
+    most concentrated on the source, balancing disk moves the shard closest
+    to half the gap. A node never gets two copies of a shard nor goes over
+    ``max_disk_percent``.
+    """
+
+    def __init__(self, table, by='shards', target=0.1, max_moves=1000,
+                 max_disk_percent=None):
+        super(BalancePlanner, self).__init__()
+        self.table = table
+        self.by = by
+        self.target = target
+        self.max_moves = max_moves
+        self.max_disk_percent = max_disk_percent
+
+        shards, _, disk = table.loads()
+        self.load = list(shards if by == 'shards' else disk)
+        self.disk_used = list(table.disk_used)
+        # Changes of the copies of the table, which is left untouched
+        self.moved_copies = collections.Counter()
+
+        # Shard positions of each node, the extra last list collects the
+        # unassigned shards
+        self.positions = [[] for _ in range(len(table.nodes) + 1)]
+        appends = [positions.append for positions in self.positions]
+        for position, node in enumerate(table.node):
+            appends[node](position)
+
+        # Shards are keyed by index * shard_stride + shard number
+        self.shard_stride = max(table.shard, default=0) + 1
+
+        # Built on demand for the nodes shards are taken from or moved to
+        self.by_index = {}
+        # Per node, the indices having each count of shards on the node and
+        # the highest count, so the most concentrated index is found in
+        # constant time
+        self.by_count = {}
+        self.by_size = {}
+        self.shard_sets = {}
+
+    def plan(self):
+        """Return ``(index, shard, from node, to node, bytes)`` moves."""
+        moves = []
+        nodes = range(len(self.table.nodes))
+
+        while len(moves) < self.max_moves and \
+                skew(self.load) > self.target:
+            source = max(nodes, key=self.load.__getitem__)
+            move = None
+
+            for destination in self.destinations(nodes):
+                if self.load[source] - self.load[destination] <= \
+                        self.minimum_gap():
+                    break
+                position = self.pick(source, destination)
+                if position is not None:
+                    move = (position, source, destination)
+                    break
+
+            if move is None:
+                break
+
+            self.apply(*move)
+            moves.append(self.describe(*move))
+
+        return moves
+
+    def destinations(self, nodes):
+        """The nodes from the least loaded, only sorted when the least
+        loaded one cannot take a shard."""
+        least = min(nodes, key=self.load.__getitem__)
+        yield least
+
+        for node in sorted(nodes, key=self.load.__getitem__):
+            if node != least:
+                yield node
+
+    def minimum_gap(self):
+        # Moving a shard only helps when the gap is larger than the shard
+        return 1 if self.by == 'shards' else 0
+
+    def pick(self, source, destination):
+        if self.by == 'shards':
+            return self.pick_by_index(source, destination)
+
+        return self.pick_by_size(source, destination)
+
+    def pick_by_index(self, source, destination):
+        by_index = self.node_by_index(source)
+        if not by_index:
+            return None
+
+        counts, highest = self.node_by_count(source)
+        index = next(iter(counts[highest[0]]))
+        concentrated = by_index[index]
+        # Only worth it when the destination ends with fewer copies
+        if self.copies(index, destination) + 1 < \
+                len(concentrated):
+            for position in concentrated:
+                if self.movable(position, destination):
+                    return position
+
+        for positions in by_index.values():
+            for position in positions:
+                if self.movable(position, destination):
+                    return position
+
+        return None
+
+    def pick_by_size(self, source, destination):
+        by_size = self.node_by_size(source)
+        gap = self.load[source] - self.load[destination]
+        start = bisect.bisect_left(by_size, (gap // 2, -1))
+
+        # The closest sizes to half the gap, below the gap
+        candidates = sorted(
+            by_size[max(start - 50, 0):start + 50],
+            key=lambda item: abs(item[0] - gap // 2)
+        )
+        for size, position in candidates:
+            if 0 < size < gap and self.movable(position, destination):
+                return position
+
+        return None
+
+    def copies(self, index, node):
+        key = self.table.copy_key(index, node)
+
+        return self.table.copies()[key] + self.moved_copies[key]
+
+    def movable(self, position, destination):
+        table = self.table
+
+        if self.shard_key(position) in self.node_shards(destination):
+            return False
+
+        total = table.disk_total[destination]
+        if self.max_disk_percent is not None and total:
+            used = self.disk_used[destination] + table.size[position]
+            if used * 100.0 / total > self.max_disk_percent:
+                return False
+
+        return True
+
+    def apply(self, position, source, destination):
+        table = self.table
+        index = table.index[position]
+        size = table.size[position]
+        key = self.shard_key(position)
+
+        amount = 1 if self.by == 'shards' else size
+        self.load[source] -= amount
+        self.load[destination] += amount
+        self.disk_used[source] -= size
+        self.disk_used[destination] += size
+        self.moved_copies[table.copy_key(index, source)] -= 1
+        self.moved_copies[table.copy_key(index, destination)] += 1
+
+        self.node_shards(source).discard(key)
+        self.node_shards(destination).add(key)
+        if self.by == 'shards':
+            by_index = self.node_by_index(source)
+            count = len(by_index[index])
+            by_index[index].remove(position)
+            if not by_index[index]:
+                del by_index[index]
+
+            counts, highest = self.node_by_count(source)
+            counts[count].discard(index)
+            if count > 1:
+                counts.setdefault(count - 1, set()).add(index)
+            if not counts[count]:
+                del counts[count]
+                if highest[0] == count:
+                    highest[0] = count - 1
+        else:
+            by_size = self.node_by_size(source)
+            del by_size[bisect.bisect_left(by_size, (size, position))]
+
+    def describe(self, position, source, destination):
+        table = self.table
+
+        return (
+            table.indices[table.index[position]],
+            table.shard[position],
+            table.nodes[source],
+            table.nodes[destination],
+            table.size[position],
+        )
+
+    def movable_positions(self, node):
+        return itertools.compress(
+            self.positions[node],
+            map(self.table.started.__getitem__, self.positions[node])
+        )
+
+    def node_by_index(self, node):
+        if node not in self.by_index:
+            index = self.table.index.__getitem__
+            positions = sorted(self.movable_positions(node), key=index)
+            self.by_index[node] = {
+                key: list(group)
+                for key, group in itertools.groupby(positions, key=index)
+            }
+
+        return self.by_index[node]
+
+    def node_by_count(self, node):
+        if node not in self.by_count:
+            counts = {}
+            for index, positions in self.node_by_index(node).items():
+                counts.setdefault(len(positions), set()).add(index)
+            self.by_count[node] = (counts, [max(counts, default=0)])
+
+        return self.by_count[node]
+
+    def node_by_size(self, node):
+        if node not in self.by_size:
+            self.by_size[node] = sorted(
+                (self.table.size[position], position)
+                for position in self.movable_positions(node)
+            )
+
+        return self.by_size[node]
+
+    def shard_key(self, position):
+        return self.table.index[position] * self.shard_stride + \
+            self.table.shard[position]
+
+    def node_shards(self, node):
+        if node not in self.shard_sets:
+            table = self.table
+            positions = self.positions[node]
+            self.shard_sets[node] = set(map(
+                operator.add,
+                map(
+                    operator.mul,
+                    map(table.index.__getitem__, positions),
+                    itertools.repeat(self.shard_stride)
+                ),
+                map(table.shard.__getitem__, positions)
+            ))
+
+        return self.shard_sets[node]
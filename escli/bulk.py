@@ -0,0 +1,401 @@
+import collections
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, \
+    ThreadPoolExecutor, wait
+
+import elasticsearch as elasticsearch
+
+from escli import serializers
+
+
+# Item statuses worth sending again: the node was overloaded
+RETRYABLE_STATUSES = (429, 502, 503, 504)
+
+
+class AdaptiveConcurrency:
+    """Number of bulk requests allowed in flight, tuned from responses.
+
+    The limit grows by one after each fast, fully accepted request and is
+    halved as soon as the cluster rejects documents (additive increase,
+    multiplicative decrease). Requests slower than ``target_latency`` shrink
+    it by one.
+    """
+
+    def __init__(self, initial=2, maximum=16, target_latency=None):
+        super(AdaptiveConcurrency, self).__init__()
+        self.maximum = maximum
+        self.limit = min(initial, maximum)
+        self.target_latency = target_latency
+        self.lock = threading.Lock()
+
+    def record(self, latency, rejected):
+        with self.lock:
+            if rejected:
+                self.limit = max(1, self.limit // 2)
+            elif self.target_latency and latency > self.target_latency:
+                self.limit = max(1, self.limit - 1)
+            else:
+                self.limit = min(self.maximum, self.limit + 1)
+
+            return self.limit
+
+
+class BulkStatistics:
+    """Counters of a bulk load, shared by the sending threads."""
+
+    def __init__(self):
+        super(BulkStatistics, self).__init__()
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.requests = 0
+        self.documents = 0
+        self.bytes = 0
+        self.retries = 0
+        self.failures = 0
+
+    def add(self, **counters):
+        with self.lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def summary(self):
+        seconds = max(time.time() - self.start, 1e-9)
+
+        return {
+            'documents': self.documents,
+            'failures': self.failures,
+            'retries': self.retries,
+            'requests': self.requests,
+            'seconds': round(seconds, 2),
+            'docs/s': round(self.documents / seconds),
+            'MB/s': round(self.bytes / seconds / 1024 / 1024, 2),
+        }
+
+
+def document_actions(lines, index, op_type='index', id_field=None,
+                     on_failure=None):
+    """Turn NDJSON document lines into ``(action, source)`` pairs.
+
+    Documents are only decoded when their id has to be read from
+    ``id_field``. Lines which are not JSON objects are then skipped and
+    given to ``on_failure`` with the reason, or raise without it.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        metadata = {'_index': index}
+        if id_field is not None:
+            try:
+                document_id = serializers.loads(line).get(id_field)
+            except (ValueError, AttributeError) as err:
+                if on_failure is None:
+                    raise
+                on_failure(line, '{}: {}'.format(type(err).__name__, err))
+                continue
+
+            if document_id is not None:
+                metadata['_id'] = document_id
+
+        yield (
+            serializers.dumps_bytes({op_type: metadata}),
+            line
+        )
+
+
+def load_callable(path):
+    """Import the callable ``path`` points to.
+
+    ``path`` is either ``package.module:function`` or
+    ``package.module.function``.
+    """
+    if ':' in path:
+        module_name, name = path.split(':', 1)
+    else:
+        module_name, _, name = path.rpartition('.')
+
+    if not module_name:
+        raise ValueError('{} is not a dotted path'.format(path))
+
+    obj = importlib.import_module(module_name)
+    for attribute in name.split('.'):
+        obj = getattr(obj, attribute)
+
+    return obj
+
+
+# Transform stage state, set in each worker process by _initialize_transform
+_transform = None
+
+
+def _initialize_transform(path, index, op_type, id_field):
+    global _transform
+    _transform = (load_callable(path), index, op_type, id_field)
+
+
+def transform_lines(lines):
+    """Transform a batch of document lines inside a worker process.
+
+    The transform callable receives each decoded document and returns the
+    document to load, or None to drop it. Returns the ``(action, source)``
+    pairs ready for the bulk API and the ``(line, reason)`` of documents
+    the transform failed on.
+    """
+    function, index, op_type, id_field = _transform
+    actions = []
+    failures = []
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            document = function(serializers.loads(line))
+            if document is None:
+                continue
+            if not isinstance(document, dict):
+                raise TypeError('transform returned {}, not a dict'.format(
+                    type(document).__name__
+                ))
+
+            metadata = {'_index': index}
+            if id_field is not None and document.get(id_field) is not None:
+                metadata['_id'] = document.get(id_field)
+
+            actions.append((
+                serializers.dumps_bytes({op_type: metadata}),
+                serializers.dumps_bytes(document)
+            ))
+        except Exception as err:
+            failures.append((line, '{}: {}'.format(type(err).__name__, err)))
+
+    return actions, failures
+
+
+class TransformStage:
+    """Decode, transform and serialize documents in a process pool.
+
+    Lines are sent to the workers in batches of ``batch_size``; at most two
+    batches per worker are in flight so memory stays bounded. With
+    ``ordered``, documents come out in input order.
+    """
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, path, index, op_type='index', id_field=None,
+                 workers=None, batch_size=500, ordered=False):
+        super(TransformStage, self).__init__()
+        # Fail early, in the main process, on a wrong path
+        load_callable(path)
+        self.initargs = (path, index, op_type, id_field)
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.ordered = ordered
+        # Called with (line, reason) for each document the transform fails on
+        self.on_failure = None
+
+    def batches(self, lines):
+        batch = []
+
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    def run(self, lines):
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_initialize_transform,
+            initargs=self.initargs
+        ) as executor:
+            max_in_flight = 2 * self.workers
+            in_flight = collections.deque()
+
+            for batch in self.batches(lines):
+                if len(in_flight) >= max_in_flight:
+                    yield from self.collect(in_flight)
+                in_flight.append(executor.submit(transform_lines, batch))
+
+            while in_flight:
+                yield from self.collect(in_flight)
+
+    def collect(self, in_flight):
+        if self.ordered:
+            done = [in_flight.popleft()]
+        else:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight.remove(future)
+
+        for future in done:
+            actions, failures = future.result()
+
+            for line, reason in failures:
+                if self.on_failure is not None:
+                    self.on_failure(line, reason)
+                else:
+                    self.log.error('Cannot transform document : ' + reason)
+
+            yield from actions
+
+
+class BulkLoader:
+    """Send ``(action, source)`` pairs to ``_bulk`` with several requests in
+    flight.
+
+    Batches are cut by document count and size. Rejected documents are sent
+    again with an exponential backoff, documents failing for good are
+    written to ``dead_letter``.
+    """
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, es, batch_docs=1000, batch_bytes=5 * 1024 * 1024,
+                 concurrency=None, max_retries=5, backoff=0.5,
+                 dead_letter=None):
+        super(BulkLoader, self).__init__()
+        self.es = es
+        self.batch_docs = batch_docs
+        self.batch_bytes = batch_bytes
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.dead_letter = dead_letter
+        self.dead_letter_lock = threading.Lock()
+        self.statistics = BulkStatistics()
+
+    def batches(self, actions):
+        batch = []
+        size = 0
+
+        for action, source in actions:
+            batch.append((action, source))
+            size += len(action) + len(source) + 2
+
+            if len(batch) >= self.batch_docs or size >= self.batch_bytes:
+                yield batch
+                batch = []
+                size = 0
+
+        if batch:
+            yield batch
+
+    def run(self, actions):
+        in_flight = set()
+
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency.maximum
+        ) as executor:
+            for batch in self.batches(actions):
+                while len(in_flight) >= self.concurrency.limit:
+                    done, in_flight = wait(
+                        in_flight,
+                        return_when=FIRST_COMPLETED
+                    )
+                    self.check(done)
+
+                in_flight.add(executor.submit(self.send, batch))
+
+            done, in_flight = wait(in_flight)
+            self.check(done)
+
+        return self.statistics.summary()
+
+    def check(self, futures):
+        for future in futures:
+            # Raise errors which are not about a document
+            future.result()
+
+    def send(self, batch):
+        attempt = 0
+
+        while batch:
+            body = b''.join(
+                action + b'\n' + source + b'\n' for action, source in batch
+            )
+            start = time.time()
+
+            try:
+                response = self.es.bulk(body=body)
+            except elasticsearch.TransportError as err:
+                if err.status_code not in RETRYABLE_STATUSES and \
+                        not isinstance(err, elasticsearch.ConnectionError):
+                    raise
+                self.concurrency.record(time.time() - start, True)
+                retry = batch
+            else:
+                retry, failed = self.handle(batch, response)
+                self.concurrency.record(time.time() - start, len(retry) > 0)
+                self.statistics.add(
+                    requests=1,
+                    documents=len(batch) - len(retry) - failed,
+                    bytes=len(body)
+                )
+
+            if not retry:
+                return
+
+            attempt += 1
+            if attempt > self.max_retries:
+                for action, source in retry:
+                    self.fail(source, 429, {'reason': 'too many retries'})
+                return
+
+            self.statistics.add(retries=len(retry))
+            self.log.debug('Retrying {} documents ({}/{})'.format(
+                len(retry), attempt, self.max_retries
+            ))
+            time.sleep(self.backoff * 2 ** (attempt - 1))
+            batch = retry
+
+    def handle(self, batch, response):
+        """Return the documents of ``batch`` to send again and the number of
+        documents which failed for good."""
+        retry = []
+        failed = 0
+
+        if not response.get('errors'):
+            return retry, failed
+
+        for (action, source), item in zip(batch, response.get('items')):
+            result = next(iter(item.values()))
+            status = result.get('status')
+
+            if result.get('error') is None:
+                continue
+
+            if status in RETRYABLE_STATUSES:
+                retry.append((action, source))
+            else:
+                failed += 1
+                self.fail(source, status, result.get('error'))
+
+        return retry, failed
+
+    def fail(self, source, status, error):
+        self.statistics.add(failures=1)
+
+        if self.dead_letter is None:
+            self.log.error('Document rejected ({}) : {}'.format(
+                status,
+                error.get('reason')
+            ))
+            return
+
+        with self.dead_letter_lock:
+            self.dead_letter.write(json.dumps({
+                'status': status,
+                'error': error,
+                'document': source.decode('utf-8', 'replace')
+            }) + '\n')
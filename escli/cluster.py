@@ -1,21 +1,45 @@
 import logging
 import collections
 import elasticsearch as elasticsearch
+import os
+import pprint
 import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from cliff.command import Command
 from cliff.lister import Lister
 from escli.main import Escli
-from escli.utils import Color, flatten_dict, EscliLister
-from escli.settings import ClusterSettings
+from escli.progress import format_duration
+from escli.restart import PHASES, RestartError, RollingRestart
+from escli.utils import Color, flatten_dict, EscliLister, print_output, \
+    cache_path, index_batches, parse_duration, time_value
+from escli.settings import ClusterSettings, IndexSettings, LazySettings
 
 
 class ClusterAllocationExplain(Lister):
-    """Provide explanations for shard allocations in the cluster."""
+    """Provide explanations for shard allocations in the cluster.
+
+    With --all, every unassigned shard is explained, one request per shard
+    from a pool of workers, and the decisions are grouped by decider and
+    explanation.
+    """
 
     log = logging.getLogger(__name__)
 
+    # Only what the explanations are grouped on
+    EXPLAIN_FILTER_PATH = ','.join([
+        'allocate_explanation',
+        'node_allocation_decisions.node_name',
+        'node_allocation_decisions.deciders.decider',
+        'node_allocation_decisions.deciders.explanation',
+    ])
+
     def take_action(self, parsed_args):
+        if parsed_args.all:
+            return self.explain_all(parsed_args)
+
         try:
             response = Escli._es.cluster.allocation_explain()
         except elasticsearch.TransportError as e:
@@ -50,25 +74,262 @@ class ClusterAllocationExplain(Lister):
                 tuple(output.items())
             )
 
+    def explain_all(self, parsed_args):
+        shards = self.unassigned_shards(parsed_args.index)
+        self.log.info('Explaining {} unassigned shards'.format(len(shards)))
+
+        causes = collections.OrderedDict()
+        with ThreadPoolExecutor(max_workers=parsed_args.workers) as executor:
+            for (index, shard, primary), copies, cause_keys in zip(
+                shards.keys(),
+                shards.values(),
+                executor.map(self.explain, shards.keys())
+            ):
+                for cause_key in cause_keys:
+                    cause = causes.setdefault(cause_key, [0, set(), None])
+                    cause[0] += copies
+                    cause[1].add(index)
+                    cause[2] = cause[2] or '{}[{}]'.format(index, shard)
+
+        return (
+            ('Decider', 'Explanation', 'Shards', 'Indices', 'Example'),
+            (
+                (decider, explanation, count, len(indices), example)
+                for (decider, explanation), (count, indices, example)
+                in sorted(causes.items(), key=lambda item: -item[1][0])
+            )
+        )
+
+    def unassigned_shards(self, index=None):
+        """Return the number of unassigned copies of each
+        ``(index, shard, primary)`` to explain, the primary is explained
+        when it is unassigned."""
+        shards = collections.OrderedDict()
+
+        for row in Escli._es.cat.shards(
+            index=index,
+            format='json',
+            h='index,shard,prirep,state'
+        ):
+            if row.get('state') != 'UNASSIGNED':
+                continue
+
+            key = (row.get('index'), int(row.get('shard')))
+            primary = row.get('prirep') == 'p'
+            if key + (True,) in shards:
+                shards[key + (True,)] += 1
+            elif primary:
+                shards[key + (True,)] = shards.pop(key + (False,), 0) + 1
+            else:
+                shards[key + (False,)] = shards.get(key + (False,), 0) + 1
+
+        return shards
+
+    def explain(self, shard):
+        """Return the ``(decider, explanation)`` keys blocking ``shard``,
+        each key once."""
+        index, number, primary = shard
+
+        try:
+            response = Escli._es.cluster.allocation_explain(
+                body={'index': index, 'shard': number, 'primary': primary},
+                filter_path=self.EXPLAIN_FILTER_PATH
+            )
+        except elasticsearch.TransportError as err:
+            return [('error', str(err))]
+
+        keys = set()
+        for node in response.get('node_allocation_decisions', []):
+            for decider in node.get('deciders', []):
+                keys.add((
+                    decider.get('decider'),
+                    self.normalize(decider.get('explanation'))
+                ))
+
+        if not keys:
+            keys.add(('-', response.get('allocate_explanation')))
+
+        return sorted(keys)
+
+    def normalize(self, explanation):
+        """Mask the bracketed values holding numbers or nested brackets
+        (shard copies, node ids, sizes), which would split identical
+        causes."""
+        output = []
+        group = []
+        depth = 0
+
+        for character in explanation or '':
+            if character == '[':
+                depth += 1
+            if depth:
+                group.append(character)
+            else:
+                output.append(character)
+
+            if character == ']' and depth:
+                depth -= 1
+                if depth == 0:
+                    value = ''.join(group[1:-1])
+                    output.append(
+                        '[...]' if re.search(r'[\d\[]', value)
+                        else '[' + value + ']'
+                    )
+                    group = []
+
+        return ''.join(output + group)
+
+    def get_parser(self, prog_name):
+        parser = super(ClusterAllocationExplain, self).get_parser(prog_name)
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help=("Explain every unassigned shard, grouped by cause")
+        )
+        parser.add_argument(
+            '--index',
+            action='store',
+            help=("Only explain the shards of these indices (with --all)")
+        )
+        parser.add_argument(
+            '--workers',
+            action='store',
+            type=int,
+            default=8,
+            help=("Explain requests in flight (with --all, Default: 8)")
+        )
+        return parser
+
 
 class ClusterHealth(EscliLister):
-    """Retrieve the cluster health."""
+    """Retrieve the cluster health.
+
+    With --wait-for-* options, the cluster holds the request until the
+    condition is met or the timeout expires; the exit code is 1 on timeout.
+    With --watch, the health is refreshed over the same connection and only
+    the fields that changed are redrawn; combined with --wait-for-*, each
+    refresh is a long poll and the watch ends with the condition or the
+    timeout.
+    """
 
     log = logging.getLogger(__name__)
 
     def take_action(self, parsed_args):
-        health = collections.OrderedDict(
-            sorted(Escli._es.cluster.health().items())
+        health = self.fetch(parsed_args)
+
+        if self.wait_parameters(parsed_args) and health.get('timed_out'):
+            self.log.warning('Condition not met before timeout')
+            self.exit_code = 1
+
+        return (
+            ('Attribute', 'Value'),
+            tuple(self.format(health).items())
         )
 
+    def run(self, parsed_args):
+        if not parsed_args.watch:
+            return super(ClusterHealth, self).run(parsed_args)
+
+        parsed_args = self._run_before_hooks(parsed_args)
+        try:
+            return self.watch(parsed_args)
+        except KeyboardInterrupt:
+            return 0
+
+    def wait_parameters(self, parsed_args):
+        parameters = {}
+
+        if parsed_args.wait_for_status:
+            parameters['wait_for_status'] = parsed_args.wait_for_status
+        if parsed_args.wait_for_no_relocating:
+            parameters['wait_for_no_relocating_shards'] = True
+        if parsed_args.wait_for_no_initializing:
+            parameters['wait_for_no_initializing_shards'] = True
+        if parsed_args.wait_for_nodes:
+            parameters['wait_for_nodes'] = parsed_args.wait_for_nodes
+
+        return parameters
+
+    def fetch(self, parsed_args, timeout=None):
+        parameters = self.wait_parameters(parsed_args)
+
+        if parameters:
+            parameters['timeout'] = timeout or parsed_args.timeout
+            # Leave time to the cluster to answer once its timeout expired
+            parameters['request_timeout'] = \
+                parse_duration(parameters['timeout']) + 30
+            # A condition not met before the timeout answers 408
+            parameters['ignore'] = 408
+
+        return Escli._es.cluster.health(**parameters)
+
+    def format(self, health):
+        health = collections.OrderedDict(sorted(health.items()))
+
         health['status'] = "{}{}{}".format(
             *self.colorize_cluster_status(health['status'])
         )
 
-        return (
-            ('Attribute', 'Value'),
-            tuple(health.items())
-        )
+        return health
+
+    def watch(self, parsed_args):
+        waiting = len(self.wait_parameters(parsed_args)) > 0
+        stdout = self.app.stdout
+        tty = hasattr(stdout, 'isatty') and stdout.isatty()
+        previous = None
+        deadline = time.time() + parse_duration(parsed_args.timeout)
+
+        while True:
+            if waiting:
+                # Each refresh is a single request held by the cluster
+                health = self.fetch(
+                    parsed_args,
+                    timeout=time_value(parsed_args.interval)
+                )
+            else:
+                health = self.fetch(parsed_args)
+
+            condition_met = waiting and not health.get('timed_out')
+            health = self.format(health)
+            health.pop('timed_out', None)
+
+            if previous is None:
+                for key, value in health.items():
+                    stdout.write('{} : {}\n'.format(key, value))
+            else:
+                self.redraw(stdout, tty, previous, health)
+            stdout.flush()
+            previous = health
+
+            if condition_met:
+                return 0
+            if waiting and time.time() >= deadline:
+                self.log.warning('Condition not met before timeout')
+                return 1
+            if not waiting:
+                time.sleep(parsed_args.interval)
+
+    def redraw(self, stdout, tty, previous, health):
+        lines = len(previous)
+
+        for position, (key, value) in enumerate(health.items()):
+            if previous.get(key) == value:
+                continue
+
+            if tty:
+                # Rewrite the field's line in place, then come back down
+                stdout.write('\033[{0}A\r\033[K{1} : {2}\033[{0}B\r'.format(
+                    lines - position,
+                    key,
+                    value
+                ))
+            else:
+                stdout.write('[{}] {} : {} -> {}\n'.format(
+                    time.strftime('%H:%M:%S'),
+                    key,
+                    previous.get(key),
+                    value
+                ))
 
     def colorize_cluster_status(self, status):
         return (
@@ -77,6 +338,53 @@ class ClusterHealth(EscliLister):
             Color.END
         )
 
+    def get_parser(self, prog_name):
+        parser = super(ClusterHealth, self).get_parser(prog_name)
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help=("Refresh the health until interrupted, or until the"
+                  " --wait-for-* condition is met")
+        )
+        parser.add_argument(
+            '--interval',
+            action='store',
+            type=float,
+            default=2,
+            help=("Seconds between two refreshes in watch mode (Default: 2)")
+        )
+        parser.add_argument(
+            '--wait-for-status',
+            action='store',
+            choices=['green', 'yellow', 'red'],
+            help=("Wait until the cluster status is at least this one")
+        )
+        parser.add_argument(
+            '--wait-for-no-relocating',
+            action='store_true',
+            help=("Wait until no shard is relocating")
+        )
+        parser.add_argument(
+            '--wait-for-no-initializing',
+            action='store_true',
+            help=("Wait until no shard is initializing")
+        )
+        parser.add_argument(
+            '--wait-for-nodes',
+            action='store',
+            metavar='<n>',
+            help=("Wait until this many nodes are available (N, >=N, <=N,"
+                  " >N or <N)")
+        )
+        parser.add_argument(
+            '--timeout',
+            action='store',
+            default='30s',
+            help=("How long the cluster waits for the condition"
+                  " (Default: 30s)")
+        )
+        return parser
+
 
 class ClusterStats(Command):
     """Retrieve the cluster status."""
@@ -87,7 +395,7 @@ class ClusterStats(Command):
         cluster_stats = self.transform(
             flatten_dict(Escli._es.cluster.stats())
         )
-        Escli._pp.pprint(cluster_stats)
+        pprint.pprint(cluster_stats, indent=4)
 
     def transform(self, stats):
         plugins_as_string = ''
@@ -103,11 +411,91 @@ class ClusterStats(Command):
 
 
 
+class ClusterRollingRestart(EscliLister):
+    """Restart nodes one after the other, waiting for a green cluster."""
+
+    log = logging.getLogger(__name__)
+    settings = LazySettings(ClusterSettings)
+
+    def take_action(self, parsed_args):
+        restart = RollingRestart(
+            Escli._es,
+            self.settings,
+            parsed_args.hook,
+            parsed_args.state_file,
+            timeout=parse_duration(parsed_args.timeout),
+            poll=parse_duration(parsed_args.poll)
+        )
+
+        if parsed_args.fresh and os.path.exists(parsed_args.state_file):
+            os.remove(parsed_args.state_file)
+
+        try:
+            # Without names, an interrupted restart resumes on its nodes
+            timings = restart.run(parsed_args.names or None)
+        except RestartError as err:
+            self.log.error('{}, run the command again to resume'.format(err))
+            self.exit_code = 1
+            timings = restart.state.get('timings')
+
+        return (('Node', 'Phase', 'Duration'), self.rows(timings))
+
+    def rows(self, timings):
+        totals = collections.OrderedDict((phase, 0) for phase in PHASES)
+
+        for node, phase, seconds in timings:
+            totals[phase] += seconds
+            yield (node, phase, format_duration(seconds))
+
+        for phase, seconds in totals.items():
+            yield ('total', phase, format_duration(seconds))
+
+    def get_parser(self, prog_name):
+        parser = super(ClusterRollingRestart, self).get_parser(prog_name)
+        parser.add_argument(
+            "names",
+            metavar="<name>",
+            nargs='*',
+            help=("Nodes to restart, in order (Default: every node, the"
+                  " elected master last)")
+        )
+        parser.add_argument(
+            '--hook',
+            action='store',
+            required=True,
+            help=("Shell command restarting the node named in $ESCLI_NODE")
+        )
+        parser.add_argument(
+            '--timeout',
+            action='store',
+            default='1h',
+            help=("Maximum duration of each phase (Default: 1h)")
+        )
+        parser.add_argument(
+            '--poll',
+            action='store',
+            default='30s',
+            help=("Duration of each health long poll (Default: 30s)")
+        )
+        parser.add_argument(
+            '--state-file',
+            action='store',
+            default=cache_path('rolling-restart.json'),
+            help=("File recording the progress to resume from")
+        )
+        parser.add_argument(
+            '--fresh',
+            action='store_true',
+            help=("Ignore the progress of a previous interrupted run")
+        )
+        return parser
+
+
 class ClusterRoutingAllocationEnable(Command):
     """Change the routing allocation status."""
 
     log = logging.getLogger(__name__)
-    settings = ClusterSettings()
+    settings = LazySettings(ClusterSettings)
 
     def take_action(self, parsed_args):
         persistency = "transient"
@@ -153,7 +541,7 @@ class ClusterSettingsGet(Command):
     """Retrieve a cluster setting."""
 
     log = logging.getLogger(__name__)
-    settings = ClusterSettings()
+    settings = LazySettings(ClusterSettings)
 
     def take_action(self, parsed_args):
         persistency = "transient"
@@ -196,7 +584,7 @@ class ClusterSettingsReset(Command):
     """Reset a cluster setting."""
 
     log = logging.getLogger(__name__)
-    settings = ClusterSettings()
+    settings = LazySettings(ClusterSettings)
 
     def take_action(self, parsed_args):
         persistency = "transient"
@@ -240,7 +628,7 @@ class ClusterSettingsSet(Command):
     """Set a cluster setting."""
 
     log = logging.getLogger(__name__)
-    settings = ClusterSettings()
+    settings = LazySettings(ClusterSettings)
 
     def take_action(self, parsed_args):
         persistency = "transient"
@@ -283,3 +671,208 @@ class ClusterSettingsSet(Command):
             help=("Set setting as persistent")
         )
         return parser
+
+
+class ClusterSettingsApply(Command):
+    """Apply many cluster and index settings at once.
+
+    Settings come from a YAML/JSON file with `transient`, `persistent` and
+    `indices` (index pattern to settings) sections, and from key=value
+    arguments. They are merged into a single update per scope.
+    """
+
+    log = logging.getLogger(__name__)
+    settings = LazySettings(ClusterSettings)
+    persistencies = ('transient', 'persistent')
+
+    def take_action(self, parsed_args):
+        changes = self.load_changes(parsed_args)
+        current = self.current_values(changes)
+
+        self.print_diff(changes, current)
+
+        if parsed_args.revert_file:
+            self.write_revert_file(parsed_args.revert_file, current)
+
+        if parsed_args.dry_run:
+            return 0
+
+        success = True
+        for persistency in self.persistencies:
+            if changes[persistency]:
+                self.log.info('Applying {} {} settings'.format(
+                    len(changes[persistency]),
+                    persistency
+                ))
+                success &= self.settings.set_many(
+                    changes[persistency],
+                    persistency=persistency
+                )
+
+        for pattern, settings in sorted(changes['indices'].items()):
+            self.log.info('Applying {} settings to {}'.format(
+                len(settings),
+                pattern
+            ))
+            success &= IndexSettings(pattern).set_many(settings)
+
+        return 0 if success else 1
+
+    def load_changes(self, parsed_args):
+        changes = {'transient': {}, 'persistent': {}, 'indices': {}}
+
+        if parsed_args.file:
+            import yaml
+
+            with open(parsed_args.file, 'r') as settings_file:
+                content = yaml.safe_load(settings_file) or {}
+
+            for persistency in self.persistencies:
+                changes[persistency].update(
+                    flatten_dict(content.get(persistency) or {})
+                )
+            for pattern, settings in (content.get('indices') or {}).items():
+                changes['indices'].setdefault(pattern, {}).update(
+                    flatten_dict(settings or {})
+                )
+
+        if parsed_args.index:
+            target = changes['indices'].setdefault(parsed_args.index, {})
+        elif parsed_args.persistent:
+            target = changes['persistent']
+        else:
+            target = changes['transient']
+
+        for assignment in parsed_args.assignments:
+            key, separator, value = assignment.partition('=')
+            if not separator:
+                self.log.critical(
+                    'Invalid setting {}, expected key=value'.format(assignment)
+                )
+                sys.exit(1)
+            target[key] = None if value in ('', 'null') else value
+
+        return changes
+
+    def current_values(self, changes):
+        current = {'transient': {}, 'persistent': {}, 'indices': {}}
+
+        for persistency in self.persistencies:
+            if changes[persistency]:
+                values = self.settings.get_many(
+                    list(changes[persistency].keys()),
+                    persistency=persistency
+                )
+                current[persistency] = dict(
+                    (key, values.get(key)) for key in changes[persistency]
+                )
+
+        for pattern, settings in changes['indices'].items():
+            current['indices'][pattern] = IndexSettings(pattern).get_many(
+                list(settings.keys())
+            )
+
+        return current
+
+    def print_diff(self, changes, current):
+        for persistency in self.persistencies:
+            for key, value in sorted(changes[persistency].items()):
+                self.print_change(
+                    persistency,
+                    key,
+                    current[persistency].get(key),
+                    value
+                )
+
+        for pattern, settings in sorted(changes['indices'].items()):
+            for index_name, values in current['indices'][pattern].items():
+                for key, value in sorted(settings.items()):
+                    self.print_change(index_name, key, values.get(key), value)
+
+    def print_change(self, scope, key, current, value):
+        color = Color.END if str(current) == str(value) else Color.YELLOW
+        print_output("[{}] {} : {} -> {}{}{}".format(
+            scope,
+            key,
+            current,
+            color,
+            value,
+            Color.END
+        ))
+
+    def write_revert_file(self, path, current):
+        import yaml
+
+        revert = {}
+        for persistency in self.persistencies:
+            if current[persistency]:
+                revert[persistency] = current[persistency]
+
+        # Indices of a pattern sharing the same values are reverted in a
+        # single request, on the pattern itself when they all do
+        indices = {}
+        for pattern in sorted(current['indices']):
+            groups = collections.OrderedDict()
+            for index_name, values in current['indices'][pattern].items():
+                group = tuple(sorted(values.items(), key=str))
+                groups.setdefault(group, []).append(index_name)
+
+            if len(groups) == 1:
+                indices[pattern] = dict(next(iter(groups)))
+                continue
+
+            for group, index_names in groups.items():
+                for batch in index_batches(index_names):
+                    indices[batch] = dict(group)
+
+        if indices:
+            revert['indices'] = indices
+
+        with open(path, 'w') as revert_file:
+            yaml.safe_dump(revert, revert_file, default_flow_style=False)
+
+        self.log.info('Revert file written to {}'.format(path))
+
+    def get_parser(self, prog_name):
+        parser = super(ClusterSettingsApply, self).get_parser(prog_name)
+        parser.add_argument(
+            "assignments",
+            metavar="<key=value>",
+            nargs='*',
+            help=("Setting to apply, 'null' resets it. Can be repeated")
+        )
+        parser.add_argument(
+            '-f', '--file',
+            action='store',
+            help=("YAML or JSON file with transient, persistent and indices"
+                  " sections")
+        )
+        scope_group = parser.add_mutually_exclusive_group()
+        scope_group.add_argument(
+            "--transient",
+            action="store_true",
+            help=("Apply key=value arguments as transient (default)")
+        )
+        scope_group.add_argument(
+            "--persistent",
+            action="store_true",
+            help=("Apply key=value arguments as persistent")
+        )
+        scope_group.add_argument(
+            "--index",
+            action="store",
+            metavar="<pattern>",
+            help=("Apply key=value arguments to the matching indices")
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help=("Only show the difference with current values")
+        )
+        parser.add_argument(
+            '--revert-file',
+            action='store',
+            help=("Write current values to this file, to roll back with"
+                  " 'cluster settings apply -f <file>'")
+        )
+        return parser
@@ -1,7 +1,161 @@
 import logging
 
+import elasticsearch as elasticsearch
+
 from cliff.command import Command
+from escli.balance import BalancePlanner, ShardTable, skew
 from escli.main import Escli
+from escli.progress import format_bytes
+from escli.utils import EscliLister, parse_duration, time_value
+
+
+class ClusterRerouteBalance(EscliLister):
+    """Plan, and optionally run, shard moves balancing the nodes."""
+
+    log = logging.getLogger(__name__)
+
+    def take_action(self, parsed_args):
+        table = ShardTable.from_cat(
+            Escli._es.cat.shards(
+                format='json',
+                bytes='b',
+                h='index,shard,prirep,state,store,node'
+            ),
+            Escli._es.cat.allocation(
+                format='json',
+                bytes='b',
+                h='node,disk.used,disk.total'
+            )
+        )
+        self.analyze(table)
+
+        moves = BalancePlanner(
+            table,
+            by=parsed_args.by,
+            target=parsed_args.target,
+            max_moves=parsed_args.max_moves,
+            max_disk_percent=parsed_args.max_disk_percent
+        ).plan()
+        self.log.info('{} moves planned'.format(len(moves)))
+
+        if parsed_args.execute and moves:
+            self.execute(moves, parsed_args)
+
+        return (
+            ('Index', 'Shard', 'From', 'To', 'Size'),
+            (
+                (index, shard, source, destination, format_bytes(size))
+                for index, shard, source, destination, size in moves
+            )
+        )
+
+    def analyze(self, table):
+        shards, primaries, disk = table.loads()
+
+        self.log.info(
+            '{} shards on {} nodes - skew : shards {:.1%}, primaries {:.1%},'
+            ' disk {:.1%}'.format(
+                len(table),
+                len(table.nodes),
+                skew(shards),
+                skew(primaries),
+                skew(disk)
+            )
+        )
+
+        for index, node, count, expected in table.hot_spots():
+            self.log.info('Hot spot : {} has {} shards on {} ({} expected)'
+                          .format(index, count, node, expected))
+
+    def execute(self, moves, parsed_args):
+        """Send the moves by batches of --max-relocations, waiting for the
+        relocations of a batch to end before the next one."""
+        poll = parse_duration(parsed_args.poll)
+
+        for start in range(0, len(moves), parsed_args.max_relocations):
+            batch = moves[start:start + parsed_args.max_relocations]
+            self.log.info('Moving shards {} to {} of {}'.format(
+                start + 1,
+                start + len(batch),
+                len(moves)
+            ))
+
+            try:
+                Escli._es.cluster.reroute(body={'commands': [
+                    {'move': {
+                        'index': index,
+                        'shard': shard,
+                        'from_node': source,
+                        'to_node': destination
+                    }}
+                    for index, shard, source, destination, _ in batch
+                ]})
+            except elasticsearch.TransportError as err:
+                self.log.error('Cannot move shards : {}'.format(err))
+                self.exit_code = 1
+                return
+
+            # Relocations not over before the timeout answer 408
+            while Escli._es.cluster.health(
+                wait_for_no_relocating_shards=True,
+                timeout=time_value(poll),
+                request_timeout=poll + 30,
+                ignore=408
+            ).get('timed_out'):
+                self.log.debug('Shards are still relocating')
+
+    def get_parser(self, prog_name):
+        parser = super(ClusterRerouteBalance, self).get_parser(prog_name)
+        parser.add_argument(
+            '--by',
+            action='store',
+            choices=['shards', 'disk'],
+            default='shards',
+            help=("Balance shard counts or disk usage (Default: shards)")
+        )
+        parser.add_argument(
+            '--target',
+            action='store',
+            type=float,
+            default=0.1,
+            help=("Skew to reach, how much the most loaded node may exceed"
+                  " the mean (Default: 0.1)")
+        )
+        parser.add_argument(
+            '--max-moves',
+            action='store',
+            type=int,
+            default=1000,
+            help=("Maximum number of moves to plan (Default: 1000)")
+        )
+        parser.add_argument(
+            '--max-disk-percent',
+            action='store',
+            type=float,
+            default=80,
+            help=("Never fill a node's disk over this (Default: 80)")
+        )
+        parser.add_argument(
+            '--execute',
+            action='store_true',
+            help=("Move the shards instead of only listing the plan")
+        )
+        parser.add_argument(
+            '--max-relocations',
+            action='store',
+            type=int,
+            default=10,
+            help=("Moves sent at once, the next batch waits for the"
+                  " relocations to end (Default: 10)")
+        )
+        parser.add_argument(
+            '--poll',
+            action='store',
+            default='30s',
+            help=("Duration of each health long poll while waiting for"
+                  " relocations (Default: 30s)")
+        )
+        return parser
 
 
 class ClusterRerouteRetry(Command):
@@ -0,0 +1,181 @@
+import bisect
+import hashlib
+import importlib
+import json
+import logging
+import os
+
+from cliff.commandmanager import CommandManager
+
+import escli
+from escli import utils
+
+
+# Distribution declaring the commands as entry points
+DISTRIBUTION = 'escli'
+
+
+class IndexedCommand:
+    """Entry point-like object resolved from the command index.
+
+    Only the module holding the command is imported, when cliff dispatches
+    to it.
+    """
+
+    def __init__(self, name, value):
+        super(IndexedCommand, self).__init__()
+        self.name = name
+        self.value = value
+
+    def load(self):
+        module_name, class_name = self.value.split(':')
+        module = importlib.import_module(module_name.strip())
+
+        return getattr(module, class_name.strip())
+
+
+class CommandIndex:
+    """Precomputed map of command names to their ``module:Class`` target.
+
+    The index is built from the installed entry points on first run, saved
+    in escli's cache directory and rebuilt when the installed version or
+    entry points of escli change.
+    """
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, namespace, path=None):
+        super(CommandIndex, self).__init__()
+        self.namespace = namespace
+        self.path = path or utils.cache_path(
+            '{}-commands.json'.format(namespace)
+        )
+        self.key = self.installed_key()
+        self.commands = self.load()
+        self.names = sorted(self.commands)
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as index_file:
+                index = json.load(index_file)
+        except (IOError, ValueError):
+            index = {}
+
+        if index.get('key') == self.key and \
+                index.get('commands'):
+            return index.get('commands')
+
+        self.log.debug('Command index is missing or outdated, rebuilding it')
+
+        return self.rebuild()
+
+    def rebuild(self):
+        commands = self.scan()
+        self.save(commands)
+
+        return commands
+
+    def installed_key(self):
+        """Version and entry points hash of the installed distribution."""
+        try:
+            import importlib.metadata as metadata
+        except ImportError:
+            metadata = None
+
+        try:
+            if metadata is not None:
+                distribution = metadata.distribution(DISTRIBUTION)
+                entry_points = distribution.read_text('entry_points.txt')
+            else:
+                import pkg_resources
+
+                distribution = pkg_resources.get_distribution(DISTRIBUTION)
+                entry_points = distribution.get_metadata('entry_points.txt') \
+                    if distribution.has_metadata('entry_points.txt') else ''
+        except Exception as err:
+            # Running from sources, only escli's version is known
+            self.log.debug('Cannot read installed entry points : {}'.format(
+                err
+            ))
+            return escli.__version__
+
+        return '{}-{}'.format(
+            distribution.version,
+            hashlib.sha1((entry_points or '').encode('utf-8')).hexdigest()
+        )
+
+    def scan(self):
+        try:
+            import importlib.metadata
+        except ImportError:
+            import pkg_resources
+
+            return dict(
+                (entry_point.name.strip().replace('_', ' '), '{}:{}'.format(
+                    entry_point.module_name,
+                    '.'.join(entry_point.attrs)
+                ))
+                for entry_point in pkg_resources.iter_entry_points(
+                    self.namespace
+                )
+            )
+
+        entry_points = importlib.metadata.entry_points()
+
+        if hasattr(entry_points, 'select'):
+            entry_points = entry_points.select(group=self.namespace)
+        else:
+            entry_points = entry_points.get(self.namespace, [])
+
+        return dict(
+            (entry_point.name.strip().replace('_', ' '), entry_point.value)
+            for entry_point in entry_points
+        )
+
+    def save(self, commands):
+        temporary_path = '{}.{}'.format(self.path, os.getpid())
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temporary_path, 'w') as index_file:
+                json.dump({
+                    'key': self.key,
+                    'commands': commands
+                }, index_file, indent=2, sort_keys=True)
+            os.replace(temporary_path, self.path)
+        except OSError as err:
+            self.log.debug('Cannot write command index : {}'.format(err))
+
+    def add(self, name, value):
+        if name not in self.commands:
+            bisect.insort(self.names, name)
+        self.commands[name] = value
+
+    def complete(self, prefix):
+        """Return command names starting with ``prefix``."""
+        matches = []
+
+        for name in self.names[bisect.bisect_left(self.names, prefix):]:
+            if not name.startswith(prefix):
+                break
+            matches.append(name)
+
+        return matches
+
+
+class EscliCommandManager(CommandManager):
+    """Command manager dispatching through the :class:`CommandIndex`."""
+
+    def load_commands(self, namespace):
+        self.group_list.append(namespace)
+        self.index = CommandIndex(namespace)
+
+        for name, value in self.index.commands.items():
+            self.commands[name] = IndexedCommand(name, value)
+
+    def add_command(self, name, command_class):
+        super(EscliCommandManager, self).add_command(name, command_class)
+        self.index.add(name, '{}:{}'.format(
+            command_class.__module__,
+            command_class.__name__
+        ))
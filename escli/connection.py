@@ -0,0 +1,139 @@
+import logging
+import random
+import time
+
+import elasticsearch as elasticsearch
+import urllib3
+from elasticsearch.connection import Urllib3HttpConnection
+from elasticsearch.connection_pool import ConnectionSelector, \
+    RandomSelector, RoundRobinSelector
+
+from escli import serializers
+
+
+log = logging.getLogger(__name__)
+
+
+class TimedConnection(Urllib3HttpConnection):
+    """HTTP connection keeping a moving average of its request latency."""
+
+    # Weight of the last request in the moving average
+    smoothing = 0.3
+
+    def __init__(self, *args, **kwargs):
+        super(TimedConnection, self).__init__(*args, **kwargs)
+        self.latency = None
+
+    def perform_request(self, *args, **kwargs):
+        start = time.time()
+        # Failed requests are left out, a timeout or an error page says
+        # nothing of the usual latency of the node
+        response = super(TimedConnection, self).perform_request(
+            *args, **kwargs
+        )
+        self.record_latency(time.time() - start)
+
+        return response
+
+    def record_latency(self, duration):
+        if self.latency is None:
+            self.latency = duration
+        else:
+            self.latency = self.smoothing * duration + \
+                (1 - self.smoothing) * self.latency
+
+
+class LeastLatencySelector(ConnectionSelector):
+    """Select a live connection among those with the lowest average latency.
+
+    Connections which never served a request are tried first, so that each
+    node gets measured once. Requests are then spread over the connections
+    within ``tolerance`` of the fastest one, and a ``probe_rate`` share of
+    them goes to any connection, so that a node slow once gets measured
+    again.
+    """
+
+    tolerance = 0.2
+    probe_rate = 0.05
+
+    def select(self, connections):
+        unmeasured = [
+            connection for connection in connections
+            if getattr(connection, 'latency', None) is None
+        ]
+
+        if unmeasured:
+            return random.choice(unmeasured)
+
+        if random.random() < self.probe_rate:
+            return random.choice(connections)
+
+        best = min(connection.latency for connection in connections)
+
+        return random.choice([
+            connection for connection in connections
+            if connection.latency <= best * (1 + self.tolerance)
+        ])
+
+
+SELECTORS = {
+    'round-robin': RoundRobinSelector,
+    'random': RandomSelector,
+    'least-latency': LeastLatencySelector,
+}
+
+# Per-cluster options read from the `clusters` block of ~/.esclirc, with
+# their default value. `max_retries` defaults to one retry per extra server.
+CLUSTER_OPTIONS = {
+    'selector': 'round-robin',
+    'sniff_on_start': False,
+    'sniff_on_connection_fail': False,
+    'sniffer_timeout': None,
+    'dead_timeout': 60,
+    'retry_on_timeout': False,
+    'max_retries': None,
+    'maxsize': 10,
+    'timeout': 10,
+    'serializer': 'auto',
+}
+
+
+def create_client(cluster, **kwargs):
+    """Build an Elasticsearch client over every server of ``cluster``.
+
+    :param cluster: cluster definition, as found in the `clusters` block of
+                    the configuration file
+    :param kwargs: extra keyword arguments passed to the client (auth,
+                   scheme, certificates verification...)
+    """
+    # Disable urllib's warnings
+    # See https://urllib3.readthedocs.io/en/latest/advanced-usage.html#ssl-warnings
+    urllib3.disable_warnings()
+
+    servers = cluster.get('servers')
+    options = dict(
+        (key, cluster.get(key, default))
+        for key, default in CLUSTER_OPTIONS.items()
+    )
+
+    if options['selector'] not in SELECTORS:
+        log.warning('Unknown selector {}, using round-robin'.format(
+            options['selector']
+        ))
+        options['selector'] = 'round-robin'
+
+    if options['max_retries'] is None:
+        options['max_retries'] = len(servers) - 1
+
+    serializer = serializers.client_serializer(options.pop('serializer'))
+    if serializer is not None:
+        options['serializer'] = serializer
+
+    log.debug('Connecting to {} with {}'.format(servers, options))
+
+    return elasticsearch.Elasticsearch(
+        servers,
+        connection_class=TimedConnection,
+        selector_class=SELECTORS[options.pop('selector')],
+        **dict(options, **kwargs)
+    )
@@ -0,0 +1,17 @@
+from cliff.formatters.base import ListFormatter
+
+from escli import serializers
+
+
+class NDJSONFormatter(ListFormatter):
+    """Output one JSON object per row, as rows are produced."""
+
+    def add_argument_group(self, parser):
+        pass
+
+    def emit_list(self, column_names, data, stdout, parsed_args):
+        for row in data:
+            stdout.write(serializers.dumps(
+                dict(zip(column_names, row)),
+                default=str
+            ) + '\n')
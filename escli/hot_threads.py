@@ -0,0 +1,124 @@
+import collections
+import re
+
+
+StackRecord = collections.namedtuple(
+    'StackRecord',
+    ['node', 'thread', 'usage', 'snapshots', 'frames']
+)
+
+THREAD_HEADER = re.compile(
+    r"^([\d.]+)% (?:\[.*?\] )?\(.*?\) \w+ usage by thread '(.*)'$"
+)
+SHARING = re.compile(r'^(\d+)/\d+ snapshots sharing following \d+ elements$')
+# Module prefix ('app//', 'java.base@17/') and source location of a frame
+FRAME_MODULE = re.compile(r'^[\w.@-]*/+')
+FRAME_SOURCE = re.compile(r'\([^()]*\)$')
+
+
+def parse(text):
+    """Parse the text of ``_nodes/hot_threads`` into ``StackRecord``s,
+    frames listed from the top of the stack."""
+    node = thread = usage = None
+    record = None
+
+    for line in text.splitlines():
+        line = line.strip()
+
+        if record is not None:
+            if line and not line.startswith(':::') and \
+                    not THREAD_HEADER.match(line) and \
+                    not SHARING.match(line) and line != 'unique snapshot':
+                record.frames.append(frame_name(line))
+                continue
+            yield record
+            record = None
+
+        if line.startswith(':::'):
+            node = line[3:].strip().split('}')[0].lstrip('{')
+            continue
+
+        match = THREAD_HEADER.match(line)
+        if match is not None:
+            usage = float(match.group(1))
+            thread = thread_pool(match.group(2))
+            continue
+
+        match = SHARING.match(line)
+        if match is not None or line == 'unique snapshot':
+            record = StackRecord(
+                node,
+                thread,
+                usage,
+                int(match.group(1)) if match is not None else 1,
+                []
+            )
+
+    if record is not None:
+        yield record
+
+
+def frame_name(frame):
+    return FRAME_SOURCE.sub('', FRAME_MODULE.sub('', frame))
+
+
+def thread_pool(thread):
+    """Name of the pool of an Elasticsearch thread, other threads are named
+    without their numbers."""
+    match = re.search(r'\]\[([^\[\]]+)\]\[T#\d+\]$', thread)
+    if match is not None:
+        return match.group(1)
+
+    return re.sub(r'\d+', 'N', thread)
+
+
+class HotThreadsProfile:
+    """Stack frequencies aggregated over several hot threads samples.
+
+    Each stack weighs the number of snapshots it was seen in.
+    """
+
+    def __init__(self):
+        super(HotThreadsProfile, self).__init__()
+        self.samples = 0
+        # (node, thread pool, frames from the root) -> snapshots
+        self.stacks = collections.Counter()
+
+    def add(self, text):
+        self.samples += 1
+
+        for record in parse(text):
+            self.stacks[(
+                record.node,
+                record.thread,
+                tuple(reversed(record.frames))
+            )] += record.snapshots
+
+    def collapsed(self, per_node=False):
+        """Yield the stacks in the collapsed format flame graph tools read:
+        ``root;...;leaf count``."""
+        stacks = collections.Counter()
+
+        for (node, thread, frames), count in self.stacks.items():
+            root = (node, thread) if per_node else (thread,)
+            stacks[';'.join(root + frames)] += count
+
+        for stack, count in sorted(stacks.items()):
+            yield '{} {}'.format(stack, count)
+
+    def top(self, limit=10):
+        """Return ``(node, frame, snapshots, percent)`` of the frames on top
+        of the most snapshots, per node."""
+        frames = collections.defaultdict(collections.Counter)
+
+        for (node, thread, stack), count in self.stacks.items():
+            if stack:
+                frames[node][stack[-1]] += count
+
+        rows = []
+        for node in sorted(frames):
+            total = sum(frames[node].values())
+            for frame, count in frames[node].most_common(limit):
+                rows.append((node, frame, count, 100.0 * count / total))
+
+        return rows
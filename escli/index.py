@@ -1,9 +1,17 @@
 import logging
+import sys
+import time
+
+import elasticsearch
 
 from cliff.lister import Lister
 from cliff.command import Command
-from escli.settings import IndexSettings
+from cliff.show import ShowOne
+from escli.bulk import AdaptiveConcurrency, BulkLoader, TransformStage, \
+    document_actions
+from escli.settings import IndexSettings, LazySettings
 from escli.main import Escli
+from escli.progress import Progress, format_duration
 from escli.utils import JSONFormatter, print_output
 
 
@@ -32,11 +40,210 @@ class IndexCreate(Command):
         return parser
 
 
+class IndexBulkLoad(ShowOne):
+    """Load NDJSON documents into an index through the bulk API."""
+
+    log = logging.getLogger(__name__)
+
+    def take_action(self, parsed_args):
+        dead_letter = None
+        if parsed_args.dead_letter:
+            dead_letter = open(parsed_args.dead_letter, 'a')
+
+        loader = BulkLoader(
+            Escli._es,
+            batch_docs=parsed_args.batch_docs,
+            batch_bytes=parsed_args.batch_size * 1024 * 1024,
+            concurrency=AdaptiveConcurrency(
+                initial=parsed_args.concurrency,
+                maximum=parsed_args.max_concurrency,
+                target_latency=parsed_args.target_latency
+            ),
+            max_retries=parsed_args.max_retries,
+            backoff=parsed_args.backoff,
+            dead_letter=dead_letter
+        )
+
+        self.log.info('Loading documents into ' + parsed_args.index)
+
+        try:
+            summary = loader.run(self.actions(parsed_args, loader))
+        finally:
+            if dead_letter is not None:
+                dead_letter.close()
+
+        summary['concurrency'] = loader.concurrency.limit
+
+        json_formatter = JSONFormatter(summary)
+        return json_formatter.to_show_one(lines=[
+            ('documents'),
+            ('failures'),
+            ('retries'),
+            ('requests'),
+            ('seconds'),
+            ('docs/s', 'Docs/s'),
+            ('MB/s', 'MB/s'),
+            ('concurrency', 'Final concurrency'),
+        ])
+
+    def actions(self, parsed_args, loader):
+        if parsed_args.transform is None:
+            return document_actions(
+                self.read(parsed_args.files),
+                parsed_args.index,
+                op_type=parsed_args.op_type,
+                id_field=parsed_args.id_field,
+                on_failure=lambda line, reason: loader.fail(
+                    line,
+                    None,
+                    {'type': 'parse_exception', 'reason': reason}
+                )
+            )
+
+        stage = TransformStage(
+            parsed_args.transform,
+            parsed_args.index,
+            op_type=parsed_args.op_type,
+            id_field=parsed_args.id_field,
+            workers=parsed_args.transform_workers,
+            batch_size=parsed_args.transform_batch,
+            ordered=parsed_args.ordered
+        )
+        stage.on_failure = lambda line, reason: loader.fail(
+            line,
+            None,
+            {'type': 'transform_exception', 'reason': reason}
+        )
+
+        return stage.run(self.read(parsed_args.files))
+
+    def read(self, files):
+        if not files or files == ['-']:
+            yield from sys.stdin.buffer
+            return
+
+        for path in files:
+            with open(path, 'rb') as input_file:
+                yield from input_file
+
+    def get_parser(self, prog_name):
+        parser = super(IndexBulkLoad, self).get_parser(prog_name)
+        parser.add_argument(
+            "index",
+            metavar="<index>",
+            help=("Index to load documents into"),
+        )
+        parser.add_argument(
+            "files",
+            metavar="<file>",
+            nargs='*',
+            help=("NDJSON files to load, one document per line"
+                  " (Default: stdin)"),
+        )
+        parser.add_argument(
+            '--id-field',
+            action='store',
+            help=("Document field to use as document id")
+        )
+        parser.add_argument(
+            '--op-type',
+            action='store',
+            choices=['index', 'create'],
+            default='index',
+            help=("Bulk operation (Default: index)")
+        )
+        parser.add_argument(
+            '--transform',
+            action='store',
+            metavar='<module.function>',
+            help=("Dotted path of a callable receiving each document and"
+                  " returning the document to load, or None to skip it")
+        )
+        parser.add_argument(
+            '--transform-workers',
+            action='store',
+            type=int,
+            help=("Number of processes running the transform"
+                  " (Default: one per CPU)")
+        )
+        parser.add_argument(
+            '--transform-batch',
+            action='store',
+            type=int,
+            default=500,
+            help=("Number of documents sent to a transform process at once"
+                  " (Default: 500)")
+        )
+        parser.add_argument(
+            '--ordered',
+            action='store_true',
+            help=("Keep input order through the transform stage")
+        )
+        parser.add_argument(
+            '--batch-docs',
+            action='store',
+            type=int,
+            default=1000,
+            help=("Maximum number of documents per request (Default: 1000)")
+        )
+        parser.add_argument(
+            '--batch-size',
+            action='store',
+            type=float,
+            default=5,
+            help=("Maximum size of a request, in MB (Default: 5)")
+        )
+        parser.add_argument(
+            '--concurrency',
+            action='store',
+            type=int,
+            default=2,
+            help=("Initial number of requests in flight (Default: 2)")
+        )
+        parser.add_argument(
+            '--max-concurrency',
+            action='store',
+            type=int,
+            default=16,
+            help=("Maximum number of requests in flight (Default: 16)")
+        )
+        parser.add_argument(
+            '--target-latency',
+            action='store',
+            type=float,
+            help=("Reduce concurrency when requests take longer than this"
+                  " many seconds")
+        )
+        parser.add_argument(
+            '--max-retries',
+            action='store',
+            type=int,
+            default=5,
+            help=("Number of times rejected documents are sent again"
+                  " (Default: 5)")
+        )
+        parser.add_argument(
+            '--backoff',
+            action='store',
+            type=float,
+            default=0.5,
+            help=("Initial delay before a retry, in seconds, doubled on each"
+                  " attempt (Default: 0.5)")
+        )
+        parser.add_argument(
+            '--dead-letter',
+            action='store',
+            help=("File where documents which cannot be loaded are"
+                  " appended")
+        )
+        return parser
+
+
 class IndexList(Lister):
     """List all indices."""
 
     log = logging.getLogger(__name__)
-    settings = IndexSettings()
+    settings = LazySettings(IndexSettings)
 
     def take_action(self, parsed_args):
         indices = Escli._es.cat.indices(format='json')
@@ -59,7 +266,7 @@ class IndexClose(Command):
     """Close an index."""
 
     log = logging.getLogger(__name__)
-    settings = IndexSettings()
+    settings = LazySettings(IndexSettings)
 
     def take_action(self, parsed_args):
         self.log.info('Closing index ' + parsed_args.index)
@@ -79,7 +286,7 @@ class IndexDelete(Command):
     """Delete an index."""
 
     log = logging.getLogger(__name__)
-    settings = IndexSettings()
+    settings = LazySettings(IndexSettings)
 
     def take_action(self, parsed_args):
         self.log.info('Deleting index ' + parsed_args.index)
@@ -99,7 +306,7 @@ class IndexOpen(Command):
     """Open an index."""
 
     log = logging.getLogger(__name__)
-    settings = IndexSettings()
+    settings = LazySettings(IndexSettings)
 
     def take_action(self, parsed_args):
         self.log.info('Opening index ' + parsed_args.index)
@@ -115,6 +322,268 @@ class IndexOpen(Command):
         return parser
 
 
+class IndexReindex(Command):
+    """Copy documents from an index to another and follow the progress."""
+
+    log = logging.getLogger(__name__)
+
+    # Destination settings used while documents are copied
+    bulk_settings = {
+        'index.number_of_replicas': 0,
+        'index.refresh_interval': -1
+    }
+
+    def take_action(self, parsed_args):
+        original_settings = None
+
+        if parsed_args.optimize_destination:
+            original_settings = self.optimize_destination(parsed_args.dest)
+
+        try:
+            task_id = Escli._es.reindex(
+                body=self.build_body(parsed_args),
+                slices=parsed_args.slices,
+                requests_per_second=parsed_args.requests_per_second,
+                wait_for_completion=False
+            ).get('task')
+        except Exception:
+            # Nothing is copied, the destination gets its settings back
+            if original_settings is not None:
+                self.restore_destination(parsed_args.dest, original_settings)
+            raise
+
+        self.log.info('Reindexing {} into {}, task {}'.format(
+            parsed_args.source,
+            parsed_args.dest,
+            task_id
+        ))
+        self.log.info(
+            'Change throughput with : escli index reindex rethrottle'
+            ' {} <requests_per_second>'.format(task_id)
+        )
+
+        try:
+            task = self.follow(task_id, parsed_args.interval)
+        except (KeyboardInterrupt, elasticsearch.TransportError) as err:
+            if isinstance(err, elasticsearch.TransportError):
+                self.log.error('Cannot follow task {} : {}'.format(
+                    task_id,
+                    err
+                ))
+            self.log.warning(
+                'Stopped following task {}, it keeps running'.format(task_id)
+            )
+            if original_settings is not None:
+                self.log.warning(
+                    'Restore {} settings once done : {}'.format(
+                        parsed_args.dest,
+                        original_settings
+                    )
+                )
+            return 1
+
+        if original_settings is not None:
+            self.restore_destination(parsed_args.dest, original_settings)
+
+        response = task.get('response') or {}
+        failures = response.get('failures') or []
+        if task.get('error') is not None or len(failures) > 0:
+            self.log.error('Reindex failed : {}'.format(
+                task.get('error') or failures[0]
+            ))
+            return 1
+
+        if parsed_args.swap_alias:
+            self.swap_alias(parsed_args.swap_alias, parsed_args.dest)
+
+        return 0
+
+    def build_body(self, parsed_args):
+        body = {
+            'source': {
+                'index': parsed_args.source,
+                'size': parsed_args.size
+            },
+            'dest': {
+                'index': parsed_args.dest,
+                'op_type': parsed_args.op_type
+            },
+            'conflicts': parsed_args.conflicts
+        }
+
+        return body
+
+    def optimize_destination(self, index):
+        if not Escli._es.indices.exists(index=index):
+            self.log.warning(
+                '{} does not exist, create it first to optimize its'
+                ' settings'.format(index)
+            )
+            return None
+
+        settings = Escli._es.indices.get_settings(
+            index=index,
+            name=','.join(self.bulk_settings.keys()),
+            flat_settings=True
+        ).get(index, {}).get('settings', {})
+        original_settings = dict(
+            (key, settings.get(key)) for key in self.bulk_settings.keys()
+        )
+
+        self.log.info('Setting {} on {}'.format(self.bulk_settings, index))
+        Escli._es.indices.put_settings(index=index, body=self.bulk_settings)
+
+        return original_settings
+
+    def restore_destination(self, index, original_settings):
+        self.log.info('Restoring {} settings : {}'.format(
+            index,
+            original_settings
+        ))
+        Escli._es.indices.put_settings(index=index, body=original_settings)
+
+    def follow(self, task_id, interval):
+        progress = Progress()
+
+        while True:
+            task = Escli._es.tasks.get(task_id=task_id)
+            status = task.get('task').get('status')
+            done = sum(status.get(counter, 0) for counter in [
+                'created', 'updated', 'deleted', 'noops', 'version_conflicts'
+            ])
+            progress.update(done, total=status.get('total'))
+
+            self.log.info(
+                '{}/{} documents ({:.1f}%) - {} docs/s - {} batches - {}'
+                ' version conflicts - {} requests/s - ETA {}'.format(
+                    done,
+                    status.get('total'),
+                    progress.percent or 0,
+                    int(progress.rate or 0),
+                    status.get('batches'),
+                    status.get('version_conflicts'),
+                    status.get('requests_per_second'),
+                    format_duration(progress.eta)
+                )
+            )
+
+            if task.get('completed'):
+                return task
+
+            time.sleep(interval)
+
+    def swap_alias(self, alias, index):
+        current_indices = Escli._es.indices.get_alias(name=alias, ignore=404)
+        actions = [
+            {'remove': {'index': current_index, 'alias': alias}}
+            for current_index in current_indices
+            if current_index not in ('error', 'status')
+        ]
+        actions.append({'add': {'index': index, 'alias': alias}})
+
+        self.log.info('Moving alias {} to {}'.format(alias, index))
+        Escli._es.indices.update_aliases(body={'actions': actions})
+
+    def get_parser(self, prog_name):
+        parser = super(IndexReindex, self).get_parser(prog_name)
+        parser.add_argument(
+            "source",
+            metavar="<source>",
+            help=("Index to copy documents from"),
+        )
+        parser.add_argument(
+            "dest",
+            metavar="<dest>",
+            help=("Index to copy documents to"),
+        )
+        parser.add_argument(
+            '--slices',
+            action='store',
+            default='auto',
+            help=("Number of slices the task is divided into (Default: auto)")
+        )
+        parser.add_argument(
+            '--requests-per-second',
+            action='store',
+            type=float,
+            default=-1,
+            help=("Throttle the reindex to this many documents per second"
+                  " (Default: -1, no throttling)")
+        )
+        parser.add_argument(
+            '--size',
+            action='store',
+            type=int,
+            default=1000,
+            help=("Number of documents per batch (Default: 1000)")
+        )
+        parser.add_argument(
+            '--op-type',
+            action='store',
+            choices=['index', 'create'],
+            default='index',
+            help=("Destination operation (Default: index)")
+        )
+        parser.add_argument(
+            '--conflicts',
+            action='store',
+            choices=['abort', 'proceed'],
+            default='abort',
+            help=("What to do on version conflicts (Default: abort)")
+        )
+        parser.add_argument(
+            '--optimize-destination',
+            action='store_true',
+            help=("Set replicas to 0 and disable refresh on the destination"
+                  " during the copy, then restore them")
+        )
+        parser.add_argument(
+            '--swap-alias',
+            action='store',
+            metavar='<alias>',
+            help=("Move this alias to the destination once done")
+        )
+        parser.add_argument(
+            '--interval',
+            action='store',
+            type=float,
+            default=5,
+            help=("Seconds between two progress reports (Default: 5)")
+        )
+        return parser
+
+
+class IndexReindexRethrottle(Command):
+    """Change the throughput of a running reindex."""
+
+    log = logging.getLogger(__name__)
+
+    def take_action(self, parsed_args):
+        self.log.info('Throttling task {} to {} requests per second'.format(
+            parsed_args.task,
+            parsed_args.requests_per_second
+        ))
+        Escli._es.reindex_rethrottle(
+            task_id=parsed_args.task,
+            requests_per_second=parsed_args.requests_per_second
+        )
+
+    def get_parser(self, prog_name):
+        parser = super(IndexReindexRethrottle, self).get_parser(prog_name)
+        parser.add_argument(
+            "task",
+            metavar="<task>",
+            help=("Reindex task id"),
+        )
+        parser.add_argument(
+            "requests_per_second",
+            metavar="<requests_per_second>",
+            type=float,
+            help=("New throughput, -1 to disable throttling"),
+        )
+        return parser
+
+
 class IndexSettingsGet(Command):
     """Retrieve an index setting."""
 
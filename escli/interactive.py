@@ -68,9 +68,7 @@ class InteractiveApp(cmd2.Cmd):
 
     def _complete_prefix(self, prefix):
         """Returns cliff style commands with a specific prefix."""
-        if not prefix:
-            return [n for n, v in self.command_manager]
-        return [n for n, v in self.command_manager if n.startswith(prefix)]
+        return self.command_manager.index.complete(prefix or '')
 
     def help_help(self):
         # Use the command manager to get instructions for "help"
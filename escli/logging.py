@@ -1,14 +1,14 @@
 import logging
 
 from cliff.command import Command
-from escli.settings import ClusterSettings
+from escli.settings import ClusterSettings, LazySettings
 
 
 class LoggingGet(Command):
     """Get a logger value."""
 
     log = logging.getLogger(__name__)
-    settings = ClusterSettings()
+    settings = LazySettings(ClusterSettings)
 
     def take_action(self, parsed_args):
         persistency = "transient"
@@ -56,7 +56,7 @@ class LoggingReset(Command):
     """Reset a logger value."""
 
     log = logging.getLogger(__name__)
-    setting = ClusterSettings()
+    setting = LazySettings(ClusterSettings)
 
     def take_action(self, parsed_args):
         persistency = "transient"
@@ -104,7 +104,7 @@ class LoggingSet(Command):
     """Set a logger value."""
 
     log = logging.getLogger(__name__)
-    setting = ClusterSettings()
+    setting = LazySettings(ClusterSettings)
 
     def take_action(self, parsed_args):
         persistency = "transient"
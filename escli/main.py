@@ -1,33 +1,33 @@
 import logging
 import sys
-import pprint
 import argparse
-import pkg_resources
-import urllib3
 import warnings
 
-from box import Box
-import elasticsearch as elasticsearch
 from cliff.app import App
-from cliff.commandmanager import CommandManager
 
+import escli
 from escli import utils
-from escli.interactive import InteractiveApp
+from escli.commands import EscliCommandManager
+
+
+def interactive_app_factory(*args, **kwargs):
+    # cmd2 is expensive to import and only needed by the interactive shell.
+    from escli.interactive import InteractiveApp
+    return InteractiveApp(*args, **kwargs)
 
 
 class Escli(App):
 
-    _es = elasticsearch.Elasticsearch()
-    _pp = pprint.PrettyPrinter(indent=4)
+    _es = None
     _config = utils.ConfigFileParser()
 
     def __init__(self):
         super(Escli, self).__init__(
-            description=pkg_resources.require('Escli')[0].project_name,
-            version=pkg_resources.require('Escli')[0].version,
-            command_manager=CommandManager('escli'),
+            description=escli.__project__,
+            version=escli.__version__,
+            command_manager=EscliCommandManager('escli'),
             deferred_help=True,
-            interactive_app_factory=InteractiveApp
+            interactive_app_factory=interactive_app_factory
         )
         self.interactive_mode = False
 
@@ -38,10 +38,6 @@ class Escli(App):
         root_logger.setLevel(logging.DEBUG)
         logging.getLogger('elasticsearch').setLevel(logging.WARNING)
 
-        # Disable urllib's warnings
-        # See https://urllib3.readthedocs.io/en/latest/advanced-usage.html#ssl-warnings
-        urllib3.disable_warnings()
-
         # Set up logging to a file
         if self.options.log_file:
             file_handler = logging.FileHandler(
@@ -126,7 +122,7 @@ class Escli(App):
                 'password': self.options.password
             }
             cluster = {
-                'servers': [self.options.elasticsearch]
+                'servers': self.options.elasticsearch.split(',')
             }
             self.context = utils.Context('custom', user=user, cluster=cluster)
         elif self.options.context:
@@ -157,7 +153,7 @@ class Escli(App):
                     'password': None
                 }
                 cluster = {
-                    'servers': [self.options.elasticsearch]
+                    'servers': self.options.elasticsearch.split(',')
                 }
                 self.context = utils.Context(
                     'noauth',
@@ -166,6 +162,7 @@ class Escli(App):
                 )
 
         if hasattr(self._config, 'settings') and self._config.settings is not None:
+            from box import Box
             self.context.settings = Box(self._config.settings)
 
     def find_scheme(self):
@@ -181,6 +178,14 @@ class Escli(App):
     def initialize_app(self, argv):
         self._config.load_configuration()
         self.create_context()
+        Escli._es = utils.LazyClient(self.create_client)
+
+    def client_arguments(self):
+        """Return the cluster definition and client options of the context.
+
+        Both are plain data, so they can be sent to worker processes which
+        build their own client with :func:`escli.connection.create_client`.
+        """
         username = None
         password = None
 
@@ -188,32 +193,39 @@ class Escli(App):
             username = self.context.user.get('username')
             password = self.context.user.get('password')
 
-        servers = self.context.cluster.get('servers')[0]
-
         http_auth = (username, password) \
             if username and password \
             else None
 
-        if hasattr(self.context, 'settings') and \
-                'no_check_certificate' in self.context.settings and \
-                self.context.settings.no_check_certificate:
+        verify_certs = not (
+            hasattr(self.context, 'settings') and
+            'no_check_certificate' in self.context.settings and
+            self.context.settings.no_check_certificate
+        )
+
+        return self.context.cluster, {
+            'http_auth': http_auth,
+            'verify_certs': verify_certs,
+            'scheme': self.find_scheme()
+        }
+
+    def create_client(self):
+        """Build the Elasticsearch client for the current context.
+
+        Called by :class:`escli.utils.LazyClient` the first time a command
+        talks to the cluster, so commands which never do (help, config, ...)
+        don't pay for importing the client.
+        """
+        from escli import connection
+
+        cluster, kwargs = self.client_arguments()
+
+        if not kwargs.get('verify_certs'):
             with warnings.catch_warnings(record=True) as warning:
                 self.LOG.debug(warning)
-                Escli._es = elasticsearch.Elasticsearch(
-                    servers,
-                    http_auth=http_auth,
-                    verify_certs=False,
-                    scheme=self.find_scheme(),
-                    max_retries=0
-                )
-        else:
-            Escli._es = elasticsearch.Elasticsearch(
-                servers,
-                http_auth=http_auth,
-                verify_certs=True,
-                scheme=self.find_scheme(),
-                max_retries=0
-            )
+                return connection.create_client(cluster, **kwargs)
+
+        return connection.create_client(cluster, **kwargs)
 
     def prepare_to_run_command(self, cmd):
         pass
@@ -296,8 +308,8 @@ class Escli(App):
             '--elasticsearch',
             default="http://localhost:9200",
             action='store',
-            help='The elasticsearch host you wish to connect too. '
-            '(Default: localhost:9200)',
+            help='The elasticsearch host(s) you wish to connect too, '
+            'comma separated. (Default: localhost:9200)',
         )
 
         parser.add_argument(
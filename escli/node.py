@@ -1,18 +1,29 @@
 import logging
 import sys
+import time
+
+import elasticsearch as elasticsearch
 
 from cliff.command import Command
 from cliff.lister import Lister
+from escli.hot_threads import HotThreadsProfile
 from escli.main import Escli
-from escli.utils import JSONFormatter
-from escli.settings import ClusterSettings
+from escli.progress import Progress, format_bytes, format_duration
+from escli.utils import JSONFormatter, parse_duration
+from escli.settings import ClusterSettings, LazySettings
+from escli.top import COLUMNS, INDEX_METRIC, METRIC, NodeRates, \
+    filter_path, format_header, format_row, sort_rows
+
+EXCLUDE_NAME = 'cluster.routing.allocation.exclude._name'
+NODE_CONCURRENT_RECOVERIES = \
+    'cluster.routing.allocation.node_concurrent_recoveries'
 
 
 class NodeDecommission(Command):
     """Decommission a node."""
 
     log = logging.getLogger(__name__)
-    settings = ClusterSettings()
+    settings = LazySettings(ClusterSettings)
 
     def take_action(self, parsed_args):
         currently_excluded_nodes = self.settings.get(
@@ -59,6 +70,160 @@ class NodeDecommission(Command):
         return parser
 
 
+class NodeDrain(Command):
+    """Move every shard off nodes and wait until they are empty."""
+
+    log = logging.getLogger(__name__)
+    settings = LazySettings(ClusterSettings)
+
+    def take_action(self, parsed_args):
+        # Unknown names would be reported empty at once
+        unknown = self.unknown_nodes(parsed_args.names)
+        if unknown:
+            self.log.error('Unknown nodes : ' + ', '.join(unknown))
+            return 1
+
+        # Read the exclusion list from the cluster, not from the snapshot
+        self.settings.invalidate()
+        excluded = [
+            name for name in self.settings.get_many([EXCLUDE_NAME])
+            .get(EXCLUDE_NAME, '').split(',') if name
+        ]
+        changes = {EXCLUDE_NAME: ','.join(excluded + [
+            name for name in parsed_args.names if name not in excluded
+        ])}
+
+        previous_recoveries = None
+        if parsed_args.concurrent_recoveries is not None:
+            previous_recoveries = self.settings.get_many([
+                NODE_CONCURRENT_RECOVERIES
+            ]).get(NODE_CONCURRENT_RECOVERIES)
+            changes[NODE_CONCURRENT_RECOVERIES] = \
+                parsed_args.concurrent_recoveries
+
+        self.log.info('Draining ' + ', '.join(parsed_args.names))
+        if not self.settings.set_many(changes):
+            return 1
+
+        if parsed_args.no_wait:
+            return 0
+
+        try:
+            drained = self.wait(
+                parsed_args.names,
+                parse_duration(parsed_args.timeout),
+                parsed_args.interval
+            )
+        finally:
+            if parsed_args.concurrent_recoveries is not None:
+                # None resets the setting when it was not set before
+                self.settings.set_many({
+                    NODE_CONCURRENT_RECOVERIES: previous_recoveries
+                })
+
+        return 0 if drained else 1
+
+    def wait(self, names, timeout, interval):
+        """Report the shards left on ``names`` until they are empty or
+        ``timeout`` seconds passed. Returns whether the nodes are empty."""
+        deadline = time.time() + timeout
+        progress = Progress()
+        initial = None
+
+        while True:
+            left = self.shards_left(names)
+            bytes_left = sum(size for _, size in left.values())
+            if initial is None:
+                initial = bytes_left
+            progress.update(initial - bytes_left, total=initial)
+
+            for node, (shards, size) in sorted(left.items()):
+                self.log.info('{} : {} shards, {} left'.format(
+                    node,
+                    shards,
+                    format_bytes(size)
+                ))
+            self.log.info('{} moved - {}/s - ETA {}'.format(
+                format_bytes(progress.done),
+                format_bytes(progress.rate or 0),
+                format_duration(progress.eta)
+            ))
+
+            if all(shards == 0 for shards, _ in left.values()):
+                self.log.info('Nodes are empty')
+                return True
+
+            if time.time() >= deadline:
+                self.log.error('Nodes are not empty after {}'.format(
+                    format_duration(timeout)
+                ))
+                return False
+
+            time.sleep(interval)
+
+    def unknown_nodes(self, names):
+        nodes = set(
+            node.get('name')
+            for node in Escli._es.cat.nodes(format='json', h='name')
+        )
+
+        return [name for name in names if name not in nodes]
+
+    def shards_left(self, names):
+        allocation = Escli._es.cat.allocation(
+            node_id=','.join(names),
+            format='json',
+            bytes='b',
+            h='node,shards,disk.indices'
+        )
+
+        return dict(
+            (row.get('node'), (
+                int(row.get('shards') or 0),
+                int(row.get('disk.indices') or 0)
+            ))
+            for row in allocation if row.get('node') in names
+        )
+
+    def get_parser(self, prog_name):
+        parser = super(NodeDrain, self).get_parser(prog_name)
+        parser.add_argument(
+            "names",
+            metavar="<name>",
+            nargs='+',
+            help=("Names of the nodes to drain")
+        )
+        parser.add_argument(
+            '--timeout',
+            action='store',
+            default='1h',
+            help=("Time to wait for the nodes to be empty (Default: 1h)")
+        )
+        parser.add_argument(
+            '--interval',
+            action='store',
+            type=float,
+            default=10,
+            help=("Seconds between two progress reports (Default: 10)")
+        )
+        parser.add_argument(
+            '--concurrent-recoveries',
+            action='store',
+            type=int,
+            metavar='<n>',
+            help=("Value of node_concurrent_recoveries while draining, the"
+                  " previous value is restored once the wait ends (kept"
+                  " with --no-wait)")
+        )
+        parser.add_argument(
+            '--no-wait',
+            action='store_true',
+            help=("Only exclude the nodes, do not wait for them to be"
+                  " empty")
+        )
+        return parser
+
+
 class NodeHotThreads(Command):
     """Print hot threads on each nodes."""
 
@@ -80,11 +245,124 @@ class NodeHotThreads(Command):
         return parser
 
 
+class NodeHotThreadsProfile(Lister):
+    """Sample hot threads and report the hottest frames of each node."""
+
+    log = logging.getLogger(__name__)
+
+    def take_action(self, parsed_args):
+        profile = HotThreadsProfile()
+
+        for sample in range(parsed_args.samples):
+            if sample > 0:
+                time.sleep(parsed_args.every)
+
+            self.log.info('Sample {}/{}'.format(
+                sample + 1,
+                parsed_args.samples
+            ))
+            profile.add(Escli._es.nodes.hot_threads(
+                node_id=parsed_args.nodes,
+                type=parsed_args.type,
+                threads=parsed_args.threads,
+                interval=parsed_args.interval,
+                snapshots=parsed_args.snapshots,
+                ignore_idle_threads=True
+            ))
+
+        if parsed_args.collapsed:
+            with open(parsed_args.collapsed, 'w') as collapsed_file:
+                for line in profile.collapsed(per_node=parsed_args.per_node):
+                    collapsed_file.write(line + '\n')
+            self.log.info(
+                'Collapsed stacks written to ' + parsed_args.collapsed
+            )
+
+        return (
+            ('Node', 'Frame', 'Snapshots', '%'),
+            (
+                (node, frame, count, round(percent, 1))
+                for node, frame, count, percent
+                in profile.top(parsed_args.top)
+            )
+        )
+
+    def get_parser(self, prog_name):
+        parser = super(NodeHotThreadsProfile, self).get_parser(prog_name)
+        parser.add_argument(
+            "type",
+            metavar="<type>",
+            help=("Type"),
+            choices=['cpu', 'wait', 'block'],
+            default='cpu',
+            nargs='?'
+        )
+        parser.add_argument(
+            '--nodes',
+            action='store',
+            help=("Comma separated nodes to sample (Default: all)")
+        )
+        parser.add_argument(
+            '--samples',
+            action='store',
+            type=int,
+            default=10,
+            help=("Number of hot threads requests (Default: 10)")
+        )
+        parser.add_argument(
+            '--every',
+            action='store',
+            type=float,
+            default=1,
+            help=("Seconds between two samples (Default: 1)")
+        )
+        parser.add_argument(
+            '--threads',
+            action='store',
+            type=int,
+            default=3,
+            help=("Hot threads reported per node and sample (Default: 3)")
+        )
+        parser.add_argument(
+            '--interval',
+            action='store',
+            default='500ms',
+            help=("Time each sample measures threads over (Default: 500ms)")
+        )
+        parser.add_argument(
+            '--snapshots',
+            action='store',
+            type=int,
+            default=10,
+            help=("Stack snapshots per thread and sample (Default: 10)")
+        )
+        parser.add_argument(
+            '--top',
+            action='store',
+            type=int,
+            default=10,
+            help=("Hottest frames listed per node (Default: 10)")
+        )
+        parser.add_argument(
+            '--collapsed',
+            action='store',
+            metavar='<file>',
+            help=("Write the stacks in the collapsed format of flame graph"
+                  " tools")
+        )
+        parser.add_argument(
+            '--per-node',
+            action='store_true',
+            help=("Keep nodes apart in the collapsed stacks")
+        )
+        return parser
+
+
 class NodeRecommission(Command):
     """Recommission a node."""
 
     log = logging.getLogger(__name__)
-    settings = ClusterSettings()
+    settings = LazySettings(ClusterSettings)
 
     def take_action(self, parsed_args):
         currently_excluded_nodes = self.settings.get(
@@ -131,3 +409,152 @@ class NodeList(Lister):
             ('master'),
             ('name')
         ])
+
+
+class NodeTop(Command):
+    """Live view of indexing, search, merges, GC, thread pools and network
+    of each node."""
+
+    log = logging.getLogger(__name__)
+
+    HEADERS = ['Node'] + [column.header for column in COLUMNS]
+    KEYS = "q quit, < > sort column, r reverse"
+
+    def take_action(self, parsed_args):
+        self.rates = NodeRates()
+        self.sort = self.HEADERS.index(parsed_args.sort)
+        self.reverse = True
+        # Lines on screen, only changed lines are drawn again
+        self.screen_lines = []
+        # Error of the last poll, shown on the status line
+        self.error = None
+
+        # Not at the top of the module, the other node commands do not need
+        # curses and some Pythons lack it
+        import curses
+        self.curses = curses
+
+        try:
+            curses.wrapper(self.loop, parse_duration(parsed_args.interval))
+        except KeyboardInterrupt:
+            pass
+
+    def poll(self):
+        # Escli._es keeps its connection alive between polls
+        return self.rates.update(
+            Escli._es.nodes.stats(
+                metric=METRIC,
+                index_metric=INDEX_METRIC,
+                filter_path=filter_path()
+            ),
+            time.time()
+        )
+
+    def loop(self, screen, interval):
+        curses = self.curses
+        rows = []
+
+        try:
+            curses.curs_set(0)
+        except curses.error:
+            pass
+
+        while True:
+            start = time.time()
+            # Rows of the last successful poll stay on screen
+            try:
+                rows = self.poll()
+                self.error = None
+            except elasticsearch.TransportError as err:
+                self.error = str(err)
+            self.draw(screen, rows)
+
+            # Keys are handled until the next poll, which is due interval
+            # after the start of this one
+            remaining = interval - (time.time() - start)
+            while remaining > 0:
+                screen.timeout(int(remaining * 1000))
+                key = screen.getch()
+                if key == -1:
+                    break
+                if not self.handle(key):
+                    return
+                if key == curses.KEY_RESIZE:
+                    screen.erase()
+                    self.screen_lines = []
+                self.draw(screen, rows)
+                remaining = interval - (time.time() - start)
+
+    def handle(self, key):
+        """Apply a key, return whether to go on."""
+        curses = self.curses
+
+        if key in (ord('q'), ord('Q'), 27):
+            return False
+
+        if key in (curses.KEY_RIGHT, ord('>')):
+            self.sort = (self.sort + 1) % len(self.HEADERS)
+        elif key in (curses.KEY_LEFT, ord('<')):
+            self.sort = (self.sort - 1) % len(self.HEADERS)
+        elif key in (ord('r'), ord('R')):
+            self.reverse = not self.reverse
+
+        return True
+
+    def lines(self, rows, height, width):
+        name_width = min(max([len(row[0]) for row in rows] + [4]) + 2, 30)
+        header = format_header(name_width)
+
+        if self.error is not None:
+            status = 'Poll failed : {}  ({})'.format(self.error, self.KEYS)
+        else:
+            status = '{} nodes, sorted by {} {}  ({})'.format(
+                len(rows),
+                self.HEADERS[self.sort],
+                'desc' if self.reverse else 'asc',
+                self.KEYS
+            )
+
+        lines = [
+            status,
+            header,
+        ] + [
+            format_row(row, name_width)
+            for row in sort_rows(rows, self.sort, self.reverse)
+        ]
+
+        return [line[:width - 1] for line in lines[:height]]
+
+    def draw(self, screen, rows):
+        height, width = screen.getmaxyx()
+        lines = self.lines(rows, height, width)
+
+        for y, line in enumerate(lines):
+            if y < len(self.screen_lines) and self.screen_lines[y] == line:
+                continue
+            screen.addstr(y, 0, line,
+                          self.curses.A_REVERSE if y == 1 else 0)
+            screen.clrtoeol()
+        for y in range(len(lines), len(self.screen_lines)):
+            screen.move(y, 0)
+            screen.clrtoeol()
+
+        self.screen_lines = lines
+        screen.refresh()
+
+    def get_parser(self, prog_name):
+        parser = super(NodeTop, self).get_parser(prog_name)
+        parser.add_argument(
+            '--interval',
+            action='store',
+            default='1s',
+            help=("Time between two refreshes (Default: 1s)")
+        )
+        parser.add_argument(
+            '--sort',
+            action='store',
+            default='Index/s',
+            choices=self.HEADERS,
+            help=("Column to sort on (Default: Index/s)")
+        )
+        return parser
@@ -0,0 +1,83 @@
+import collections
+import time
+
+
+class Progress:
+    """Rate and ETA of a long running operation.
+
+    The rate is computed over the last ``window`` samples, so it follows
+    throughput changes (throttling, nodes joining...) instead of averaging
+    the whole run.
+    """
+
+    def __init__(self, total=None, window=10):
+        super(Progress, self).__init__()
+        self.total = total
+        self.samples = collections.deque(maxlen=window + 1)
+
+    def update(self, done, total=None, now=None):
+        if total is not None:
+            self.total = total
+        self.samples.append((now if now is not None else time.time(), done))
+
+    @property
+    def done(self):
+        return self.samples[-1][1] if self.samples else 0
+
+    @property
+    def rate(self):
+        if len(self.samples) < 2:
+            return None
+
+        (first_time, first_done), (last_time, last_done) = \
+            self.samples[0], self.samples[-1]
+
+        if last_time <= first_time:
+            return None
+
+        return (last_done - first_done) / (last_time - first_time)
+
+    @property
+    def percent(self):
+        if not self.total:
+            return None
+
+        return 100.0 * self.done / self.total
+
+    @property
+    def eta(self):
+        """Seconds left, or None when it cannot be estimated yet."""
+        rate = self.rate
+
+        if not self.total or not rate or rate <= 0:
+            return None
+
+        return max(self.total - self.done, 0) / rate
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return '-'
+
+    seconds = int(seconds)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+
+    if hours:
+        return '{}h{:02d}m{:02d}s'.format(hours, minutes, seconds)
+    if minutes:
+        return '{}m{:02d}s'.format(minutes, seconds)
+
+    return '{}s'.format(seconds)
+
+
+def format_bytes(size):
+    if size is None:
+        return '-'
+
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if abs(size) < 1024 or unit == 'TB':
+            break
+        size /= 1024.0
+
+    return '{:.1f}{}'.format(size, unit)
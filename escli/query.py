@@ -1,8 +1,11 @@
+import json
 import logging
 import sys
 
 from cliff.command import Command
 from escli.main import Escli
+from escli import serializers
+from escli.search import SearchExporter, SlicedExport
 
 
 class QuerySearch(Command):
@@ -12,8 +15,87 @@ class QuerySearch(Command):
 
     def take_action(self, parsed_args):
         input = sys.stdin.read()
-        ret = Escli._es.search(index=parsed_args.index, body=input)
-        print(ret)
+
+        if parsed_args.slices > 1:
+            self.sliced_export(parsed_args, json.loads(input or '{}'))
+        elif parsed_args.export:
+            self.export(parsed_args, json.loads(input or '{}'))
+        else:
+            ret = Escli._es.search(index=parsed_args.index, body=input)
+            print(serializers.dumps(ret))
+
+    def export(self, parsed_args, body):
+        exporter = SearchExporter(
+            Escli._es,
+            parsed_args.index,
+            body,
+            page_size=parsed_args.page_size,
+            includes=self.split(parsed_args.source_includes),
+            excludes=self.split(parsed_args.source_excludes),
+            keep_alive=parsed_args.keep_alive,
+            method=parsed_args.method
+        )
+
+        pages = 0
+        for hit in exporter:
+            sys.stdout.write(serializers.dumps(hit) + '\n')
+
+            if exporter.pages != pages:
+                pages = exporter.pages
+                sys.stdout.flush()
+
+        sys.stdout.flush()
+        self.log.info('Exported {} documents in {} pages'.format(
+            exporter.hits,
+            exporter.pages
+        ))
+
+    def sliced_export(self, parsed_args, body):
+        cluster, client_kwargs = self.app.client_arguments()
+        export = SlicedExport(
+            Escli._es,
+            cluster,
+            client_kwargs,
+            parsed_args.index,
+            body,
+            parsed_args.slices,
+            workers=parsed_args.workers,
+            pool=parsed_args.pool,
+            output_directory=parsed_args.output_dir,
+            page_size=parsed_args.page_size,
+            includes=self.split(parsed_args.source_includes),
+            excludes=self.split(parsed_args.source_excludes),
+            keep_alive=parsed_args.keep_alive,
+            method=parsed_args.method
+        )
+
+        sys.stdout.flush()
+        statistics = export.run(sys.stdout.buffer)
+
+        for slice_statistics in statistics:
+            seconds = slice_statistics.get('seconds') or 1e-9
+            self.log.info(
+                'Slice {} : {} documents, {:.0f} docs/s, {:.2f} MB/s'.format(
+                    slice_statistics.get('slice'),
+                    slice_statistics.get('docs'),
+                    slice_statistics.get('docs') / seconds,
+                    slice_statistics.get('bytes') / seconds / 1024 / 1024
+                )
+            )
+
+        self.log.info('Exported {} documents in {} slices'.format(
+            sum(
+                slice_statistics.get('docs')
+                for slice_statistics in statistics
+            ),
+            len(statistics)
+        ))
+
+    def split(self, value):
+        if value is None:
+            return None
+
+        return [field.strip() for field in value.split(',') if field.strip()]
 
     def get_parser(self, prog_name):
         parser = super(QuerySearch, self).get_parser(prog_name)
@@ -25,5 +107,71 @@ class QuerySearch(Command):
             help=("A comma-separated list of index names to search; use '_all'"
                     " to perform the operation on all indices")
         )
+        parser.add_argument(
+            '--export',
+            action='store_true',
+            help=("Stream every matching hit to stdout as NDJSON")
+        )
+        parser.add_argument(
+            '--page-size',
+            action='store',
+            type=int,
+            default=1000,
+            help=("Number of hits fetched per request when exporting"
+                  " (Default: 1000)")
+        )
+        parser.add_argument(
+            '--source-includes',
+            action='store',
+            help=("A comma-separated list of fields to include in _source")
+        )
+        parser.add_argument(
+            '--source-excludes',
+            action='store',
+            help=("A comma-separated list of fields to exclude from _source")
+        )
+        parser.add_argument(
+            '--keep-alive',
+            action='store',
+            default='5m',
+            help=("How long the point in time or scroll is kept between two"
+                  " pages (Default: 5m)")
+        )
+        parser.add_argument(
+            '--slices',
+            action='store',
+            type=int,
+            default=1,
+            help=("Export in this many slices drained in parallel"
+                  " (implies --export)")
+        )
+        parser.add_argument(
+            '--workers',
+            action='store',
+            type=int,
+            help=("Number of workers draining slices (Default: one per"
+                  " slice)")
+        )
+        parser.add_argument(
+            '--pool',
+            action='store',
+            choices=['process', 'thread'],
+            default='process',
+            help=("Run slice workers in processes (default) or threads")
+        )
+        parser.add_argument(
+            '--output-dir',
+            action='store',
+            help=("Write one slice-<n>.ndjson file per slice in this"
+                  " directory instead of merging slices to stdout")
+        )
+        parser.add_argument(
+            '--method',
+            action='store',
+            choices=['auto', 'pit', 'scroll'],
+            default='auto',
+            help=("Pagination method. 'auto' uses a point in time with"
+                  " search_after and falls back to scroll on older clusters")
+        )
 
         return parser
@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import subprocess
+import time
+
+from escli.progress import format_duration
+from escli.utils import time_value
+
+
+# Phases each node goes through, in order
+PHASES = ('allocation', 'flush', 'restart', 'leave', 'rejoin', 'enable',
+          'green')
+
+ALLOCATION_ENABLE = 'cluster.routing.allocation.enable'
+
+
+class RestartError(Exception):
+    """A phase of the rolling restart failed or timed out."""
+
+
+class RollingRestart:
+    """Restart nodes one at a time.
+
+    For each node, shard allocation is limited to primaries, indices are
+    flushed and ``hook`` restarts the node (its name is in ``ESCLI_NODE``).
+    Once the node left and joined again, allocation is enabled back and the
+    cluster has to be green before the next node. Waits are health API long
+    polls of ``poll`` seconds, each phase fails after ``timeout`` seconds.
+
+    Progress is saved to ``state_path`` after each phase, so an interrupted
+    restart resumes where it stopped.
+    """
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, es, settings, hook, state_path, timeout=3600,
+                 poll=30, interval=1):
+        super(RollingRestart, self).__init__()
+        self.es = es
+        self.settings = settings
+        self.hook = hook
+        self.state_path = state_path
+        self.timeout = timeout
+        self.poll = poll
+        self.interval = interval
+        self.state = None
+
+    def load_state(self, nodes):
+        """Resume the saved restart when ``nodes`` is ``None`` or the same
+        nodes, in any order. A new restart of ``nodes`` (Default: every
+        node) otherwise."""
+        try:
+            with open(self.state_path) as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            state = None
+
+        if state is not None and (
+                nodes is None or set(state.get('nodes')) == set(nodes)):
+            self.log.info('Resuming rolling restart, {} of {} nodes done'
+                          .format(len(state.get('done')),
+                                  len(state.get('nodes'))))
+            return state
+
+        return {
+            'nodes': nodes if nodes is not None else self.nodes(),
+            'done': [],
+            'current': None,
+            'timings': []
+        }
+
+    def save_state(self):
+        temporary_path = '{}.{}'.format(self.state_path, os.getpid())
+
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        with open(temporary_path, 'w') as state_file:
+            json.dump(self.state, state_file, indent=2)
+        os.replace(temporary_path, self.state_path)
+
+    def run(self, nodes=None):
+        """Restart ``nodes`` and return the ``[node, phase, seconds]``
+        timings, including those of a resumed run."""
+        self.state = self.load_state(nodes)
+
+        for node in self.state.get('nodes'):
+            if node in self.state.get('done'):
+                continue
+
+            self.restart(node)
+            self.state['done'].append(node)
+            self.state['current'] = None
+            self.save_state()
+
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        return self.state.get('timings')
+
+    def restart(self, node):
+        current = self.state.get('current')
+        if current is None or current.get('node') != node:
+            current = self.state['current'] = {'node': node, 'phase': 0}
+
+        for position in range(current.get('phase'), len(PHASES)):
+            phase = PHASES[position]
+            self.log.info('{} : {}'.format(node, phase))
+            start = time.time()
+
+            getattr(self, 'phase_' + phase)(node, current)
+
+            self.state['timings'].append([node, phase, time.time() - start])
+            current['phase'] = position + 1
+            self.save_state()
+
+    def phase_allocation(self, node, current):
+        self.settings.set(ALLOCATION_ENABLE, 'primaries')
+        current['nodes'] = self.es.cluster.health().get('number_of_nodes')
+        current['start_time'] = self.start_time(node)
+
+        if current['start_time'] is None:
+            raise RestartError('Node {} is not in the cluster'.format(node))
+
+    def phase_flush(self, node, current):
+        self.es.indices.flush()
+
+    def phase_restart(self, node, current):
+        process = subprocess.run(
+            self.hook,
+            shell=True,
+            env=dict(os.environ, ESCLI_NODE=node)
+        )
+
+        if process.returncode != 0:
+            raise RestartError('Restart hook exited with {} on {}'.format(
+                process.returncode,
+                node
+            ))
+
+    def phase_leave(self, node, current):
+        # A node restarting faster than a poll is never seen leaving
+        self.wait(
+            lambda: self.restarted(node, current) or self.health(
+                wait_for_nodes='<{}'.format(current.get('nodes'))
+            ),
+            '{} leaving the cluster'.format(node)
+        )
+
+    def phase_rejoin(self, node, current):
+        self.wait(
+            lambda: self.health(
+                wait_for_nodes='>={}'.format(current.get('nodes'))
+            ) and self.restarted(node, current),
+            '{} joining the cluster'.format(node)
+        )
+
+    def phase_enable(self, node, current):
+        # Back to the persistent or default value
+        self.settings.set(ALLOCATION_ENABLE, None)
+
+    def phase_green(self, node, current):
+        self.wait(
+            lambda: self.health(wait_for_status='green'),
+            'green cluster'
+        )
+
+    def nodes(self):
+        """Every node, the elected master last."""
+        nodes = self.es.cat.nodes(format='json', h='name,master')
+
+        return [node.get('name') for node in sorted(
+            nodes,
+            key=lambda node: (node.get('master') == '*', node.get('name'))
+        )]
+
+    def health(self, **parameters):
+        """Hold a health request until the condition is met or ``poll``
+        seconds passed. Returns whether the condition is met."""
+        # A condition not met before the timeout answers 408
+        return not self.es.cluster.health(
+            timeout=time_value(self.poll),
+            request_timeout=self.poll + 30,
+            ignore=408,
+            **parameters
+        ).get('timed_out')
+
+    def wait(self, condition, description):
+        deadline = time.time() + self.timeout
+
+        while not condition():
+            if time.time() >= deadline:
+                raise RestartError('Timed out waiting for {} after {}'.format(
+                    description,
+                    format_duration(self.timeout)
+                ))
+            time.sleep(self.interval)
+
+    def start_time(self, node):
+        nodes = self.es.nodes.info(
+            node_id=node,
+            metric='jvm',
+            filter_path='nodes.*.jvm.start_time_in_millis'
+        ).get('nodes', {})
+
+        for info in nodes.values():
+            return info.get('jvm').get('start_time_in_millis')
+
+        return None
+
+    def restarted(self, node, current):
+        start_time = self.start_time(node)
+
+        return start_time is not None and \
+            start_time != current.get('start_time')
@@ -0,0 +1,348 @@
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import elasticsearch as elasticsearch
+
+from escli import connection, serializers
+
+
+class SearchExporter:
+    """Iterate over every hit matching a search body.
+
+    Pages are fetched with a point in time and ``search_after`` when the
+    cluster supports it, with a scroll otherwise. Only one page is held in
+    memory at a time.
+    """
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, es, index, body, page_size=1000, includes=None,
+                 excludes=None, keep_alive='5m', method='auto',
+                 slice_id=None, slice_max=None, pit_id=None):
+        super(SearchExporter, self).__init__()
+        self.es = es
+        # A point in time opened by the caller, shared between slices
+        self.pit_id = pit_id
+        self.index = index
+        self.page_size = page_size
+        self.keep_alive = keep_alive
+        self.method = method
+        self.body = dict(body or {})
+        self.body['size'] = page_size
+
+        if includes or excludes:
+            self.body['_source'] = {
+                'includes': includes or [],
+                'excludes': excludes or []
+            }
+
+        if slice_max is not None and slice_max > 1:
+            self.body['slice'] = {'id': slice_id, 'max': slice_max}
+
+        # Used to report progress, in pages and hits
+        self.pages = 0
+        self.hits = 0
+
+    def __iter__(self):
+        # A generator, so that nothing is opened before the first hit is
+        # asked for
+        if self.pit_id is not None:
+            yield from self.iter_point_in_time(self.pit_id, close=False)
+            return
+
+        if self.method in ('auto', 'pit'):
+            pit_id = self.open_point_in_time()
+            if pit_id is not None:
+                yield from self.iter_point_in_time(pit_id)
+                return
+
+        yield from self.iter_scroll()
+
+    def open_point_in_time(self):
+        if not hasattr(self.es, 'open_point_in_time'):
+            self.log.debug('Client has no point in time support')
+            return None
+
+        try:
+            return self.es.open_point_in_time(
+                index=self.index,
+                keep_alive=self.keep_alive
+            ).get('id')
+        except elasticsearch.TransportError as err:
+            if self.method == 'pit' or err.status_code not in (400, 404, 405):
+                raise
+            self.log.debug(
+                'Point in time is not supported, falling back to scroll'
+            )
+            return None
+
+    def close_point_in_time(self, pit_id):
+        # Called on the way out of an export, an error here must not hide
+        # the one which ended it
+        try:
+            self.es.close_point_in_time(body={'id': pit_id})
+        except elasticsearch.TransportError as err:
+            self.log.warning('Cannot close point in time : {}'.format(err))
+
+    def iter_point_in_time(self, pit_id, close=True):
+        body = dict(self.body)
+        body.setdefault('sort', ['_shard_doc'])
+        body['track_total_hits'] = False
+
+        try:
+            while True:
+                body['pit'] = {'id': pit_id, 'keep_alive': self.keep_alive}
+                page = self.es.search(body=body)
+                pit_id = page.get('pit_id', pit_id)
+                hits = page.get('hits').get('hits')
+
+                if not hits:
+                    break
+
+                self.count(hits)
+                for hit in hits:
+                    yield hit
+
+                if len(hits) < self.page_size:
+                    break
+
+                body['search_after'] = hits[-1].get('sort')
+        finally:
+            if close:
+                self.close_point_in_time(pit_id)
+
+    def iter_scroll(self):
+        body = dict(self.body)
+        body.setdefault('sort', ['_doc'])
+
+        page = self.es.search(
+            index=self.index,
+            body=body,
+            scroll=self.keep_alive
+        )
+        scroll_id = page.get('_scroll_id')
+
+        try:
+            while True:
+                hits = page.get('hits').get('hits')
+
+                if not hits:
+                    break
+
+                self.count(hits)
+                for hit in hits:
+                    yield hit
+
+                page = self.es.scroll(
+                    scroll_id=scroll_id,
+                    scroll=self.keep_alive
+                )
+                scroll_id = page.get('_scroll_id', scroll_id)
+        finally:
+            self.es.clear_scroll(scroll_id=scroll_id, ignore=(404,))
+
+    def count(self, hits):
+        self.pages += 1
+        self.hits += len(hits)
+        self.log.debug('Page {} : {} hits'.format(self.pages, self.hits))
+
+
+# Queue the workers of a merged sliced export push their NDJSON chunks to
+_output_queue = None
+
+
+def _initialize_worker(output_queue):
+    global _output_queue
+    _output_queue = output_queue
+
+
+def export_slice(task):
+    """Drain one slice of a sliced export.
+
+    Runs inside a worker: it builds its own client, serializes the hits to
+    NDJSON and either writes them to the slice's file or pushes them in
+    chunks of one page to the output queue. Returns the slice statistics.
+    """
+    statistics = {'slice': task['slice_id'], 'docs': 0, 'bytes': 0}
+    start = time.time()
+    output_file = None
+    chunk = []
+
+    def flush():
+        data = b''.join(chunk)
+        statistics['bytes'] += len(data)
+        del chunk[:]
+
+        if output_file is not None:
+            output_file.write(data)
+        else:
+            _output_queue.put((task['slice_id'], data))
+
+    try:
+        es = connection.create_client(
+            task['cluster'],
+            **task['client_kwargs']
+        )
+        exporter = SearchExporter(
+            es,
+            task['index'],
+            task['body'],
+            slice_id=task['slice_id'],
+            slice_max=task['slice_max'],
+            **task['options']
+        )
+
+        if task['output'] is not None:
+            output_file = open(task['output'], 'wb')
+
+        for hit in exporter:
+            chunk.append(serializers.dumps_bytes(hit) + b'\n')
+            statistics['docs'] += 1
+
+            if len(chunk) >= exporter.page_size:
+                flush()
+
+        flush()
+    finally:
+        if output_file is not None:
+            output_file.close()
+        else:
+            # End of slice marker, queued after the slice's last chunk
+            _output_queue.put((task['slice_id'], None))
+
+    statistics['seconds'] = time.time() - start
+
+    return statistics
+
+
+class SlicedExport:
+    """Export the hits of a search in parallel slices.
+
+    Each slice is drained by a worker of a process (or thread) pool. Hits
+    are either merged into ``stream`` or written to one file per slice in
+    ``output_directory``.
+    """
+
+    log = logging.getLogger(__name__)
+
+    QUEUED_PAGES_PER_SLICE = 4
+
+    def __init__(self, es, cluster, client_kwargs, index, body, slices,
+                 workers=None, pool='process', output_directory=None,
+                 **options):
+        super(SlicedExport, self).__init__()
+        self.es = es
+        self.cluster = cluster
+        self.client_kwargs = client_kwargs
+        self.index = index
+        self.body = body
+        self.slices = slices
+        self.workers = workers or slices
+        self.pool = pool
+        self.output_directory = output_directory
+        self.options = options
+
+    def run(self, stream):
+        pit_id = None
+        options = dict(self.options)
+        exporter = SearchExporter(self.es, self.index, self.body, **options)
+
+        if options.get('method', 'auto') in ('auto', 'pit'):
+            # All slices read the same point in time
+            pit_id = exporter.open_point_in_time()
+
+        if pit_id is not None:
+            options['pit_id'] = pit_id
+        elif options.get('method') != 'scroll':
+            options['method'] = 'scroll'
+
+        try:
+            return self.run_slices(self.tasks(options), stream)
+        finally:
+            if pit_id is not None:
+                exporter.close_point_in_time(pit_id)
+
+    def tasks(self, options):
+        for slice_id in range(self.slices):
+            output = None
+            if self.output_directory is not None:
+                output = os.path.join(
+                    self.output_directory,
+                    'slice-{}.ndjson'.format(slice_id)
+                )
+
+            yield {
+                'cluster': self.cluster,
+                'client_kwargs': self.client_kwargs,
+                'index': self.index,
+                'body': self.body,
+                'slice_id': slice_id,
+                'slice_max': self.slices,
+                'output': output,
+                'options': options,
+            }
+
+    def run_slices(self, tasks, stream):
+        # Workers wait for the writer once a few pages per slice are queued
+        maxsize = self.slices * self.QUEUED_PAGES_PER_SLICE
+        if self.pool == 'thread':
+            output_queue = queue.Queue(maxsize=maxsize)
+            executor_class = ThreadPoolExecutor
+        else:
+            output_queue = multiprocessing.Queue(maxsize=maxsize)
+            executor_class = ProcessPoolExecutor
+
+        if self.output_directory is not None:
+            os.makedirs(self.output_directory, exist_ok=True)
+
+        with executor_class(
+            max_workers=self.workers,
+            initializer=_initialize_worker,
+            initargs=(output_queue,)
+        ) as executor:
+            futures = [executor.submit(export_slice, task) for task in tasks]
+
+            if self.output_directory is None:
+                try:
+                    self.merge(output_queue, stream, futures)
+                except BaseException:
+                    self.discard(output_queue, futures)
+                    raise
+
+            return [future.result() for future in futures]
+
+    def merge(self, output_queue, stream, futures):
+        remaining = self.slices
+
+        while remaining > 0:
+            try:
+                slice_id, data = output_queue.get(timeout=1)
+            except queue.Empty:
+                # A worker died without sending its end of slice marker
+                if all(future.done() for future in futures):
+                    break
+                continue
+
+            if data is None:
+                remaining -= 1
+                self.log.debug('Slice {} is done'.format(slice_id))
+            else:
+                stream.write(data)
+
+        stream.flush()
+
+    def discard(self, output_queue, futures):
+        """Empty the queue until the running slices end, so workers waiting
+        on the full queue do not block the pool shutdown."""
+        for future in futures:
+            future.cancel()
+
+        while not all(future.done() for future in futures):
+            try:
+                output_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
@@ -0,0 +1,80 @@
+import json
+
+# orjson is optional and much faster than json on large responses
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _stdlib_dumps(data, default=None):
+    return json.dumps(data, separators=(',', ':'), default=default)
+
+
+def _stdlib_dumps_bytes(data, default=None):
+    return _stdlib_dumps(data, default=default).encode('utf-8')
+
+
+def _orjson_dumps(data, default=None):
+    return orjson.dumps(data, default=default).decode('utf-8')
+
+
+if orjson is not None:
+    loads = orjson.loads
+    dumps = _orjson_dumps
+    dumps_bytes = orjson.dumps
+else:
+    loads = json.loads
+    dumps = _stdlib_dumps
+    dumps_bytes = _stdlib_dumps_bytes
+
+
+def _serialization_error(data, err):
+    from elasticsearch.exceptions import SerializationError
+
+    return SerializationError(data, err)
+
+
+class OrjsonSerializer:
+    """Client serializer decoding and encoding bodies with orjson.
+
+    It behaves like the client's ``JSONSerializer``, which is only imported
+    to convert the types orjson does not know, so importing this module
+    does not load the client.
+    """
+
+    mimetype = 'application/json'
+
+    def default(self, data):
+        from elasticsearch.serializer import JSONSerializer
+
+        return JSONSerializer().default(data)
+
+    def loads(self, s):
+        try:
+            return orjson.loads(s)
+        except (ValueError, TypeError) as err:
+            raise _serialization_error(s, err)
+
+    def dumps(self, data):
+        if isinstance(data, (str, bytes)):
+            return data
+
+        try:
+            return orjson.dumps(data, default=self.default).decode('utf-8')
+        except (ValueError, TypeError) as err:
+            raise _serialization_error(data, err)
+
+
+def client_serializer(name='auto'):
+    """Return the serializer to give the client for ``name``.
+
+    ``auto`` picks orjson when it is installed, ``json`` keeps the client's
+    default (None is returned).
+    """
+    if name == 'orjson' or (name == 'auto' and orjson is not None):
+        if orjson is None:
+            raise ImportError('orjson serializer requested but not installed')
+        return OrjsonSerializer()
+
+    return None
@@ -2,9 +2,39 @@ import logging
 import elasticsearch as elasticsearch
 from abc import ABC
 import sys
+import time
 
 from box import Box
 from escli.main import Escli
+from escli.utils import flatten_dict
+
+
+class LazySettings:
+    """Class attribute building its settings helper on first use.
+
+    Commands declare ``settings = LazySettings(ClusterSettings)`` so that
+    importing a command module does not build anything; the helper is
+    created once per command instance, when ``take_action`` first needs it.
+    """
+
+    def __init__(self, factory, *args, **kwargs):
+        super(LazySettings, self).__init__()
+        self.factory = factory
+        self.args = args
+        self.kwargs = kwargs
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        settings = self.factory(*self.args, **self.kwargs)
+        instance.__dict__[self.name] = settings
+
+        return settings
 
 
 class Settings(ABC):
@@ -23,15 +53,23 @@ class Settings(ABC):
 
 
 class ClusterSettings(Settings):
-    """Handle cluster-level settings."""
+    """Handle cluster-level settings.
+
+    Values read from the cluster are kept in a snapshot shared by every
+    instance, so a command or an interactive session fetches a setting at
+    most once every ``ttl`` seconds. Only the requested keys are fetched,
+    and setting a value invalidates the snapshot.
+    """
+
+    ttl = 30
+    persistencies = ('transient', 'persistent')
+    _snapshot = {}
 
     def __init__(self):
         super(ClusterSettings, self).__init__()
 
     def get(self, key, persistency='transient'):
-        settings = Escli._es.cluster\
-                .get_settings(include_defaults=True, flat_settings=True)\
-                .get(persistency)
+        settings = self.get_many([key], persistency=persistency)
 
         if key in settings:
             return settings.get(key).upper()
@@ -41,6 +79,64 @@ class ClusterSettings(Settings):
             )
             return None
 
+    def get_many(self, keys, persistency='transient'):
+        """Return the value of each key set with the given persistency.
+
+        Keys missing from the snapshot are fetched in one request.
+        """
+        now = time.time()
+        missing = [
+            key for key in keys
+            if key not in self._snapshot
+            or now - self._snapshot[key][0] > self.ttl
+        ]
+
+        if missing:
+            self.fetch(missing, now)
+
+        values = {}
+        for key in keys:
+            value = self._snapshot[key][1].get(persistency)
+            if value is not None:
+                values[key] = value
+
+        return values
+
+    def fetch(self, keys, now):
+        response = Escli._es.cluster.get_settings(filter_path=','.join(
+            '{}.{}'.format(persistency, key)
+            for persistency in self.persistencies
+            for key in keys
+        ))
+        settings = dict(
+            (persistency, flatten_dict(response.get(persistency) or {}))
+            for persistency in self.persistencies
+        )
+
+        for key in keys:
+            ClusterSettings._snapshot[key] = (now, dict(
+                (persistency, settings[persistency].get(key))
+                for persistency in self.persistencies
+            ))
+
+    def set_many(self, settings, persistency='transient'):
+        """Apply several settings in a single cluster state update."""
+        try:
+            Escli._es.cluster.put_settings(body={persistency: settings})
+        except elasticsearch.TransportError as error:
+            self.log.critical(
+                error.args[2].get('error').get('reason').capitalize()
+            )
+            return False
+        finally:
+            self.invalidate()
+
+        return True
+
+    @classmethod
+    def invalidate(cls):
+        cls._snapshot.clear()
+
     def set(self, sections, value, persistency='transient'):
         try:
             Escli._es.cluster.put_settings(body={
@@ -52,6 +148,8 @@ class ClusterSettings(Settings):
             self.log.critical(
                 error.args[2].get('error').get('reason').capitalize()
             )
+        finally:
+            self.invalidate()
 
 
 class IndexSettings(Settings):
@@ -62,11 +160,16 @@ class IndexSettings(Settings):
         self.index = index
 
     def get(self, setting_name):
+        """Yield the value of a setting for each index, sorted by name.
+
+        Only the requested setting is fetched, and defaults are fetched
+        only when some index has no explicit value.
+        """
         try:
             settings = Escli._es.indices\
                     .get_settings(
                         index=self.index,
-                        include_defaults=True,
+                        name=setting_name,
                         flat_settings=True
                     )
         except elasticsearch.exceptions.NotFoundError as err:
@@ -75,12 +178,73 @@ class IndexSettings(Settings):
                 self.index
             ))
             sys.exit(1)
-        else:
-            return [Box({
+
+        defaults = {}
+        if any(
+            setting_name not in (index_settings.get('settings') or {})
+            for index_settings in settings.values()
+        ):
+            defaults = Escli._es.indices.get_settings(
+                index=self.index,
+                name=setting_name,
+                flat_settings=True,
+                include_defaults=True,
+                filter_path='*.defaults'
+            )
+
+        for index_name in sorted(settings.keys()):
+            value = (settings[index_name].get('settings') or {})\
+                .get(setting_name)
+
+            if value is None:
+                value = (defaults.get(index_name, {}).get('defaults') or {})\
+                    .get(setting_name)
+
+            yield Box({
                 'index': index_name,
                 'setting': setting_name,
-                'value': index_settings.get('settings').get(setting_name)
-            }) for index_name, index_settings in sorted(settings.items())]
+                'value': value
+            })
+
+    def get_many(self, keys):
+        """Return, for each index, the explicit value of each key."""
+        try:
+            settings = Escli._es.indices.get_settings(
+                index=self.index,
+                name=','.join(keys),
+                flat_settings=True
+            )
+        except elasticsearch.exceptions.NotFoundError as err:
+            self.log.error("{} : {}".format(
+                err.info.get('error').get('root_cause')[0].get('reason').capitalize(),
+                self.index
+            ))
+            sys.exit(1)
+
+        return dict(
+            (index_name, dict(
+                (key, index_settings.get('settings').get(key))
+                for key in keys
+            ))
+            for index_name, index_settings in sorted(settings.items())
+        )
+
+    def set_many(self, settings):
+        """Apply several settings to the indices in a single request."""
+        try:
+            Escli._es.indices.put_settings(
+                index=self.index,
+                body=settings,
+                flat_settings=True
+            )
+        except elasticsearch.TransportError as err:
+            self.log.error("{} : {}".format(
+                err.info.get('error').get('root_cause')[0].get('reason').capitalize(),
+                self.index
+            ))
+            return False
+
+        return True
 
     def set(self, sections, value):
         try:
@@ -0,0 +1,518 @@
+import collections
+import fnmatch
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import elasticsearch as elasticsearch
+
+from escli.progress import Progress, format_bytes, format_duration
+from escli.utils import index_batches, parse_duration
+
+
+# Snapshot states of _status while the snapshot is running
+RUNNING_STATES = ('INIT', 'STARTED', 'WAITING', 'IN_PROGRESS')
+
+# From worst to best
+HEALTH_STATUSES = ('red', 'yellow', 'green')
+
+
+def processed_stats(stats):
+    """``processed`` part of snapshot status ``stats``, left out once
+    everything incremental is processed."""
+    return stats.get('processed', stats.get('incremental', {}))
+
+
+class SnapshotFollower:
+    """Poll ``_snapshot/<repository>/<snapshot>/_status`` of a running
+    snapshot and aggregate its progress per index and per node.
+
+    Only the fields used are returned by the cluster (``filter_path``).
+    Shard rates are computed between two polls, so the slowest shards are
+    the ones currently progressing the least.
+    """
+
+    log = logging.getLogger(__name__)
+
+    FILTER_PATH = ','.join([
+        'snapshots.state',
+        'snapshots.stats',
+        'snapshots.indices.*.shards.*.stage',
+        'snapshots.indices.*.shards.*.node',
+        'snapshots.indices.*.shards.*.stats.processed',
+        'snapshots.indices.*.shards.*.stats.incremental',
+    ])
+
+    def __init__(self, es, repository, snapshot, slowest=5, window=10):
+        super(SnapshotFollower, self).__init__()
+        self.es = es
+        self.repository = repository
+        self.snapshot = snapshot
+        self.slowest = slowest
+        self.progress = Progress(window=window)
+        # (index, shard) -> (time, processed bytes) of the previous poll
+        self.shards = {}
+
+    def poll(self, now=None):
+        now = now if now is not None else time.time()
+        status = self.es.snapshot.status(
+            repository=self.repository,
+            snapshot=self.snapshot,
+            filter_path=self.FILTER_PATH
+        ).get('snapshots')[0]
+
+        shards = list(self.shard_progress(status, now))
+        stats = status.get('stats', {})
+        processed = processed_stats(stats)
+        self.progress.update(
+            processed.get('size_in_bytes', 0),
+            total=stats.get('incremental', {}).get('size_in_bytes'),
+            now=now
+        )
+
+        running = [shard for shard in shards if shard['stage'] != 'DONE']
+
+        return {
+            'state': status.get('state'),
+            'bytes': self.progress.done,
+            'total_bytes': self.progress.total,
+            'files': processed.get('file_count', 0),
+            'total_files': stats.get('incremental', {}).get('file_count', 0),
+            'rate': self.progress.rate,
+            'eta': self.progress.eta,
+            'indices': self.aggregate(shards, 'index'),
+            'nodes': self.aggregate(shards, 'node'),
+            'slowest': sorted(
+                running,
+                key=lambda shard: shard['rate'] or 0
+            )[:self.slowest],
+        }
+
+    def shard_progress(self, status, now):
+        for index, index_status in status.get('indices', {}).items():
+            for shard_id, shard in index_status.get('shards', {}).items():
+                stats = shard.get('stats', {})
+                processed = processed_stats(stats)
+                incremental = stats.get('incremental', {})
+                done = processed.get('size_in_bytes', 0)
+
+                rate = None
+                previous = self.shards.get((index, shard_id))
+                if previous is not None and now > previous[0]:
+                    rate = (done - previous[1]) / (now - previous[0])
+                self.shards[(index, shard_id)] = (now, done)
+
+                yield {
+                    'index': index,
+                    'shard': shard_id,
+                    'node': shard.get('node', '-'),
+                    'stage': shard.get('stage'),
+                    'bytes': done,
+                    'total_bytes': incremental.get('size_in_bytes', 0),
+                    'files': processed.get('file_count', 0),
+                    'total_files': incremental.get('file_count', 0),
+                    'rate': rate,
+                }
+
+    def aggregate(self, shards, key):
+        groups = collections.OrderedDict()
+
+        for shard in sorted(shards, key=lambda shard: shard[key]):
+            group = groups.setdefault(shard[key], {
+                'bytes': 0,
+                'total_bytes': 0,
+                'files': 0,
+                'total_files': 0,
+                'rate': 0,
+            })
+            for counter in ['bytes', 'total_bytes', 'files', 'total_files']:
+                group[counter] += shard[counter]
+            group['rate'] += shard['rate'] or 0
+
+        return groups
+
+    def follow(self, interval=5, report=None):
+        """Poll until the snapshot is no longer running, calling ``report``
+        with each poll's summary. Returns the last summary."""
+        report = report or self.report
+
+        while True:
+            summary = self.poll()
+            report(summary)
+
+            if summary.get('state') not in RUNNING_STATES:
+                return summary
+
+            time.sleep(interval)
+
+    def report(self, summary):
+        self.log.info(
+            '{} - {}/{} ({:.1f}%) - {}/{} files - {}/s - ETA {}'.format(
+                summary.get('state'),
+                format_bytes(summary.get('bytes')),
+                format_bytes(summary.get('total_bytes')),
+                self.progress.percent or 0,
+                summary.get('files'),
+                summary.get('total_files'),
+                format_bytes(summary.get('rate') or 0),
+                format_duration(summary.get('eta'))
+            )
+        )
+
+        for label, kind in [('node', 'nodes'), ('index', 'indices')]:
+            for name, group in summary.get(kind).items():
+                if group['bytes'] >= group['total_bytes']:
+                    continue
+                self.log.info('  {} {} - {}/{} - {}/{} files - {}/s'.format(
+                    label,
+                    name,
+                    format_bytes(group['bytes']),
+                    format_bytes(group['total_bytes']),
+                    group['files'],
+                    group['total_files'],
+                    format_bytes(group['rate'])
+                ))
+
+        for shard in summary.get('slowest'):
+            self.log.info('  slow shard {}[{}] on {} - {} - {}/s'.format(
+                shard['index'],
+                shard['shard'],
+                shard['node'],
+                shard['stage'],
+                format_bytes(shard['rate'] or 0)
+            ))
+
+
+class RetentionRule:
+    """Snapshots matching ``pattern`` to delete.
+
+    A snapshot expires when it is not among the ``keep`` most recent ones
+    matching the pattern, or when it ended more than ``max_age`` ago.
+    """
+
+    def __init__(self, pattern, keep=None, max_age=None):
+        super(RetentionRule, self).__init__()
+        self.pattern = pattern
+        self.keep = keep
+        self.max_age = max_age
+
+    @classmethod
+    def parse(cls, spec):
+        """Build a rule from ``<pattern>:keep=<n>,age=<duration>``, raise
+        ValueError on an invalid one."""
+        pattern, separator, conditions = spec.rpartition(':')
+        if not separator:
+            raise ValueError(
+                'Invalid retention rule {}, expected'
+                ' <pattern>:keep=<n>,age=<duration>'.format(spec)
+            )
+        rule = cls(pattern or '*')
+
+        for condition in conditions.split(','):
+            name, _, value = condition.partition('=')
+            if name not in ('keep', 'age'):
+                raise ValueError('Unknown retention condition ' + condition)
+
+            try:
+                if name == 'keep':
+                    rule.keep = int(value)
+                else:
+                    rule.max_age = parse_duration(value)
+            except ValueError:
+                raise ValueError('Invalid {} value {} in {}'.format(
+                    name,
+                    value,
+                    spec
+                ))
+
+        return rule
+
+    def __str__(self):
+        conditions = []
+        if self.keep is not None:
+            conditions.append('keep={}'.format(self.keep))
+        if self.max_age is not None:
+            conditions.append('age={}s'.format(int(self.max_age)))
+
+        return '{}:{}'.format(self.pattern, ','.join(conditions))
+
+    def matches(self, name):
+        return fnmatch.fnmatchcase(name, self.pattern)
+
+
+def expired_snapshots(snapshots, rules, now=None):
+    """Return the ``(snapshot, rule, reason)`` of the snapshots to delete.
+
+    ``snapshots`` are ``cat.snapshots`` rows. Each snapshot is ruled by the
+    first rule it matches; running snapshots and those matching no rule
+    are kept.
+    """
+    now = now if now is not None else time.time()
+    groups = collections.OrderedDict((rule, []) for rule in rules)
+
+    for snapshot in snapshots:
+        for rule in rules:
+            if rule.matches(snapshot.get('id')):
+                groups[rule].append(snapshot)
+                break
+
+    expired = []
+    for rule, matching in groups.items():
+        matching.sort(key=lambda snapshot: int(snapshot.get('end_epoch')
+                                               or snapshot.get('start_epoch')
+                                               or 0), reverse=True)
+
+        for position, snapshot in enumerate(matching):
+            if snapshot.get('status') == 'IN_PROGRESS':
+                continue
+
+            age = now - int(snapshot.get('end_epoch') or now)
+            if rule.keep is not None and position >= rule.keep:
+                reason = 'beyond the {} most recent'.format(rule.keep)
+            elif rule.max_age is not None and age > rule.max_age:
+                reason = 'ended {} ago'.format(format_duration(age))
+            else:
+                continue
+
+            expired.append((snapshot, rule, reason))
+
+    return expired
+
+
+def restored_indices(indices, patterns=None, rename_pattern=None,
+                     rename_replacement=None):
+    """Return the names ``indices`` of a snapshot get once restored.
+
+    ``patterns`` select indices like the restore API does (wildcards,
+    ``-`` to exclude), the rename uses the API's Java style ``$1`` groups.
+    """
+    selected = []
+
+    for index in indices:
+        included = not patterns
+        for pattern in patterns or []:
+            if pattern.startswith('-'):
+                if fnmatch.fnmatchcase(index, pattern[1:]):
+                    included = False
+            elif fnmatch.fnmatchcase(index, pattern):
+                included = True
+
+        if not included:
+            continue
+
+        if rename_pattern is not None:
+            index = re.sub(
+                rename_pattern,
+                re.sub(r'\$(\d+)', r'\\\1', rename_replacement or ''),
+                index
+            )
+        selected.append(index)
+
+    return selected
+
+
+class SnapshotPruner:
+    """Delete snapshots of a repository, many at a time.
+
+    Clusters deleting several snapshots in one request (7.8+) get batches
+    of ``batch_size`` names; older ones get single deletes from a pool of
+    ``workers`` threads. Deletes refused because another snapshot operation
+    is running are retried with an exponential backoff.
+    """
+
+    log = logging.getLogger(__name__)
+
+    def __init__(self, es, repository, batch_size=50, workers=2,
+                 max_retries=10, backoff=1):
+        super(SnapshotPruner, self).__init__()
+        self.es = es
+        self.repository = repository
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def multi_delete(self):
+        version = self.es.info(filter_path='version.number')\
+            .get('version').get('number')
+
+        return tuple(int(part) for part in version.split('.')[:2]) >= (7, 8)
+
+    def delete(self, names):
+        """Delete ``names`` and yield ``(name, error)`` pairs as deletes
+        complete, ``error`` is None on success."""
+        if self.multi_delete():
+            batches = [
+                names[start:start + self.batch_size]
+                for start in range(0, len(names), self.batch_size)
+            ]
+            workers = 1
+        else:
+            batches = [[name] for name in names]
+            workers = self.workers
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch, error in zip(batches, executor.map(self.send, batches)):
+                for name in batch:
+                    yield name, error
+
+    def send(self, batch):
+        attempt = 0
+
+        while True:
+            try:
+                self.es.snapshot.delete(
+                    repository=self.repository,
+                    snapshot=','.join(batch)
+                )
+                return None
+            except elasticsearch.TransportError as err:
+                if err.error != 'concurrent_snapshot_execution_exception' \
+                        or attempt >= self.max_retries:
+                    return str(err)
+
+            attempt += 1
+            self.log.debug('Snapshot operation running, retrying {} ({}/{})'
+                           .format(batch[0], attempt, self.max_retries))
+            time.sleep(self.backoff * 2 ** (attempt - 1))
+
+
+class RecoveryFollower:
+    """Follow the recovery of ``indices`` through
+    ``_recovery?active_only=true``.
+
+    Shards leaving the active recoveries are counted as fully recovered, so
+    each index's progress only goes forward. Polling ends when the indices
+    reach the wanted health status.
+    """
+
+    log = logging.getLogger(__name__)
+
+    FILTER_PATH = ','.join([
+        '*.shards.id',
+        '*.shards.primary',
+        '*.shards.stage',
+        '*.shards.index.size.total_in_bytes',
+        '*.shards.index.size.recovered_in_bytes',
+        '*.shards.translog.total',
+        '*.shards.translog.recovered',
+    ])
+
+    def __init__(self, es, indices, window=10):
+        super(RecoveryFollower, self).__init__()
+        self.es = es
+        self.indices = indices
+        # Requests on many indices are split to stay below the line limit
+        self.batches = list(index_batches(indices))
+        self.window = window
+        # (index, shard, primary) -> [bytes, total bytes, ops, total ops]
+        self.shards = collections.OrderedDict()
+        self.progress = {}
+
+    def poll(self, now=None):
+        now = now if now is not None else time.time()
+        recoveries = {}
+        for batch in self.batches:
+            recoveries.update(self.es.indices.recovery(
+                index=batch,
+                active_only=True,
+                filter_path=self.FILTER_PATH
+            ))
+
+        active = set()
+        for index, recovery in recoveries.items():
+            for shard in recovery.get('shards', []):
+                key = (index, shard.get('id'), shard.get('primary'))
+                size = shard.get('index', {}).get('size', {})
+                translog = shard.get('translog', {})
+                active.add(key)
+                self.shards[key] = [
+                    size.get('recovered_in_bytes', 0),
+                    size.get('total_in_bytes', 0),
+                    max(translog.get('recovered', 0), 0),
+                    max(translog.get('total', 0), 0),
+                ]
+
+        for key, counters in self.shards.items():
+            if key not in active:
+                counters[0] = counters[1]
+                counters[2] = counters[3]
+
+        summary = collections.OrderedDict()
+        for (index, _, _), counters in self.shards.items():
+            totals = summary.setdefault(index, {
+                'active': 0,
+                'bytes': 0,
+                'total_bytes': 0,
+                'translog_ops': 0,
+                'total_translog_ops': 0,
+            })
+            totals['bytes'] += counters[0]
+            totals['total_bytes'] += counters[1]
+            totals['translog_ops'] += counters[2]
+            totals['total_translog_ops'] += counters[3]
+        for index, _, _ in active:
+            summary[index]['active'] += 1
+
+        for index, totals in summary.items():
+            progress = self.progress.setdefault(index, Progress(
+                window=self.window
+            ))
+            progress.update(
+                totals['bytes'],
+                total=totals['total_bytes'],
+                now=now
+            )
+            totals['rate'] = progress.rate
+            totals['eta'] = progress.eta
+
+        return summary
+
+    def reached(self, status):
+        for batch in self.batches:
+            # Not waiting on the cluster side, and a 408 still has the status
+            health = self.es.cluster.health(
+                index=batch,
+                filter_path='status,initializing_shards',
+                ignore=408
+            )
+
+            if HEALTH_STATUSES.index(health.get('status')) < \
+                    HEALTH_STATUSES.index(status) or \
+                    health.get('initializing_shards') != 0:
+                return False
+
+        return True
+
+    def follow(self, status='green', interval=5, report=None):
+        """Poll until the indices are ``status``, calling ``report`` with
+        each poll's summary."""
+        report = report or self.report
+
+        while True:
+            report(self.poll())
+
+            if self.reached(status):
+                return
+
+            time.sleep(interval)
+
+    def report(self, summary):
+        for index, totals in summary.items():
+            if not totals['active']:
+                continue
+
+            self.log.info(
+                '{} - {} shards recovering - {}/{} - {}/s - {}/{} translog'
+                ' ops - ETA {}'.format(
+                    index,
+                    totals['active'],
+                    format_bytes(totals['bytes']),
+                    format_bytes(totals['total_bytes']),
+                    format_bytes(totals['rate'] or 0),
+                    totals['translog_ops'],
+                    totals['total_translog_ops'],
+                    format_duration(totals['eta'])
+                )
+            )
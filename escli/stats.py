@@ -0,0 +1,212 @@
+import logging
+import sys
+import time
+
+import elasticsearch as elasticsearch
+
+from cliff.command import Command
+from cliff.lister import Lister
+from escli.main import Escli
+from escli.tsdb import METRICS, StatsStore, filter_path, index_values, \
+    node_values
+from escli.utils import cache_path, parse_duration
+
+
+class StatsRecord(Command):
+    """Record node and index stats into a local time series database."""
+
+    log = logging.getLogger(__name__)
+
+    def take_action(self, parsed_args):
+        store = StatsStore(parsed_args.database)
+        interval = parse_duration(parsed_args.interval)
+        sample = 0
+
+        try:
+            while parsed_args.count is None or sample < parsed_args.count:
+                start = time.time()
+                if sample > 0 and sample % parsed_args.prune_every == 0:
+                    store.prune(start)
+
+                sample += 1
+                try:
+                    rows = self.sample(store, parsed_args.indices)
+                except elasticsearch.TransportError as err:
+                    # The cluster may only be busy, keep the schedule
+                    self.log.warning('Sample {} failed : {}'.format(
+                        sample,
+                        err
+                    ))
+                else:
+                    self.log.debug('Sample {} : {} rows in {:.3f}s'.format(
+                        sample,
+                        rows,
+                        time.time() - start
+                    ))
+
+                if parsed_args.count is None or sample < parsed_args.count:
+                    time.sleep(max(interval - (time.time() - start), 0))
+        finally:
+            store.close()
+
+    def sample(self, store, indices):
+        now = time.time()
+        nodes = Escli._es.nodes.stats(
+            metric='indices,jvm,os,thread_pool,transport',
+            filter_path=filter_path('node')
+        )
+        cluster = nodes.get('cluster_name')
+        rows = store.record(cluster, 'node', node_values(nodes), now)
+
+        if indices:
+            rows += store.record(cluster, 'index', index_values(
+                Escli._es.indices.stats(
+                    metric='indexing,search,merge,docs,store',
+                    filter_path=filter_path('index')
+                )
+            ), now)
+
+        return rows
+
+    def get_parser(self, prog_name):
+        parser = super(StatsRecord, self).get_parser(prog_name)
+        parser.add_argument(
+            '--interval',
+            action='store',
+            default='10s',
+            help=("Time between two samples (Default: 10s)")
+        )
+        parser.add_argument(
+            '--count',
+            action='store',
+            type=int,
+            help=("Number of samples to take (Default: until interrupted)")
+        )
+        parser.add_argument(
+            '--no-indices',
+            action='store_false',
+            dest='indices',
+            help=("Only record node stats")
+        )
+        parser.add_argument(
+            '--prune-every',
+            action='store',
+            type=int,
+            default=60,
+            help=("Samples between two deletions of expired data"
+                  " (Default: 60)")
+        )
+        parser.add_argument(
+            '--database',
+            action='store',
+            default=cache_path('stats.sqlite'),
+            help=("Database file (Default: {})".format(
+                cache_path('stats.sqlite')
+            ))
+        )
+        return parser
+
+
+class StatsQuery(Lister):
+    """Query node and index stats recorded by 'stats record'.
+
+    Counters are read as rates per second, gauges as averages.
+    """
+
+    log = logging.getLogger(__name__)
+
+    def take_action(self, parsed_args):
+        if parsed_args.metric not in METRICS[parsed_args.scope]:
+            self.log.critical(
+                'Unknown {} metric {}, expected one of {}'.format(
+                    parsed_args.scope,
+                    parsed_args.metric,
+                    ', '.join(METRICS[parsed_args.scope])
+                )
+            )
+            sys.exit(1)
+
+        store = StatsStore(parsed_args.database)
+        now = time.time()
+        end = now - parse_duration(parsed_args.until) \
+            if parsed_args.until else now
+
+        try:
+            rows = store.query(
+                parsed_args.scope,
+                parsed_args.metric,
+                now - parse_duration(parsed_args.since),
+                end,
+                step=parse_duration(parsed_args.step)
+                if parsed_args.step else None,
+                entity=parsed_args.entity,
+                cluster=parsed_args.cluster
+            )
+        finally:
+            store.close()
+
+        return (
+            ('Time', parsed_args.scope.capitalize(), parsed_args.metric),
+            (
+                (
+                    time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(bucket)),
+                    entity,
+                    round(value, 2)
+                )
+                for bucket, entity, value in rows
+            )
+        )
+
+    def get_parser(self, prog_name):
+        parser = super(StatsQuery, self).get_parser(prog_name)
+        parser.add_argument(
+            'metric',
+            metavar='<metric>',
+            help=("Metric, one of {} for nodes and {} for indices".format(
+                ', '.join(METRICS['node']),
+                ', '.join(METRICS['index'])
+            ))
+        )
+        parser.add_argument(
+            '--scope',
+            action='store',
+            choices=sorted(METRICS),
+            default='node',
+            help=("Metrics of nodes or indices (Default: node)")
+        )
+        parser.add_argument(
+            '--entity',
+            action='store',
+            help=("Only this node or index")
+        )
+        parser.add_argument(
+            '--cluster',
+            action='store',
+            help=("Only this cluster name")
+        )
+        parser.add_argument(
+            '--since',
+            action='store',
+            default='1h',
+            help=("Start of the range, before now (Default: 1h)")
+        )
+        parser.add_argument(
+            '--until',
+            action='store',
+            help=("End of the range, before now (Default: now)")
+        )
+        parser.add_argument(
+            '--step',
+            action='store',
+            help=("Time covered by each row (Default: a hundredth of the"
+                  " range)")
+        )
+        parser.add_argument(
+            '--database',
+            action='store',
+            default=cache_path('stats.sqlite'),
+            help=("Database file (Default: {})".format(
+                cache_path('stats.sqlite')
+            ))
+        )
+        return parser
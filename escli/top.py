@@ -0,0 +1,130 @@
+import collections
+
+from escli.progress import format_bytes
+
+
+Column = collections.namedtuple('Column', ['header', 'paths', 'kind', 'width'])
+
+# Counters read as rates per second, several paths are summed
+COLUMNS = [
+    Column('Index/s', ['indices.indexing.index_total'], 'rate', 9),
+    Column('Search/s', ['indices.search.query_total'], 'rate', 9),
+    Column('Merge/s', ['indices.merges.total'], 'rate', 8),
+    Column('GC ms/s', [
+        'jvm.gc.collectors.young.collection_time_in_millis',
+        'jvm.gc.collectors.old.collection_time_in_millis',
+    ], 'rate', 8),
+    Column('Heap%', ['jvm.mem.heap_used_percent'], 'gauge', 6),
+    Column('WQueue', ['thread_pool.write.queue'], 'gauge', 7),
+    Column('WRej/s', ['thread_pool.write.rejected'], 'rate', 7),
+    Column('SQueue', ['thread_pool.search.queue'], 'gauge', 7),
+    Column('SRej/s', ['thread_pool.search.rejected'], 'rate', 7),
+    Column('Net rx/s', ['transport.rx_size_in_bytes'], 'bytes', 10),
+    Column('Net tx/s', ['transport.tx_size_in_bytes'], 'bytes', 10),
+]
+
+# Node stats metrics holding the columns, the server only computes those
+METRIC = 'indices,jvm,thread_pool,transport'
+INDEX_METRIC = 'indexing,search,merge'
+
+
+def filter_path():
+    return ','.join(['nodes.*.name'] + [
+        'nodes.*.' + path for column in COLUMNS for path in column.paths
+    ])
+
+
+def value(stats, path):
+    for key in path:
+        stats = stats.get(key)
+        if stats is None:
+            return 0
+    return stats
+
+
+def format_value(number, kind):
+    if number is None:
+        return '-'
+    if kind == 'bytes':
+        return format_bytes(number)
+    if kind == 'gauge' or number >= 100:
+        return str(int(round(number)))
+    return '{:.1f}'.format(number)
+
+
+class NodeRates:
+    """Per node rates between two ``_nodes/stats`` responses.
+
+    Only the raw column values of the previous response are kept, rates of
+    a node are ``None`` until it was seen twice and its counters restart
+    from zero when they go backwards.
+    """
+
+    def __init__(self, columns=COLUMNS):
+        super(NodeRates, self).__init__()
+        self.columns = columns
+        self.paths = [
+            [path.split('.') for path in column.paths] for column in columns
+        ]
+        # Node id -> (time, raw values)
+        self.previous = {}
+
+    def raw(self, stats):
+        return [
+            sum(value(stats, path) for path in paths) for paths in self.paths
+        ]
+
+    def update(self, response, now):
+        """Return ``[name, value per column]`` rows of the nodes in
+        ``response``, sampled at ``now``."""
+        rows = []
+        current = {}
+
+        for node_id, stats in response.get('nodes', {}).items():
+            raw = current[node_id] = (now, self.raw(stats))
+            previous = self.previous.get(node_id)
+            row = [stats.get('name', node_id)]
+
+            for position, column in enumerate(self.columns):
+                if column.kind == 'gauge':
+                    row.append(raw[1][position])
+                elif previous is None or now <= previous[0]:
+                    row.append(None)
+                else:
+                    delta = raw[1][position] - previous[1][position]
+                    if delta < 0:
+                        delta = raw[1][position]
+                    row.append(delta / (now - previous[0]))
+
+            rows.append(row)
+
+        # Nodes which left are forgotten
+        self.previous = current
+
+        return rows
+
+
+def sort_rows(rows, column, reverse=True):
+    """Sort rows on a column, 0 being the node name, missing values
+    last."""
+    if column == 0:
+        return sorted(rows, key=lambda row: row[0], reverse=not reverse)
+
+    known = [row for row in rows if row[column] is not None]
+    unknown = [row for row in rows if row[column] is None]
+    known.sort(key=lambda row: (row[column], row[0]), reverse=reverse)
+
+    return known + sorted(unknown, key=lambda row: row[0])
+
+
+def format_row(row, name_width, columns=COLUMNS):
+    return row[0][:name_width].ljust(name_width) + ''.join(
+        format_value(number, column.kind).rjust(column.width)
+        for number, column in zip(row[1:], columns)
+    )
+
+
+def format_header(name_width, columns=COLUMNS):
+    return 'Node'.ljust(name_width) + ''.join(
+        column.header.rjust(column.width) for column in columns
+    )
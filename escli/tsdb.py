@@ -0,0 +1,267 @@
+import collections
+import os
+import sqlite3
+import time
+
+from escli.utils import flatten_dict
+
+
+# Metric name -> (path in the stats of a node or an index, kind). Counters
+# are stored as deltas and read back as rates per second, gauges as
+# averages.
+NODE_METRICS = collections.OrderedDict([
+    ('indexing', ('indices.indexing.index_total', 'counter')),
+    ('search', ('indices.search.query_total', 'counter')),
+    ('merges', ('indices.merges.total', 'counter')),
+    ('refreshes', ('indices.refresh.total', 'counter')),
+    ('gc.young.ms', (
+        'jvm.gc.collectors.young.collection_time_in_millis', 'counter'
+    )),
+    ('gc.old.ms', ('jvm.gc.collectors.old.collection_time_in_millis',
+                   'counter')),
+    ('write.rejected', ('thread_pool.write.rejected', 'counter')),
+    ('search.rejected', ('thread_pool.search.rejected', 'counter')),
+    ('network.rx', ('transport.rx_size_in_bytes', 'counter')),
+    ('network.tx', ('transport.tx_size_in_bytes', 'counter')),
+    ('heap.percent', ('jvm.mem.heap_used_percent', 'gauge')),
+    ('cpu.percent', ('os.cpu.percent', 'gauge')),
+])
+
+INDEX_METRICS = collections.OrderedDict([
+    ('indexing', ('total.indexing.index_total', 'counter')),
+    ('search', ('total.search.query_total', 'counter')),
+    ('merges', ('total.merges.total', 'counter')),
+    ('docs', ('primaries.docs.count', 'gauge')),
+    ('store', ('total.store.size_in_bytes', 'gauge')),
+])
+
+METRICS = {'node': NODE_METRICS, 'index': INDEX_METRICS}
+
+# Resolution in seconds (0 is as sampled) -> retention in seconds
+RETENTIONS = collections.OrderedDict([
+    (0, 86400),
+    (60, 7 * 86400),
+    (3600, 365 * 86400),
+])
+
+# Seconds a range may start before the retention of a resolution
+RETENTION_SLACK = 600
+
+
+def filter_path(scope):
+    """``filter_path`` of the stats request feeding ``scope``."""
+    if scope == 'node':
+        return ','.join(['cluster_name', 'nodes.*.name'] + [
+            'nodes.*.' + path for path, _ in NODE_METRICS.values()
+        ])
+
+    return ','.join(
+        'indices.*.' + path for path, _ in INDEX_METRICS.values()
+    )
+
+
+def node_values(response):
+    """Return ``{(node name, metric): value}`` of ``_nodes/stats``."""
+    values = {}
+
+    for node in response.get('nodes', {}).values():
+        flat = flatten_dict(node)
+        for metric, (path, _) in NODE_METRICS.items():
+            if flat.get(path) is not None:
+                values[(node.get('name'), metric)] = flat.get(path)
+
+    return values
+
+
+def index_values(response):
+    """Return ``{(index, metric): value}`` of ``_stats``."""
+    values = {}
+
+    for index, stats in response.get('indices', {}).items():
+        flat = flatten_dict(stats)
+        for metric, (path, _) in INDEX_METRICS.items():
+            if flat.get(path) is not None:
+                values[(index, metric)] = flat.get(path)
+
+    return values
+
+
+class StatsStore:
+    """Time series of node and index stats in a SQLite file.
+
+    Each sample is added to every resolution of ``retentions`` at once,
+    downsampled rows being running sums: a row holds the counter delta (or
+    gauge value times seconds) over the seconds it covers, so any range of
+    any resolution reads back as ``SUM(total) / SUM(seconds)``. Rows older
+    than the retention of their resolution are deleted as samples come.
+    """
+
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS series ('
+        ' id INTEGER PRIMARY KEY,'
+        ' cluster TEXT, scope TEXT, entity TEXT, metric TEXT,'
+        ' UNIQUE (cluster, scope, entity, metric))',
+        'CREATE TABLE IF NOT EXISTS samples ('
+        ' series INTEGER, resolution INTEGER, time INTEGER,'
+        ' total REAL, seconds REAL,'
+        ' PRIMARY KEY (series, resolution, time)) WITHOUT ROWID',
+        # Last raw value of each counter, deltas are computed from it
+        'CREATE TABLE IF NOT EXISTS last ('
+        ' series INTEGER PRIMARY KEY, time REAL, value REAL)',
+    ]
+
+    def __init__(self, path, retentions=RETENTIONS):
+        super(StatsStore, self).__init__()
+        self.retentions = retentions
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            for statement in self.SCHEMA:
+                self.connection.execute(statement)
+
+        self.series = dict(
+            ((cluster, scope, entity, metric), series)
+            for series, cluster, scope, entity, metric
+            in self.connection.execute(
+                'SELECT id, cluster, scope, entity, metric FROM series'
+            )
+        )
+        self.last = dict(
+            (series, (last_time, value))
+            for series, last_time, value
+            in self.connection.execute('SELECT series, time, value FROM last')
+        )
+
+    def close(self):
+        self.connection.close()
+
+    def series_id(self, cluster, scope, entity, metric):
+        key = (cluster, scope, entity, metric)
+
+        if key not in self.series:
+            self.series[key] = self.connection.execute(
+                'INSERT INTO series (cluster, scope, entity, metric)'
+                ' VALUES (?, ?, ?, ?)',
+                key
+            ).lastrowid
+
+        return self.series[key]
+
+    def record(self, cluster, scope, values, now=None):
+        """Add ``{(entity, metric): value}`` sampled at ``now``.
+
+        The first sample of a counter only sets its reference value, a
+        counter going backwards (node restart) restarted from zero.
+        """
+        now = now if now is not None else time.time()
+        rows = []
+        last_rows = []
+
+        with self.connection:
+            for (entity, metric), value in values.items():
+                series = self.series_id(cluster, scope, entity, metric)
+                kind = METRICS[scope][metric][1]
+                previous = self.last.get(series)
+                self.last[series] = (now, value)
+                last_rows.append((series, now, value))
+
+                if previous is None or now <= previous[0]:
+                    continue
+
+                seconds = now - previous[0]
+                if kind == 'counter':
+                    total = value - previous[1]
+                    if total < 0:
+                        total = value
+                else:
+                    total = value * seconds
+
+                for resolution in self.retentions:
+                    bucket = int(now) - int(now) % resolution \
+                        if resolution else int(now)
+                    rows.append((series, resolution, bucket, total, seconds))
+
+            self.connection.executemany(
+                'INSERT INTO samples VALUES (?, ?, ?, ?, ?)'
+                ' ON CONFLICT (series, resolution, time) DO UPDATE SET'
+                ' total = total + excluded.total,'
+                ' seconds = seconds + excluded.seconds',
+                rows
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO last VALUES (?, ?, ?)',
+                last_rows
+            )
+
+        return len(rows)
+
+    def prune(self, now=None):
+        now = now if now is not None else time.time()
+
+        with self.connection:
+            for resolution, retention in self.retentions.items():
+                self.connection.execute(
+                    'DELETE FROM samples WHERE resolution = ? AND time < ?',
+                    (resolution, int(now - retention))
+                )
+
+    def resolution(self, start, end, step, now=None):
+        """The coarsest resolution finer than ``step`` still holding
+        ``start``, or the finest one holding it."""
+        now = now if now is not None else time.time()
+        # Rows are only deleted every few samples, and ``start`` was often
+        # computed a moment before ``now``
+        holding = [
+            resolution for resolution, retention in self.retentions.items()
+            if start >= now - retention - RETENTION_SLACK
+        ]
+
+        if not holding:
+            return max(self.retentions)
+
+        finer = [resolution for resolution in holding
+                 if resolution <= max(step, 1)]
+
+        return max(finer) if finer else min(holding)
+
+    def query(self, scope, metric, start, end=None, step=None, entity=None,
+              cluster=None):
+        """Return ``(time, entity, value)`` rows between ``start`` and
+        ``end``, one per entity and ``step`` seconds.
+
+        Counters read as rates per second, gauges as averages. Without
+        ``step``, the range is cut into about 100 points.
+        """
+        end = end if end is not None else time.time()
+        step = int(step or max((end - start) // 100, 1))
+        resolution = self.resolution(start, end, step)
+        step = max(step, resolution)
+        # Rows are timed by the start of their bucket, the one holding
+        # ``start`` begins before it
+        start = int(start) - int(start) % resolution if resolution \
+            else int(start)
+
+        conditions = ['series.scope = ?', 'series.metric = ?']
+        parameters = [step, step, resolution, start, int(end), scope,
+                      metric]
+        if entity is not None:
+            conditions.append('series.entity = ?')
+            parameters.append(entity)
+        if cluster is not None:
+            conditions.append('series.cluster = ?')
+            parameters.append(cluster)
+
+        return self.connection.execute(
+            'SELECT samples.time / ? * ? AS bucket, series.entity,'
+            ' SUM(samples.total) / SUM(samples.seconds)'
+            ' FROM series JOIN samples ON samples.series = series.id'
+            ' AND samples.resolution = ? AND samples.time BETWEEN ? AND ?'
+            ' WHERE ' + ' AND '.join(conditions) +
+            ' GROUP BY bucket, series.entity'
+            ' ORDER BY bucket, series.entity',
+            parameters
+        ).fetchall()
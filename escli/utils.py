@@ -1,10 +1,13 @@
 import logging
 import os
-import yaml
+import pickle
 import sys
+import threading
 
 from cliff.lister import Lister
 
+import escli
+
 
 class Color:
     PURPLE = '\033[95m'
@@ -19,6 +22,14 @@ class Color:
     END = '\033[0m'
 
 
+def cache_path(filename):
+    """Return the path of ``filename`` inside escli's cache directory."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+
+    return os.path.join(cache_home, 'escli', filename)
+
+
 class JSONFormatter:
     """docstring for JSONFormatter."""
 
@@ -56,7 +67,12 @@ class JSONFormatter:
         return tuple(valid_list)
 
     def to_lister(self, columns=[]):
+        """Return the column headers and a generator of rows.
 
+        Rows are projected from the JSON objects as the formatter consumes
+        them, so streaming formatters (csv, value, ndjson) start printing
+        without a copy of the whole dataset.
+        """
         columns = self._ensure_params_format(columns)
 
         headers = []
@@ -64,18 +80,15 @@ class JSONFormatter:
             headers.append(element[1])
         headers = tuple(headers)
 
-        lst = []
-        for obj in self.json:
-            row = []
-            for element in columns:
-                row.append(obj.get(element[0]))
-            lst.append(tuple(row))
-
         return (
             headers,
-            tuple(lst)
+            self._rows([element[0] for element in columns])
         )
 
+    def _rows(self, keys):
+        for obj in self.json:
+            yield tuple(obj.get(key) for key in keys)
+
     def to_show_one(self, lines=[]):
         lines = self._ensure_params_format(lines)
 
@@ -101,61 +114,156 @@ class Context:
             setattr(self, key, value)
 
 
+class LazyClient:
+    """Proxy building the Elasticsearch client on first attribute access."""
+
+    def __init__(self, factory):
+        super(LazyClient, self).__init__()
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+
+        return getattr(self._client, name)
+
+
 class ConfigFileParser:
     """docstring for ConfigFileParser."""
 
     log = logging.getLogger(__name__)
 
+    config_blocks = [
+        'clusters',
+        'contexts',
+        'default-context',
+        'settings',
+        'users'
+    ]
+
     def __init__(self):
         super(ConfigFileParser, self).__init__()
         self.path = os.path.expanduser("~") + '/.esclirc'
+        self.cache_path = cache_path('esclirc.cache')
+        self.resolved_contexts = {}
         self.log.debug('Trying to load config file : {}'.format(self.path))
 
     def load_configuration(self):
         self.log.debug('Loading configuration...')
-        config_blocks = [
-            'clusters',
-            'contexts',
-            'default-context',
-            'settings',
-            'users'
-        ]
 
-        with open(self.path, 'r') as config_file:
-            try:
-                self.raw = yaml.safe_load(config_file)
-            except yaml.YAMLError as err:
-                self.log.critical('Cannot read YAML from ' + self.path)
-                self.log.critical(str(err.problem) + str(err.problem_mark))
-                sys.exit(1)
+        stat = os.stat(self.path)
+        key = (self.path, stat.st_mtime_ns, stat.st_size, escli.__version__)
+
+        config = self.load_cache(key)
+        if config is None:
+            config = self.compile(self.parse())
+            self.save_cache(key, config)
 
-        for config_block in config_blocks:
+        for config_block in self.config_blocks:
             if not hasattr(self, config_block):
                 setattr(self, config_block, None)
-            self.load_config_block(config_block)
+            self.load_config_block(config_block, config.get('blocks'))
             self.log.debug('{}: {}'.format(
                 config_block,
                 getattr(self, config_block)
             ))
 
-    def load_config_block(self, key):
-        if key in self.raw:
-            setattr(self, key, self.raw.get(key))
+        self.resolved_contexts = config.get('contexts')
+
+    def parse(self):
+        import yaml
+
+        with open(self.path, 'r') as config_file:
+            try:
+                return yaml.safe_load(config_file) or {}
+            except yaml.YAMLError as err:
+                self.log.critical('Cannot read YAML from ' + self.path)
+                self.log.critical(str(err.problem) + str(err.problem_mark))
+                sys.exit(1)
+
+    def compile(self, raw):
+        """Resolve each context's user and cluster once for all."""
+        users = raw.get('users') or {}
+        clusters = raw.get('clusters') or {}
+        contexts = {}
+
+        for context_name, definition in (raw.get('contexts') or {}).items():
+            definition = definition or {}
+            contexts[context_name] = {
+                'user': users.get(definition.get('user')),
+                'cluster': clusters.get(definition.get('cluster'))
+            }
+
+        return {
+            'blocks': dict(
+                (key, raw.get(key))
+                for key in self.config_blocks
+                if key in raw
+            ),
+            'contexts': contexts
+        }
+
+    def load_cache(self, key):
+        try:
+            with open(self.cache_path, 'rb') as cache_file:
+                cached_key, config = pickle.load(cache_file)
+        except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+
+        if cached_key != key:
+            self.log.debug('Configuration cache is outdated')
+            return None
+
+        self.log.debug('Using configuration cache ' + self.cache_path)
+
+        return config
+
+    def save_cache(self, key, config):
+        temporary_path = '{}.{}'.format(self.cache_path, os.getpid())
+
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            # The resolved configuration holds the users' passwords
+            descriptor = os.open(
+                temporary_path,
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                0o600
+            )
+            if hasattr(os, 'fchmod'):
+                # Left over by an interrupted run with other permissions
+                os.fchmod(descriptor, 0o600)
+            with os.fdopen(descriptor, 'wb') as cache_file:
+                pickle.dump((key, config), cache_file,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, self.cache_path)
+        except OSError as err:
+            self.log.debug('Cannot write configuration cache : {}'.format(err))
+
+    def load_config_block(self, key, blocks):
+        if key in blocks:
+            setattr(self, key, blocks.get(key))
         else:
             self.log.debug('Cannot find config block : ' + key)
 
     def get_context_informations(self, context_name):
-        user = self.users.get(self.contexts.get(context_name).get('user'))
-        cluster = self.clusters.get(
-            self.contexts.get(context_name).get('cluster')
-        )
+        if context_name not in self.resolved_contexts:
+            raise AttributeError(
+                'Unknown context : {}'.format(context_name)
+            )
 
-        return Context(context_name, user=user, cluster=cluster)
+        return Context(context_name, **self.resolved_contexts[context_name])
 
 
 class EscliLister(Lister):
     """docstring for EscliLister."""
 
+    # Commands may set it in take_action to report a failure
+    exit_code = 0
+
     def get_parser(self, prog_name):
         parser = super(EscliLister, self).get_parser(prog_name)
         group = self._formatter_group
@@ -168,8 +276,10 @@ class EscliLister(Lister):
 
     def get_by_attribute_name(self, attribute, data):
         attribute = attribute.split(',')
-        data = dict((k, v) for k, v in data)
-        return tuple([(attr, data.get(attr)) for attr in attribute])
+        wanted = set(attribute)
+        # Only keep the requested rows while going through the data
+        found = dict((k, v) for k, v in data if k in wanted)
+        return tuple([(attr, found.get(attr)) for attr in attribute])
 
     def run(self, parsed_args):
         parsed_args = self._run_before_hooks(parsed_args)
@@ -182,7 +292,7 @@ class EscliLister(Lister):
         column_names, data = self._run_after_hooks(parsed_args,
                                                    (column_names, data))
         self.produce_output(parsed_args, column_names, data)
-        return 0
+        return self.exit_code
 
 
 def print_success(message):
@@ -214,6 +324,44 @@ def flatten_dict(dictionary):
 
     return dict(items)
 
+def parse_duration(duration):
+    """Convert an Elasticsearch time value (`500ms`, `30s`, `5m`...) to
+    seconds."""
+    units = [('ms', 0.001), ('s', 1), ('m', 60), ('h', 3600), ('d', 86400)]
+    duration = str(duration).strip()
+
+    for unit, factor in units:
+        number = duration[:-len(unit)]
+        if duration.endswith(unit) and number.replace('.', '', 1).isdigit():
+            return float(number) * factor
+
+    return float(duration)
+
+
+def time_value(seconds):
+    """Convert seconds to an Elasticsearch time value, which has to be a
+    whole number (`30s`, `1500ms`)."""
+    if float(seconds).is_integer():
+        return '{}s'.format(int(seconds))
+
+    return '{}ms'.format(int(round(seconds * 1000)))
+
+
+def index_batches(names, max_length=2048):
+    """Join index ``names`` into comma separated lists of at most
+    ``max_length`` characters, keeping request lines below the default 4kB
+    HTTP line limit of Elasticsearch."""
+    batch = []
+    for name in names:
+        if batch and len(','.join(batch + [name])) > max_length:
+            yield ','.join(batch)
+            batch = []
+        batch.append(name)
+
+    if batch:
+        yield ','.join(batch)
+
+
 def colorize(str, color):
     return "{}{}{}".format(
         color,
@@ -1,11 +1,17 @@
 #!/usr/bin/env python
 
+import re
+
 from setuptools import setup, find_packages
 
 # from pip.req import parse_requirements
 
 PROJECT = 'escli'
-VERSION = '1.0'
+
+# Version lives in escli/__init__.py so that escli can read it at startup
+# without querying installed distributions' metadata.
+with open('escli/__init__.py') as f:
+    VERSION = re.search(r"__version__ = '(.*)'", f.read()).group(1)
 
 try:
     long_description = open('README.rst', 'rt').read()
@@ -36,7 +42,10 @@ setup(
                  'License :: OSI Approved :: GNU General Public License v3 (GPLv3)',
                  'Programming Language :: Python',
                  'Programming Language :: Python :: 3',
-                 'Programming Language :: Python :: 3.2',
+                 'Programming Language :: Python :: 3.6',
+                 'Programming Language :: Python :: 3.7',
+                 'Programming Language :: Python :: 3.8',
+                 'Programming Language :: Python :: 3.9',
                  'Intended Audience :: Developers',
                  'Intended Audience :: System Administrators',
                  'Environment :: Console'
@@ -48,6 +57,7 @@ setup(
 
     provides=[],
     install_requires=requirements,
+    python_requires='>=3.6',
 
     namespace_packages=[],
     packages=find_packages(),
@@ -57,6 +67,9 @@ setup(
         'console_scripts': [
             'escli = escli.main:main'
         ],
+        'cliff.formatter.list': [
+            'ndjson = escli.formatters:NDJSONFormatter',
+        ],
         'escli': [
             'alias create = escli.alias:AliasCreate',
             'alias delete = escli.alias:AliasDelete',
@@ -65,18 +78,24 @@ setup(
             'cat shards = escli.cat:CatShards',
             'cluster allocation explain = escli.cluster:ClusterAllocationExplain',
             'cluster health = escli.cluster:ClusterHealth',
+            'cluster reroute balance = escli.cluster_reroute:ClusterRerouteBalance',
             'cluster reroute retry= escli.cluster_reroute:ClusterRerouteRetry',
+            'cluster rolling-restart = escli.cluster:ClusterRollingRestart',
             'cluster routing allocation enable = escli.cluster:ClusterRoutingAllocationEnable',
             'cluster stats = escli.cluster:ClusterStats',
+            'cluster settings apply = escli.cluster:ClusterSettingsApply',
             'cluster settings get = escli.cluster:ClusterSettingsGet',
             'cluster settings reset = escli.cluster:ClusterSettingsReset',
             'cluster settings set = escli.cluster:ClusterSettingsSet',
             'config context list = escli.config:ConfigContextList',
+            'index bulk load = escli.index:IndexBulkLoad',
             'index close = escli.index:IndexClose',
             'index create = escli.index:IndexCreate',
             'index delete = escli.index:IndexDelete',
             'index list = escli.index:IndexList',
             'index open = escli.index:IndexOpen',
+            'index reindex = escli.index:IndexReindex',
+            'index reindex rethrottle = escli.index:IndexReindexRethrottle',
             'index settings get = escli.index:IndexSettingsGet',
             'index settings reset = escli.index:IndexSettingsReset',
             'index settings set = escli.index:IndexSettingsSet',
@@ -85,9 +104,12 @@ setup(
             'logging reset = escli.logging:LoggingReset',
             'logging set = escli.logging:LoggingSet',
             'node decommission = escli.node:NodeDecommission',
+            'node drain = escli.node:NodeDrain',
             'node hot-threads = escli.node:NodeHotThreads',
+            'node hot-threads profile = escli.node:NodeHotThreadsProfile',
             'node list = escli.node:NodeList',
             'node recommission = escli.node:NodeRecommission',
+            'node top = escli.node:NodeTop',
             'query search = escli.query:QuerySearch',
             'repository list = escli.backup:RepositoryList',
             'repository show = escli.backup:RepositoryShow',
@@ -95,8 +117,11 @@ setup(
             'snapshot create = escli.backup:SnapshotCreate',
             'snapshot delete = escli.backup:SnapshotDelete',
             'snapshot list = escli.backup:SnapshotList',
+            'snapshot prune = escli.backup:SnapshotPrune',
             'snapshot restore = escli.backup:SnapshotRestore',
             'snapshot show = escli.backup:SnapshotShow',
+            'stats query = escli.stats:StatsQuery',
+            'stats record = escli.stats:StatsRecord',
         ]
     },
 
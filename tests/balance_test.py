@@ -0,0 +1,147 @@
+from unittest import TestCase
+
+import escli.cluster_reroute
+from base_test_class import EscliTestCase
+from escli.balance import BalancePlanner, ShardTable, skew
+
+
+def row(index, shard, prirep, node, store='100', state='STARTED'):
+    return {
+        'index': index,
+        'shard': str(shard),
+        'prirep': prirep,
+        'state': state,
+        'store': store,
+        'node': node,
+    }
+
+
+class TestShardTable(TestCase):
+    def fixture(self):
+        shards = [
+            row('foo', 0, 'p', 'node-1'),
+            row('foo', 0, 'r', 'node-2'),
+            row('foo', 1, 'p', 'node-1'),
+            row('foo', 1, 'r', 'node-2 -> 10.0.0.3 abcd node-3',
+                state='RELOCATING'),
+            row('foo', 2, 'p', 'node-1', store='300'),
+            row('foo', 2, 'r', None, store=None, state='UNASSIGNED'),
+            row('bar', 0, 'p', 'node-2'),
+        ]
+        allocation = [
+            {'node': 'node-3', 'disk.used': '1000', 'disk.total': '2000'},
+            {'node': 'node-1', 'disk.used': '500', 'disk.total': '2000'},
+            {'node': 'UNASSIGNED'},
+        ]
+        return ShardTable.from_cat(shards, allocation)
+
+    def test_from_cat(self):
+        table = self.fixture()
+
+        self.assertEqual(table.nodes, ['node-3', 'node-1', 'node-2'])
+        self.assertEqual(table.indices, ['foo', 'bar'])
+        self.assertEqual(list(table.node), [1, 2, 1, 2, 1, -1, 2])
+        self.assertEqual(list(table.disk_total), [2000, 2000, 0])
+        self.assertEqual(table.loads(), (
+            [0, 3, 3],
+            [0, 3, 1],
+            [0, 500, 300],
+        ))
+
+    def test_hot_spots(self):
+        self.assertEqual(
+            self.fixture().hot_spots(),
+            [('foo', 'node-1', 3, 2)]
+        )
+
+    def test_skew(self):
+        self.assertEqual(skew([]), 0)
+        self.assertEqual(skew([0, 0]), 0)
+        self.assertEqual(skew([1, 3]), 0.5)
+
+
+class TestBalancePlanner(TestCase):
+    def table(self):
+        shards = []
+        for shard in range(6):
+            shards.append(row('foo', shard, 'p', 'node-1',
+                              store=str(100 * (shard + 1))))
+            shards.append(row('foo', shard, 'r', 'node-2'))
+        shards.append(row('bar', 0, 'p', 'node-1', store='50'))
+        allocation = [
+            {'node': name, 'disk.used': '0', 'disk.total': '10000'}
+            for name in ['node-1', 'node-2', 'node-3']
+        ]
+        return ShardTable.from_cat(shards, allocation)
+
+    def test_plan_by_shards(self):
+        moves = BalancePlanner(self.table(), target=0.1).plan()
+
+        loads = {'node-1': 7, 'node-2': 6, 'node-3': 0}
+        for index, shard, source, destination, _ in moves:
+            loads[source] -= 1
+            loads[destination] += 1
+        # 13 shards on 3 nodes cannot be spread more evenly
+        self.assertEqual(sorted(loads.values()), [4, 4, 5])
+        # Never two copies of a shard on a node
+        placed = set()
+        for index, shard, _, destination, _ in moves:
+            self.assertNotIn((index, shard, destination), placed)
+            placed.add((index, shard, destination))
+
+    def test_plan_by_disk(self):
+        moves = BalancePlanner(self.table(), by='disk', target=0.5).plan()
+
+        self.assertTrue(moves)
+        self.assertTrue(all(destination == 'node-3' or source != 'node-3'
+                            for _, _, source, destination, _ in moves))
+
+    def test_max_disk_percent(self):
+        table = self.table()
+        table.disk_used[2] = 9990
+
+        moves = BalancePlanner(table, max_disk_percent=80).plan()
+
+        self.assertNotIn('node-3', [move[3] for move in moves])
+
+
+class TestClusterRerouteBalance(EscliTestCase):
+    def setUp(self):
+        super()._setUp('escli.cluster_reroute')
+        self.MockClass._es.cat.shards.return_value = [
+            row('foo', shard, 'p', 'node-1') for shard in range(4)
+        ]
+        self.MockClass._es.cat.allocation.return_value = [
+            {'node': 'node-1'}, {'node': 'node-2'}
+        ]
+        self.MockClass._es.cluster.health.side_effect = [
+            {'timed_out': True}, {'timed_out': False}
+        ]
+        self.balance = escli.cluster_reroute.ClusterRerouteBalance(
+            self.app, {}
+        )
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_execute_in_batches(self):
+        parsed_args = self.balance.get_parser('balance').parse_args(
+            ['--execute', '--max-relocations', '5', '--poll', '1.5s']
+        )
+
+        _, moves = self.balance.take_action(parsed_args)
+
+        self.assertEqual(len(list(moves)), 2)
+        commands = self.MockClass._es.cluster.reroute.call_args[1]\
+            .get('body').get('commands')
+        self.assertEqual(len(commands), 2)
+        self.assertEqual(commands[0].get('move').get('to_node'), 'node-2')
+        self.assertEqual(self.MockClass._es.cluster.health.call_count, 2)
+        self.assertEqual(
+            self.MockClass._es.cluster.health.call_args[1].get('timeout'),
+            '1500ms'
+        )
+        self.assertEqual(
+            self.MockClass._es.cluster.health.call_args[1].get('ignore'),
+            408
+        )
@@ -5,8 +5,8 @@ import escli.main
 
 
 class EscliTestCase(TestCase):
-    def _setUp(self):
-        self.patcher = patch('escli.cluster.Escli')
+    def _setUp(self, module='escli.cluster'):
+        self.patcher = patch(module + '.Escli')
         self.MockClass = self.patcher.start()
         self.app = escli.main.Escli()
 
@@ -0,0 +1,147 @@
+import io
+import json
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from escli.bulk import AdaptiveConcurrency, BulkLoader, TransformStage, \
+    document_actions, load_callable
+
+
+def bulk_response(*statuses):
+    items = []
+    for status in statuses:
+        result = {'status': status}
+        if status >= 300:
+            result['error'] = {'type': 'error', 'reason': str(status)}
+        items.append({'index': result})
+
+    return {'errors': any(status >= 300 for status in statuses),
+            'items': items}
+
+
+class TestAdaptiveConcurrency(TestCase):
+    def test_record(self):
+        concurrency = AdaptiveConcurrency(initial=4, maximum=5,
+                                          target_latency=1)
+
+        self.assertEqual(concurrency.record(0.1, False), 5)
+        self.assertEqual(concurrency.record(0.1, False), 5)
+        self.assertEqual(concurrency.record(2, False), 4)
+        self.assertEqual(concurrency.record(0.1, True), 2)
+        self.assertEqual(concurrency.record(0.1, True), 1)
+        self.assertEqual(concurrency.record(0.1, True), 1)
+
+
+class TestDocumentActions(TestCase):
+    def test_id_field(self):
+        actions = list(document_actions(
+            [b'{"id": 1, "foo": "bar"}\n', b'\n', b'{"foo": "baz"}\n'],
+            'foo',
+            id_field='id'
+        ))
+
+        self.assertEqual(len(actions), 2)
+        self.assertEqual(
+            json.loads(actions[0][0]),
+            {'index': {'_index': 'foo', '_id': 1}}
+        )
+        self.assertEqual(
+            json.loads(actions[1][0]),
+            {'index': {'_index': 'foo'}}
+        )
+        self.assertEqual(actions[1][1], b'{"foo": "baz"}')
+
+    def test_id_field_invalid(self):
+        failures = []
+        actions = list(document_actions(
+            [b'{"id": 1}\n', b'{"id": \n', b'[1, 2]\n'],
+            'foo',
+            id_field='id',
+            on_failure=lambda line, reason: failures.append(line)
+        ))
+
+        self.assertEqual(len(actions), 1)
+        self.assertEqual(failures, [b'{"id":', b'[1, 2]'])
+
+
+class TestBulkLoader(TestCase):
+    def actions(self, count):
+        return document_actions(
+            ['{{"n": {}}}'.format(n).encode('utf-8') for n in range(count)],
+            'foo'
+        )
+
+    def test_batches(self):
+        loader = BulkLoader(MagicMock(), batch_docs=2, batch_bytes=1000)
+
+        self.assertEqual(
+            [len(batch) for batch in loader.batches(self.actions(5))],
+            [2, 2, 1]
+        )
+
+    def test_retry_and_dead_letter(self):
+        es = MagicMock()
+        es.bulk.side_effect = [
+            bulk_response(201, 429, 400),
+            bulk_response(201),
+        ]
+        dead_letter = io.StringIO()
+        loader = BulkLoader(es, backoff=0, dead_letter=dead_letter,
+                            concurrency=AdaptiveConcurrency(initial=1))
+
+        summary = loader.run(self.actions(3))
+
+        self.assertEqual(summary.get('documents'), 2)
+        self.assertEqual(summary.get('failures'), 1)
+        self.assertEqual(summary.get('retries'), 1)
+        self.assertEqual(
+            es.bulk.call_args[1].get('body'),
+            b'{"index":{"_index":"foo"}}\n{"n": 1}\n'
+        )
+        failure = json.loads(dead_letter.getvalue())
+        self.assertEqual(failure.get('status'), 400)
+        self.assertEqual(failure.get('document'), '{"n": 2}')
+
+
+def rename_foo(document):
+    if document.get('drop'):
+        return None
+    if document.get('list'):
+        return [document]
+    if document.get('set'):
+        return {'bar': {1, 2}}
+    document['bar'] = document.pop('foo')
+    return document
+
+
+class TestTransformStage(TestCase):
+    def test_ordered(self):
+        stage = TransformStage('bulk_test:rename_foo', 'idx', id_field='id',
+                               workers=2, batch_size=3, ordered=True)
+        failures = []
+        stage.on_failure = lambda line, reason: failures.append(reason)
+        lines = [
+            '{{"id": {}, "foo": {}}}'.format(n, n).encode('utf-8')
+            for n in range(20)
+        ] + [b'{"drop": true}', b'{"id": 99}', b'{"list": true}',
+             b'{"set": true}']
+
+        actions = list(stage.run(lines))
+
+        self.assertEqual(
+            [json.loads(source).get('bar') for action, source in actions],
+            list(range(20))
+        )
+        self.assertEqual(
+            json.loads(actions[3][0]),
+            {'index': {'_index': 'idx', '_id': 3}}
+        )
+        self.assertEqual(len(failures), 3)
+        self.assertTrue(failures[0].startswith('KeyError'))
+        self.assertTrue(failures[1].startswith('TypeError'))
+
+    def test_load_callable(self):
+        self.assertIs(load_callable('json:dumps'), json.dumps)
+        self.assertIs(load_callable('json.dumps'), json.dumps)
+        with self.assertRaises(ValueError):
+            load_callable('dumps')
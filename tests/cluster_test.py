@@ -1,5 +1,16 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import yaml
+
 import escli.cluster
+import escli.main
+import escli.settings
 from base_test_class import EscliTestCase
+from escli.utils import index_batches
 
 
 class TestClusterHealth(EscliTestCase):
@@ -40,3 +51,206 @@ class TestClusterHealth(EscliTestCase):
             self.cluster_health.colorize_cluster_status('red')[0],
             '\x1b[91m'
         )
+
+    def test_wait_for_status_timeout(self):
+        health = self.MockClass._es.cluster.health
+        health.return_value = dict(self.fixture(), timed_out=True)
+        parsed_args = self.cluster_health.get_parser('health').parse_args(
+            ['--wait-for-status', 'green', '--timeout', '1m']
+        )
+
+        self.cluster_health.take_action(parsed_args)
+
+        health.assert_called_once_with(
+            wait_for_status='green',
+            timeout='1m',
+            request_timeout=90.0,
+            ignore=408
+        )
+        self.assertEqual(self.cluster_health.exit_code, 1)
+
+    def test_watch_redraws_changes(self):
+        health = self.MockClass._es.cluster.health
+        health.side_effect = [
+            dict(self.fixture(), relocating_shards=2, timed_out=True),
+            dict(self.fixture(), relocating_shards=0, timed_out=False),
+        ]
+        self.app.stdout = io.StringIO()
+        parsed_args = self.cluster_health.get_parser('health').parse_args(
+            ['--watch', '--wait-for-no-relocating', '--interval', '5']
+        )
+
+        self.assertEqual(self.cluster_health.run(parsed_args), 0)
+
+        self.assertEqual(health.call_args[1].get('ignore'), 408)
+        self.assertEqual(
+            health.call_args[1].get('timeout'),
+            '5s'
+        )
+        output = self.app.stdout.getvalue().splitlines()
+        self.assertIn('relocating_shards : 2', output)
+        self.assertIn('relocating_shards : 2 -> 0', output[-1])
+        self.assertEqual(len(output), len(self.fixture()))
+
+    def test_watch_fractional_interval(self):
+        health = self.MockClass._es.cluster.health
+        health.return_value = dict(self.fixture(), timed_out=False)
+        self.app.stdout = io.StringIO()
+        parsed_args = self.cluster_health.get_parser('health').parse_args(
+            ['--watch', '--wait-for-status', 'green', '--interval', '0.5']
+        )
+
+        self.assertEqual(self.cluster_health.run(parsed_args), 0)
+        self.assertEqual(health.call_args[1].get('timeout'), '500ms')
+
+
+class TestClusterAllocationExplainAll(EscliTestCase):
+    def setUp(self):
+        super()._setUp()
+        self.MockClass._es.cat.shards.return_value = [
+            {'index': 'foo', 'shard': '0', 'prirep': 'r',
+             'state': 'UNASSIGNED'},
+            {'index': 'foo', 'shard': '0', 'prirep': 'p',
+             'state': 'UNASSIGNED'},
+            {'index': 'foo', 'shard': '1', 'prirep': 'r',
+             'state': 'UNASSIGNED'},
+            {'index': 'foo', 'shard': '1', 'prirep': 'p', 'state': 'STARTED'},
+            {'index': 'bar', 'shard': '0', 'prirep': 'r',
+             'state': 'UNASSIGNED'},
+        ]
+        self.MockClass._es.cluster.allocation_explain.side_effect = \
+            self.fixture
+        self.explain = escli.cluster.ClusterAllocationExplain(self.app, {})
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def fixture(self, body, filter_path):
+        if body.get('primary'):
+            return {'allocate_explanation': 'no valid shard copy'}
+
+        return {'node_allocation_decisions': [
+            {'node_name': 'node-{}'.format(n), 'deciders': [{
+                'decider': 'same_shard',
+                'explanation': 'already allocated to this node '
+                '[[{}][{}], node[id-{}], [P], s[STARTED]]'.format(
+                    body.get('index'), body.get('shard'), n)
+            }]} for n in range(3)
+        ]}
+
+    def test_grouped_by_cause(self):
+        parsed_args = self.explain.get_parser('explain').parse_args(
+            ['--all', '--workers', '2']
+        )
+
+        _, rows = self.explain.take_action(parsed_args)
+
+        self.assertEqual(list(rows), [
+            ('-', 'no valid shard copy', 2, 1, 'foo[0]'),
+            ('same_shard', 'already allocated to this node [...]', 2, 2,
+             'foo[1]'),
+        ])
+        self.assertEqual(
+            self.MockClass._es.cluster.allocation_explain.call_count,
+            3
+        )
+
+
+class TestClusterSettingsApply(TestCase):
+    def setUp(self):
+        self.patcher = patch('escli.settings.Escli')
+        self.MockClass = self.patcher.start()
+        self.MockClass._es.cluster.get_settings.return_value = {
+            'transient': {'cluster': {'routing': {'allocation': {
+                'enable': 'all'
+            }}}}
+        }
+        self.MockClass._es.indices.get_settings.return_value = {
+            'foo-1': {'settings': {'index.refresh_interval': '1s'}},
+            'foo-2': {'settings': {'index.refresh_interval': '1s'}},
+            'foo-3': {'settings': {}},
+        }
+        escli.settings.ClusterSettings.invalidate()
+        self.directory = tempfile.TemporaryDirectory()
+        self.apply = escli.cluster.ClusterSettingsApply(
+            escli.main.Escli(), {}
+        )
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.directory.cleanup()
+        escli.settings.ClusterSettings.invalidate()
+
+    def test_apply_and_revert(self):
+        settings_path = os.path.join(self.directory.name, 'settings.yml')
+        revert_path = os.path.join(self.directory.name, 'revert.yml')
+        with open(settings_path, 'w') as settings_file:
+            settings_file.write(
+                'transient:\n'
+                '  cluster.routing.allocation:\n'
+                '    enable: primaries\n'
+                '    node_concurrent_recoveries: 8\n'
+                'indices:\n'
+                '  foo-*:\n'
+                '    index.refresh_interval: 30s\n'
+            )
+        parsed_args = self.apply.get_parser('apply').parse_args([
+            '-f', settings_path,
+            '--revert-file', revert_path,
+            'cluster.routing.rebalance.enable=none'
+        ])
+
+        with patch('sys.stdout', new_callable=io.StringIO):
+            self.assertEqual(self.apply.take_action(parsed_args), 0)
+
+        self.MockClass._es.cluster.put_settings.assert_called_once_with(
+            body={'transient': {
+                'cluster.routing.allocation.enable': 'primaries',
+                'cluster.routing.allocation.node_concurrent_recoveries': 8,
+                'cluster.routing.rebalance.enable': 'none',
+            }}
+        )
+        self.MockClass._es.indices.put_settings.assert_called_once_with(
+            index='foo-*',
+            body={'index.refresh_interval': '30s'},
+            flat_settings=True
+        )
+
+        with open(revert_path) as revert_file:
+            revert = yaml.safe_load(revert_file)
+        self.assertEqual(revert.get('transient'), {
+            'cluster.routing.allocation.enable': 'all',
+            'cluster.routing.allocation.node_concurrent_recoveries': None,
+            'cluster.routing.rebalance.enable': None,
+        })
+        self.assertEqual(revert.get('indices'), {
+            'foo-1,foo-2': {'index.refresh_interval': '1s'},
+            'foo-3': {'index.refresh_interval': None},
+        })
+
+    def test_revert_on_pattern(self):
+        revert_path = os.path.join(self.directory.name, 'revert.yml')
+        self.MockClass._es.indices.get_settings.return_value = {
+            'foo-1': {'settings': {'index.refresh_interval': '1s'}},
+            'foo-2': {'settings': {'index.refresh_interval': '1s'}},
+        }
+        parsed_args = self.apply.get_parser('apply').parse_args([
+            '--index', 'foo-*',
+            '--revert-file', revert_path,
+            'index.refresh_interval=30s'
+        ])
+
+        with patch('sys.stdout', new_callable=io.StringIO):
+            self.assertEqual(self.apply.take_action(parsed_args), 0)
+
+        with open(revert_path) as revert_file:
+            revert = yaml.safe_load(revert_file)
+        self.assertEqual(revert.get('indices'), {
+            'foo-*': {'index.refresh_interval': '1s'},
+        })
+
+    def test_index_batches(self):
+        self.assertEqual(
+            list(index_batches(['foo-1', 'foo-2', 'foo-3'], max_length=11)),
+            ['foo-1,foo-2', 'foo-3']
+        )
@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import escli
+from escli.commands import CommandIndex, IndexedCommand
+
+
+class TestCommandIndex(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'escli-commands.json')
+        self.patcher = patch.object(
+            CommandIndex,
+            'scan',
+            return_value=self.commands_fixture()
+        )
+        self.scan = self.patcher.start()
+        self.key_patcher = patch.object(
+            CommandIndex,
+            'installed_key',
+            return_value='1.0-abcd'
+        )
+        self.installed_key = self.key_patcher.start()
+
+    def tearDown(self):
+        self.key_patcher.stop()
+        self.patcher.stop()
+        self.directory.cleanup()
+
+    def commands_fixture(self):
+        return {
+            'cat shards': 'escli.cat:CatShards',
+            'cluster health': 'escli.cluster:ClusterHealth',
+            'cluster stats': 'escli.cluster:ClusterStats',
+        }
+
+    def test_built_on_first_run(self):
+        CommandIndex('escli', path=self.path)
+        CommandIndex('escli', path=self.path)
+
+        self.assertEqual(self.scan.call_count, 1)
+        with open(self.path) as index_file:
+            self.assertEqual(
+                json.load(index_file).get('commands'),
+                self.commands_fixture()
+            )
+
+    def test_rebuilt_on_version_change(self):
+        with open(self.path, 'w') as index_file:
+            json.dump({'key': '0.0-abcd', 'commands': {'foo': 'bar:Baz'}},
+                      index_file)
+
+        index = CommandIndex('escli', path=self.path)
+
+        self.assertEqual(self.scan.call_count, 1)
+        self.assertNotIn('foo', index.commands)
+        with open(self.path) as index_file:
+            self.assertEqual(json.load(index_file).get('key'), '1.0-abcd')
+
+    def test_rebuilt_on_entry_points_change(self):
+        CommandIndex('escli', path=self.path)
+        # Same version, a command was added
+        self.installed_key.return_value = '1.0-ef01'
+        CommandIndex('escli', path=self.path)
+        CommandIndex('escli', path=self.path)
+
+        self.assertEqual(self.scan.call_count, 2)
+
+    @patch('importlib.metadata.distribution')
+    def test_installed_key(self, distribution):
+        distribution.return_value.version = '1.0'
+        distribution.return_value.read_text.return_value = \
+            '[escli]\ncluster health = escli.cluster:ClusterHealth\n'
+        self.key_patcher.stop()
+        index = CommandIndex('escli', path=self.path)
+        key = index.installed_key()
+
+        # Same version, a command was added
+        distribution.return_value.read_text.return_value += \
+            'cluster stats = escli.cluster:ClusterStats\n'
+        added_key = index.installed_key()
+
+        distribution.side_effect = ValueError('not installed')
+        sources_key = index.installed_key()
+        self.key_patcher.start()
+
+        self.assertTrue(key.startswith('1.0-'))
+        self.assertEqual(len(key.rsplit('-', 1)[1]), 40)
+        self.assertNotEqual(added_key, key)
+        self.assertEqual(sources_key, escli.__version__)
+
+    def test_complete(self):
+        index = CommandIndex('escli', path=self.path)
+        index.add('complete', 'cliff.complete:CompleteCommand')
+
+        self.assertEqual(
+            index.complete('cluster'),
+            ['cluster health', 'cluster stats']
+        )
+        self.assertEqual(
+            index.complete('c'),
+            ['cat shards', 'cluster health', 'cluster stats', 'complete']
+        )
+        self.assertEqual(index.complete('node'), [])
+        self.assertEqual(len(index.complete('')), 4)
+
+    def test_indexed_command_load(self):
+        command = IndexedCommand('cat shards', 'escli.cat:CatShards')
+
+        self.assertEqual(command.load().__name__, 'CatShards')
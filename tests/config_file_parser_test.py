@@ -0,0 +1,88 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from escli.utils import ConfigFileParser
+
+
+CONFIG = """
+clusters:
+  bar:
+    servers:
+    - https://bar.example.com
+
+users:
+  john-doe:
+    username: john
+    password: doe
+
+contexts:
+  foo:
+    user: john-doe
+    cluster: bar
+
+default-context: foo
+"""
+
+
+class TestConfigFileParser(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.parser = self.config_file_parser()
+
+        with open(self.parser.path, 'w') as config_file:
+            config_file.write(CONFIG)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def config_file_parser(self):
+        parser = ConfigFileParser()
+        parser.path = os.path.join(self.directory.name, '.esclirc')
+        parser.cache_path = os.path.join(self.directory.name, 'esclirc.cache')
+        return parser
+
+    def test_get_context_informations(self):
+        self.parser.load_configuration()
+        context = self.parser.get_context_informations('foo')
+
+        self.assertEqual(getattr(self.parser, 'default-context'), 'foo')
+        self.assertEqual(context.user.get('username'), 'john')
+        self.assertEqual(
+            context.cluster.get('servers'),
+            ['https://bar.example.com']
+        )
+
+    def test_unknown_context(self):
+        self.parser.load_configuration()
+
+        with self.assertRaises(AttributeError):
+            self.parser.get_context_informations('baz')
+
+    def test_cache_is_used(self):
+        self.parser.load_configuration()
+
+        parser = self.config_file_parser()
+        with patch.object(ConfigFileParser, 'parse') as parse:
+            parser.load_configuration()
+
+        parse.assert_not_called()
+        self.assertEqual(parser.get_context_informations('foo').name, 'foo')
+
+    def test_cache_is_private(self):
+        self.parser.load_configuration()
+
+        self.assertEqual(os.stat(self.parser.cache_path).st_mode & 0o777,
+                         0o600)
+
+    def test_cache_is_invalidated(self):
+        self.parser.load_configuration()
+
+        with open(self.parser.path, 'a') as config_file:
+            config_file.write('\nsettings:\n  no_check_certificate: true\n')
+
+        parser = self.config_file_parser()
+        parser.load_configuration()
+
+        self.assertEqual(parser.settings, {'no_check_certificate': True})
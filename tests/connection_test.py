@@ -0,0 +1,125 @@
+from decimal import Decimal
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+
+from elasticsearch import ConnectionTimeout
+from escli.connection import create_client, LeastLatencySelector, \
+    TimedConnection
+from escli.serializers import OrjsonSerializer, orjson
+
+
+class FakeConnection:
+    def __init__(self, latency):
+        self.latency = latency
+
+
+class TestLeastLatencySelector(TestCase):
+    def test_select_unmeasured_first(self):
+        connections = [FakeConnection(0.1), FakeConnection(None)]
+        selector = LeastLatencySelector({})
+
+        self.assertIs(selector.select(connections), connections[1])
+
+    def test_select_fastest(self):
+        connections = [
+            FakeConnection(0.3),
+            FakeConnection(0.1),
+            FakeConnection(0.2),
+        ]
+        selector = LeastLatencySelector({})
+        selector.probe_rate = 0
+
+        self.assertIs(selector.select(connections), connections[1])
+
+    def test_select_within_tolerance(self):
+        connections = [
+            FakeConnection(0.1),
+            FakeConnection(0.11),
+            FakeConnection(0.2),
+        ]
+        selector = LeastLatencySelector({})
+        selector.probe_rate = 0
+
+        self.assertEqual(
+            set(selector.select(connections) for _ in range(100)),
+            set(connections[:2])
+        )
+
+    def test_probe(self):
+        connections = [FakeConnection(0.1), FakeConnection(0.5)]
+        selector = LeastLatencySelector({})
+        selector.probe_rate = 1
+
+        self.assertIn(
+            connections[1],
+            [selector.select(connections) for _ in range(100)]
+        )
+
+
+class TestTimedConnection(TestCase):
+    @patch('escli.connection.Urllib3HttpConnection.perform_request')
+    def test_failed_requests_not_timed(self, perform_request):
+        connection = TimedConnection()
+        perform_request.side_effect = ConnectionTimeout(
+            'TIMEOUT', 'timed out', None
+        )
+
+        with self.assertRaises(ConnectionTimeout):
+            connection.perform_request('GET', '/')
+        self.assertIsNone(connection.latency)
+
+        perform_request.side_effect = None
+        connection.perform_request('GET', '/')
+        self.assertIsNotNone(connection.latency)
+
+
+class TestCreateClient(TestCase):
+    def test_every_server_is_used(self):
+        client = create_client({
+            'servers': ['http://node-1:9200', 'http://node-2:9200'],
+            'selector': 'least-latency',
+        })
+        pool = client.transport.connection_pool
+
+        self.assertEqual(len(pool.connections), 2)
+        self.assertIsInstance(pool.selector, LeastLatencySelector)
+        self.assertEqual(client.transport.max_retries, 1)
+
+    def test_explicit_max_retries(self):
+        client = create_client({
+            'servers': ['http://node-1:9200'],
+            'max_retries': 5,
+        })
+
+        self.assertEqual(client.transport.max_retries, 5)
+
+    def test_serializer(self):
+        client = create_client({
+            'servers': ['http://node-1:9200'],
+            'serializer': 'json',
+        })
+        self.assertNotIsInstance(
+            client.transport.serializer,
+            OrjsonSerializer
+        )
+
+        if orjson is not None:
+            client = create_client({'servers': ['http://node-1:9200']})
+            serializer = client.transport.serializer
+            self.assertIsInstance(serializer, OrjsonSerializer)
+            self.assertEqual(serializer.loads('{"a": [1]}'), {'a': [1]})
+            self.assertEqual(serializer.dumps({'a': 1}), '{"a":1}')
+            self.assertEqual(serializer.dumps('{"a": 1}'), '{"a": 1}')
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson_serializer_errors(self):
+        from elasticsearch.exceptions import SerializationError
+
+        serializer = OrjsonSerializer()
+
+        with self.assertRaises(SerializationError):
+            serializer.loads('{"a": ')
+        with self.assertRaises(SerializationError):
+            serializer.dumps({'a': object()})
+        # Types orjson does not know go through the client's converter
+        self.assertEqual(serializer.dumps({'a': Decimal('1.5')}), '{"a":1.5}')
@@ -0,0 +1,68 @@
+from unittest import TestCase
+
+from escli.hot_threads import HotThreadsProfile, parse
+
+
+SAMPLE = """::: {node-1}{aBc}{dEf}{10.0.0.1}{10.0.0.1:9300}{dimr}
+   Hot threads at 2023-01-01T00:00:00.000Z, interval=500ms, busiestThreads=2, ignoreIdleThreads=true:
+
+   50.0% [cpu=49.0%, other=1.0%] (250ms out of 500ms) cpu usage by thread 'elasticsearch[node-1][search][T#3]'
+     8/10 snapshots sharing following 3 elements
+       app//org.apache.lucene.search.TermScorer.score(TermScorer.java:65)
+       app//org.elasticsearch.search.query.QueryPhase.execute(QueryPhase.java:120)
+       java.base@17.0.2/java.lang.Thread.run(Thread.java:833)
+     unique snapshot
+       app//org.elasticsearch.search.query.QueryPhase.execute(QueryPhase.java:120)
+       java.base@17.0.2/java.lang.Thread.run(Thread.java:833)
+
+::: {node-2}{gHi}{jKl}{10.0.0.2}{10.0.0.2:9300}{dimr}
+   Hot threads at 2023-01-01T00:00:00.000Z, interval=500ms, busiestThreads=2, ignoreIdleThreads=true:
+
+   10.0% (50ms out of 500ms) cpu usage by thread 'elasticsearch[node-2][write][T#1]'
+     10/10 snapshots sharing following 2 elements
+       app//org.elasticsearch.index.engine.InternalEngine.index(InternalEngine.java:900)
+       java.base@17.0.2/java.lang.Thread.run(Thread.java:833)
+"""
+
+
+class TestHotThreads(TestCase):
+    def test_parse(self):
+        records = list(parse(SAMPLE))
+
+        self.assertEqual(
+            [(r.node, r.thread, r.usage, r.snapshots) for r in records],
+            [
+                ('node-1', 'search', 50.0, 8),
+                ('node-1', 'search', 50.0, 1),
+                ('node-2', 'write', 10.0, 10),
+            ]
+        )
+        self.assertEqual(records[0].frames, [
+            'org.apache.lucene.search.TermScorer.score',
+            'org.elasticsearch.search.query.QueryPhase.execute',
+            'java.lang.Thread.run',
+        ])
+
+    def test_profile(self):
+        profile = HotThreadsProfile()
+        profile.add(SAMPLE)
+        profile.add(SAMPLE)
+
+        self.assertEqual(list(profile.collapsed()), [
+            'search;java.lang.Thread.run;'
+            'org.elasticsearch.search.query.QueryPhase.execute 2',
+            'search;java.lang.Thread.run;'
+            'org.elasticsearch.search.query.QueryPhase.execute;'
+            'org.apache.lucene.search.TermScorer.score 16',
+            'write;java.lang.Thread.run;'
+            'org.elasticsearch.index.engine.InternalEngine.index 20',
+        ])
+        self.assertTrue(
+            next(profile.collapsed(per_node=True)).startswith('node-1;search;')
+        )
+        self.assertEqual(profile.top(limit=1), [
+            ('node-1', 'org.apache.lucene.search.TermScorer.score', 16,
+             100.0 * 16 / 18),
+            ('node-2', 'org.elasticsearch.index.engine.InternalEngine.index',
+             20, 100.0),
+        ])
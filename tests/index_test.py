@@ -0,0 +1,90 @@
+import elasticsearch
+import escli.index
+from base_test_class import EscliTestCase
+
+
+class TestIndexReindex(EscliTestCase):
+    def setUp(self):
+        super()._setUp('escli.index')
+        self.MockClass._es.tasks.get.return_value = self.fixture()
+        self.reindex = escli.index.IndexReindex(self.app, {})
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def fixture(self):
+        return {
+            'completed': True,
+            'task': {
+                'status': {
+                    'total': 10,
+                    'created': 8,
+                    'updated': 2,
+                    'batches': 1,
+                    'version_conflicts': 0,
+                    'requests_per_second': -1
+                }
+            },
+            'response': {'failures': []}
+        }
+
+    def test_follow(self):
+        task = self.reindex.follow('node:1', 0)
+
+        self.assertTrue(task.get('completed'))
+        self.MockClass._es.tasks.get.assert_called_once_with(task_id='node:1')
+
+    def test_settings_restored_when_submit_fails(self):
+        self.MockClass._es.indices.exists.return_value = True
+        self.MockClass._es.indices.get_settings.return_value = {'new': {
+            'settings': {'index.number_of_replicas': '1'}
+        }}
+        self.MockClass._es.reindex.side_effect = ValueError('rejected')
+        parsed_args = self.reindex.get_parser('reindex').parse_args(
+            ['old', 'new', '--optimize-destination']
+        )
+
+        with self.assertRaises(ValueError):
+            self.reindex.take_action(parsed_args)
+
+        self.MockClass._es.indices.put_settings.assert_called_with(
+            index='new',
+            body={'index.number_of_replicas': '1',
+                  'index.refresh_interval': None}
+        )
+
+    def test_follow_error(self):
+        self.MockClass._es.indices.exists.return_value = True
+        self.MockClass._es.indices.get_settings.return_value = {'new': {
+            'settings': {'index.number_of_replicas': '1'}
+        }}
+        self.MockClass._es.reindex.return_value = {'task': 'node:1'}
+        self.MockClass._es.tasks.get.side_effect = \
+            elasticsearch.ConnectionTimeout('TIMEOUT', 'timed out', None)
+        parsed_args = self.reindex.get_parser('reindex').parse_args(
+            ['old', 'new', '--optimize-destination']
+        )
+
+        with self.assertLogs('escli.index', 'WARNING') as logs:
+            self.assertEqual(self.reindex.take_action(parsed_args), 1)
+
+        self.assertIn('Restore new settings once done', logs.output[-1])
+        # The task keeps running, the bulk settings stay
+        self.assertEqual(
+            self.MockClass._es.indices.put_settings.call_count,
+            1
+        )
+
+    def test_swap_alias(self):
+        self.MockClass._es.indices.get_alias.return_value = {
+            'old': {'aliases': {'foo': {}}}
+        }
+
+        self.reindex.swap_alias('foo', 'new')
+
+        self.MockClass._es.indices.update_aliases.assert_called_once_with(
+            body={'actions': [
+                {'remove': {'index': 'old', 'alias': 'foo'}},
+                {'add': {'index': 'new', 'alias': 'foo'}},
+            ]}
+        )
@@ -1,5 +1,8 @@
+import io
+import json
 import unittest
 
+from escli.formatters import NDJSONFormatter
 from escli.utils import JSONFormatter
 
 
@@ -50,3 +53,41 @@ class TestCreateColumnNameFromKey(unittest.TestCase):
                 ),
                 element.get('expected_output')
             )
+
+
+class TestToLister(unittest.TestCase):
+    def test_rows_are_generated_lazily(self):
+        consumed = []
+
+        def objects():
+            for n in range(3):
+                consumed.append(n)
+                yield {'name': 'node-{}'.format(n), 'disk.percent': n}
+
+        headers, rows = JSONFormatter(objects()).to_lister(columns=[
+            ('name'),
+            ('disk.percent', 'Disk %'),
+        ])
+
+        self.assertEqual(headers, ('Name', 'Disk %'))
+        self.assertEqual(consumed, [])
+        self.assertEqual(next(rows), ('node-0', 0))
+        self.assertEqual(consumed, [0])
+        self.assertEqual(list(rows), [('node-1', 1), ('node-2', 2)])
+
+
+class TestNDJSONFormatter(unittest.TestCase):
+    def test_emit_list(self):
+        stdout = io.StringIO()
+
+        NDJSONFormatter().emit_list(
+            ('Name', 'Shards'),
+            iter([('node-0', 12), ('node-1', 3)]),
+            stdout,
+            None
+        )
+
+        self.assertEqual(
+            [json.loads(line) for line in stdout.getvalue().splitlines()],
+            [{'Name': 'node-0', 'Shards': 12}, {'Name': 'node-1', 'Shards': 3}]
+        )
@@ -0,0 +1,157 @@
+import curses
+from unittest.mock import MagicMock, patch
+
+import elasticsearch
+import escli.node
+import escli.settings
+from base_test_class import EscliTestCase
+
+
+class TestNodeDrain(EscliTestCase):
+    def setUp(self):
+        super()._setUp('escli.node')
+        self.settings_patcher = patch('escli.settings.Escli', self.MockClass)
+        self.settings_patcher.start()
+        escli.settings.ClusterSettings.invalidate()
+        self.MockClass._es.cluster.get_settings.return_value = {
+            'transient': {'cluster': {'routing': {'allocation': {
+                'exclude': {'_name': 'node-1'},
+                'node_concurrent_recoveries': '2',
+            }}}}
+        }
+        self.MockClass._es.cat.allocation.side_effect = [
+            self.fixture(10, 3000),
+            self.fixture(4, 1000),
+            self.fixture(0, 0),
+        ]
+        self.MockClass._es.cat.nodes.return_value = [
+            {'name': 'node-1'}, {'name': 'node-2'}, {'name': 'node-3'}
+        ]
+        self.drain = escli.node.NodeDrain(self.app, {})
+
+    def tearDown(self):
+        self.settings_patcher.stop()
+        self.patcher.stop()
+        escli.settings.ClusterSettings.invalidate()
+
+    def fixture(self, shards, size):
+        return [
+            {'node': 'node-2', 'shards': str(shards),
+             'disk.indices': str(size)},
+            {'node': 'node-3', 'shards': '0', 'disk.indices': '0'},
+        ]
+
+    def test_drain(self):
+        parsed_args = self.drain.get_parser('drain').parse_args([
+            'node-1', 'node-2', 'node-3',
+            '--interval', '0',
+            '--concurrent-recoveries', '8'
+        ])
+
+        self.assertEqual(self.drain.take_action(parsed_args), 0)
+
+        put_settings = self.MockClass._es.cluster.put_settings.call_args_list
+        self.assertEqual(put_settings[0][1].get('body'), {'transient': {
+            escli.node.EXCLUDE_NAME: 'node-1,node-2,node-3',
+            escli.node.NODE_CONCURRENT_RECOVERIES: 8,
+        }})
+        self.assertEqual(put_settings[1][1].get('body'), {'transient': {
+            escli.node.NODE_CONCURRENT_RECOVERIES: '2',
+        }})
+        self.assertEqual(self.MockClass._es.cat.allocation.call_count, 3)
+
+    def test_unknown_node(self):
+        parsed_args = self.drain.get_parser('drain').parse_args([
+            'node-2', 'node-22'
+        ])
+
+        self.assertEqual(self.drain.take_action(parsed_args), 1)
+        self.MockClass._es.cluster.put_settings.assert_not_called()
+        self.MockClass._es.cat.allocation.assert_not_called()
+
+    def test_timeout(self):
+        parsed_args = self.drain.get_parser('drain').parse_args([
+            'node-2', '--timeout', '0s'
+        ])
+
+        self.assertEqual(self.drain.take_action(parsed_args), 1)
+        self.assertEqual(self.MockClass._es.cat.allocation.call_count, 1)
+
+
+class TestNodeTop(EscliTestCase):
+    def setUp(self):
+        super()._setUp('escli.node')
+        self.top = escli.node.NodeTop(self.app, {})
+        self.top.sort = 1
+        self.top.reverse = True
+        self.MockClass._es.nodes.stats.return_value = {'nodes': {
+            'a': {'name': 'node-1',
+                  'indices': {'indexing': {'index_total': 10}}},
+            'b': {'name': 'node-2',
+                  'indices': {'indexing': {'index_total': 20}}},
+        }}
+        self.top.rates = escli.node.NodeRates()
+        self.top.error = None
+        self.top.curses = curses
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_lines(self):
+        self.top.poll()
+        self.MockClass._es.nodes.stats.return_value = {'nodes': {
+            'a': {'name': 'node-1',
+                  'indices': {'indexing': {'index_total': 1010}}},
+            'b': {'name': 'node-2',
+                  'indices': {'indexing': {'index_total': 30}}},
+        }}
+        lines = self.top.lines(self.top.poll(), 10, 200)
+
+        self.assertTrue(lines[0].startswith('2 nodes, sorted by Index/s'))
+        self.assertTrue(lines[1].startswith('Node'))
+        self.assertTrue(lines[2].startswith('node-1'))
+        self.assertTrue(lines[3].startswith('node-2'))
+        self.assertEqual(len(self.top.lines([], 1, 10)), 1)
+        self.assertEqual(len(self.top.lines([], 10, 10)[0]), 9)
+
+    def test_handle(self):
+        self.assertTrue(self.top.handle(ord('>')))
+        self.assertEqual(self.top.sort, 2)
+        self.assertTrue(self.top.handle(ord('<')))
+        self.assertTrue(self.top.handle(ord('<')))
+        self.assertEqual(self.top.sort, 0)
+        self.assertTrue(self.top.handle(ord('<')))
+        self.assertEqual(self.top.sort, len(self.top.HEADERS) - 1)
+        self.assertTrue(self.top.handle(ord('r')))
+        self.assertFalse(self.top.reverse)
+        self.assertFalse(self.top.handle(ord('q')))
+
+    def test_loop_keeps_interval(self):
+        screen = MagicMock()
+        screen.getmaxyx.return_value = (10, 80)
+        screen.getch.return_value = ord('q')
+        self.top.screen_lines = []
+        self.top.poll = MagicMock(return_value=[])
+
+        # The poll and the draw took 0.4s of the second
+        with patch('escli.node.time.time', side_effect=[0, 0.4]):
+            self.top.loop(screen, 1)
+
+        screen.timeout.assert_called_once_with(600)
+
+    def test_loop_poll_error(self):
+        screen = MagicMock()
+        screen.getmaxyx.return_value = (10, 80)
+        screen.getch.side_effect = [-1, ord('q')]
+        self.top.screen_lines = []
+        self.top.poll = MagicMock(side_effect=[
+            elasticsearch.ConnectionTimeout('TIMEOUT', 'timed out', None),
+            [],
+        ])
+
+        self.top.loop(screen, 1)
+
+        self.assertTrue(
+            screen.addstr.call_args_list[0][0][2].startswith('Poll failed')
+        )
+        self.assertTrue(self.top.screen_lines[0].startswith('0 nodes'))
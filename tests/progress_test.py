@@ -0,0 +1,30 @@
+from unittest import TestCase
+
+from escli.progress import Progress, format_bytes, format_duration
+
+
+class TestProgress(TestCase):
+    def test_rate_and_eta(self):
+        progress = Progress(total=1000, window=2)
+        self.assertIsNone(progress.rate)
+        self.assertIsNone(progress.eta)
+
+        progress.update(100, now=0)
+        progress.update(200, now=10)
+        progress.update(400, now=20)
+
+        self.assertEqual(progress.rate, 15)
+        self.assertEqual(progress.percent, 40)
+        self.assertEqual(progress.eta, 40)
+
+        # Only the last samples of the window are used
+        progress.update(1000, now=30)
+        self.assertEqual(progress.rate, 40)
+        self.assertEqual(progress.eta, 0)
+
+    def test_format(self):
+        self.assertEqual(format_duration(None), '-')
+        self.assertEqual(format_duration(42), '42s')
+        self.assertEqual(format_duration(3725), '1h02m05s')
+        self.assertEqual(format_bytes(512), '512.0B')
+        self.assertEqual(format_bytes(3 * 1024 * 1024), '3.0MB')
@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from escli.restart import PHASES, RestartError, RollingRestart
+
+
+class TestRollingRestart(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.directory.name, 'state.json')
+        self.es = MagicMock()
+        self.es.cluster.health.return_value = {
+            'number_of_nodes': 3,
+            'timed_out': False
+        }
+        self.start_times = {'node-1': [1, 1, 2], 'node-2': [1, 1, 2]}
+        self.es.nodes.info.side_effect = lambda node_id, **kwargs: {
+            'nodes': {'id': {'jvm': {
+                'start_time_in_millis': self.start_times[node_id].pop(0)
+            }}}
+        }
+        self.settings = MagicMock()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def restart(self, hook='true', poll=30):
+        return RollingRestart(
+            self.es,
+            self.settings,
+            hook,
+            self.state_path,
+            timeout=0,
+            poll=poll,
+            interval=0
+        )
+
+    def test_run(self):
+        timings = self.restart().run(['node-1', 'node-2'])
+
+        self.assertEqual(
+            [(node, phase) for node, phase, _ in timings],
+            [(node, phase) for node in ['node-1', 'node-2']
+             for phase in PHASES]
+        )
+        self.assertEqual(
+            [call[0] for call in self.settings.set.call_args_list],
+            [('cluster.routing.allocation.enable', 'primaries'),
+             ('cluster.routing.allocation.enable', None)] * 2
+        )
+        self.es.cluster.health.assert_any_call(
+            timeout='30s',
+            request_timeout=60,
+            ignore=408,
+            wait_for_nodes='>=3'
+        )
+        self.assertFalse(os.path.exists(self.state_path))
+
+    def test_resume(self):
+        with self.assertRaises(RestartError):
+            self.restart(hook='exit 3').run(['node-1', 'node-2'])
+
+        with open(self.state_path) as state_file:
+            state = json.load(state_file)
+        self.assertEqual(state.get('current').get('phase'), 2)
+
+        # The nodes listed by the cluster changed while node-1 was down
+        self.es.cat.nodes.return_value = [{'name': 'node-2', 'master': '*'}]
+        timings = self.restart().run()
+
+        self.assertEqual(
+            [phase for node, phase, _ in timings if node == 'node-1'],
+            list(PHASES)
+        )
+        self.assertEqual(self.es.indices.flush.call_count, 2)
+        self.es.cat.nodes.assert_not_called()
+
+    def test_resume_same_names(self):
+        with self.assertRaises(RestartError):
+            self.restart(hook='exit 3').run(['node-1', 'node-2'])
+
+        timings = self.restart().run(['node-2', 'node-1'])
+
+        self.assertEqual(
+            [phase for node, phase, _ in timings if node == 'node-1'],
+            list(PHASES)
+        )
+        self.assertEqual(self.es.indices.flush.call_count, 2)
+
+    def test_every_node(self):
+        self.es.cat.nodes.return_value = [
+            {'name': 'node-2', 'master': '*'},
+            {'name': 'node-1', 'master': '-'},
+        ]
+
+        timings = self.restart(poll=2.5).run()
+
+        self.assertEqual(
+            [node for node, phase, _ in timings if phase == 'green'],
+            ['node-1', 'node-2']
+        )
+        self.assertEqual(
+            self.es.cluster.health.call_args[1].get('timeout'),
+            '2500ms'
+        )
+
+    @patch('escli.restart.RollingRestart.restarted', return_value=False)
+    def test_timeout(self, restarted):
+        self.es.cluster.health.return_value = {
+            'number_of_nodes': 3,
+            'timed_out': True
+        }
+
+        with self.assertRaises(RestartError):
+            self.restart().run(['node-1'])
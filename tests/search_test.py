@@ -0,0 +1,151 @@
+import io
+import json
+import queue
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import elasticsearch
+
+from escli.search import SearchExporter, SlicedExport
+
+
+def page(start, stop, **kwargs):
+    return dict({
+        'hits': {
+            'hits': [{'_id': str(i), 'sort': [i]} for i in range(start, stop)]
+        }
+    }, **kwargs)
+
+
+class TestSearchExporter(TestCase):
+    def test_point_in_time(self):
+        es = MagicMock()
+        es.open_point_in_time.return_value = {'id': 'pit-1'}
+        es.search.side_effect = [
+            page(0, 2, pit_id='pit-2'),
+            page(2, 4, pit_id='pit-3'),
+            page(4, 5, pit_id='pit-4'),
+        ]
+
+        exporter = SearchExporter(es, 'foo', {}, page_size=2,
+                                  includes=['bar'])
+        hits = [hit.get('_id') for hit in exporter]
+
+        self.assertEqual(hits, ['0', '1', '2', '3', '4'])
+        self.assertEqual(exporter.pages, 3)
+
+        last_body = es.search.call_args[1].get('body')
+        self.assertEqual(last_body.get('search_after'), [3])
+        self.assertEqual(last_body.get('pit').get('id'), 'pit-3')
+        self.assertEqual(last_body.get('_source').get('includes'), ['bar'])
+        es.close_point_in_time.assert_called_once_with(body={'id': 'pit-4'})
+
+    def test_point_in_time_opened_lazily(self):
+        es = MagicMock()
+        es.open_point_in_time.return_value = {'id': 'pit-1'}
+
+        iter(SearchExporter(es, 'foo', {}))
+
+        es.open_point_in_time.assert_not_called()
+
+    def test_close_error_keeps_search_error(self):
+        es = MagicMock()
+        es.open_point_in_time.return_value = {'id': 'pit-1'}
+        es.search.side_effect = elasticsearch.TransportError(
+            500, 'search_phase_execution_exception', {}
+        )
+        es.close_point_in_time.side_effect = elasticsearch.ConnectionError(
+            'N/A', 'connection refused', None
+        )
+
+        with self.assertLogs('escli.search', 'WARNING'), \
+                self.assertRaises(elasticsearch.TransportError) as raised:
+            list(SearchExporter(es, 'foo', {}))
+
+        self.assertEqual(raised.exception.status_code, 500)
+
+    def test_scroll_fallback(self):
+        es = MagicMock()
+        es.open_point_in_time.side_effect = elasticsearch.TransportError(
+            400, 'no handler found', {}
+        )
+        es.search.return_value = page(0, 2, _scroll_id='scroll-1')
+        es.scroll.side_effect = [
+            page(2, 3, _scroll_id='scroll-2'),
+            page(3, 3, _scroll_id='scroll-2'),
+        ]
+
+        hits = [hit.get('_id') for hit in SearchExporter(es, 'foo', {},
+                                                         page_size=2)]
+
+        self.assertEqual(hits, ['0', '1', '2'])
+        es.clear_scroll.assert_called_once_with(
+            scroll_id='scroll-2',
+            ignore=(404,)
+        )
+
+
+class FakeSlicedClient:
+    def search(self, body):
+        slice_id = body.get('slice').get('id')
+        if 'search_after' in body:
+            return page(0, 0)
+        return page(slice_id * 10, slice_id * 10 + 2)
+
+
+class FakeLongSlicedClient:
+    """Slices of 20 pages of 2 hits."""
+
+    def search(self, body):
+        start = body.get('search_after', [-1])[0] + 1
+        if start >= 40:
+            return page(0, 0)
+        return page(start, start + 2)
+
+
+class TestSlicedExport(TestCase):
+    def test_merged_thread_pool(self):
+        es = MagicMock()
+        es.open_point_in_time.return_value = {'id': 'pit-1'}
+        stream = io.BytesIO()
+
+        with patch('escli.search.connection.create_client',
+                   return_value=FakeSlicedClient()):
+            statistics = SlicedExport(
+                es, {'servers': []}, {}, 'foo', {}, 3,
+                pool='thread', page_size=2
+            ).run(stream)
+
+        lines = stream.getvalue().decode('utf-8').splitlines()
+        self.assertEqual(
+            sorted(json.loads(line).get('_id') for line in lines),
+            ['0', '1', '10', '11', '20', '21']
+        )
+        self.assertEqual([s.get('docs') for s in statistics], [2, 2, 2])
+        es.close_point_in_time.assert_called_once_with(body={'id': 'pit-1'})
+
+    def test_queue_is_bounded(self):
+        es = MagicMock()
+        es.open_point_in_time.return_value = {'id': 'pit-1'}
+        queues = []
+        queue_class = queue.Queue
+
+        def bounded_queue(maxsize=0):
+            queues.append(queue_class(maxsize=maxsize))
+            return queues[-1]
+
+        class FailingStream(io.BytesIO):
+            def write(self, data):
+                raise IOError('disk full')
+
+        with patch('escli.search.connection.create_client',
+                   return_value=FakeLongSlicedClient()), \
+                patch('escli.search.queue.Queue', side_effect=bounded_queue):
+            with self.assertRaises(IOError):
+                SlicedExport(
+                    es, {'servers': []}, {}, 'foo', {}, 2,
+                    pool='thread', page_size=2
+                ).run(FailingStream())
+
+        self.assertEqual(queues[0].maxsize,
+                         2 * SlicedExport.QUEUED_PAGES_PER_SLICE)
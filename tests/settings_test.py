@@ -9,6 +9,11 @@ class TestClusterSettings(TestCase):
         self.patcher = patch('escli.settings.Escli')
         self.MockClass = self.patcher.start()
         self.MockClass._es.cluster.get_settings.return_value = self.cluster_settings_fixture()
+        escli.settings.ClusterSettings.invalidate()
+
+    def tearDown(self):
+        self.patcher.stop()
+        escli.settings.ClusterSettings.invalidate()
 
     def cluster_settings_fixture(self):
         return {
@@ -59,3 +64,100 @@ class TestClusterSettings(TestCase):
             ),
             None
         )
+
+    def test_get_many_in_one_request(self):
+        cluster_settings = escli.settings.ClusterSettings()
+
+        self.assertEqual(
+            cluster_settings.get_many([
+                'cluster.routing.allocation.node_concurrent_recoveries',
+                'cluster.routing.allocation.enable',
+                'cluster.routing.allocation.foobar',
+            ], persistency='persistent'),
+            {
+                'cluster.routing.allocation.node_concurrent_recoveries': '12',
+                'cluster.routing.allocation.enable': 'none'
+            }
+        )
+        self.MockClass._es.cluster.get_settings.assert_called_once_with(
+            filter_path=','.join([
+                'transient.cluster.routing.allocation.node_concurrent_recoveries',
+                'transient.cluster.routing.allocation.enable',
+                'transient.cluster.routing.allocation.foobar',
+                'persistent.cluster.routing.allocation.node_concurrent_recoveries',
+                'persistent.cluster.routing.allocation.enable',
+                'persistent.cluster.routing.allocation.foobar',
+            ])
+        )
+
+    def test_snapshot(self):
+        cluster_settings = escli.settings.ClusterSettings()
+        get_settings = self.MockClass._es.cluster.get_settings
+
+        cluster_settings.get('cluster.routing.allocation.enable')
+        escli.settings.ClusterSettings().get(
+            'cluster.routing.allocation.enable',
+            persistency='persistent'
+        )
+        self.assertEqual(get_settings.call_count, 1)
+
+        cluster_settings.set('cluster.routing.allocation.enable', 'all')
+        cluster_settings.get('cluster.routing.allocation.enable')
+        self.assertEqual(get_settings.call_count, 2)
+
+
+class TestIndexSettings(TestCase):
+    def setUp(self):
+        self.patcher = patch('escli.settings.Escli')
+        self.MockClass = self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_get_explicit_values(self):
+        self.MockClass._es.indices.get_settings.return_value = {
+            'foo': {'settings': {'index.number_of_replicas': '1'}},
+            'bar': {'settings': {'index.number_of_replicas': '2'}},
+        }
+
+        settings = list(
+            escli.settings.IndexSettings('_all')
+            .get('index.number_of_replicas')
+        )
+
+        self.assertEqual(
+            [(s.index, s.value) for s in settings],
+            [('bar', '2'), ('foo', '1')]
+        )
+        self.MockClass._es.indices.get_settings.assert_called_once_with(
+            index='_all',
+            name='index.number_of_replicas',
+            flat_settings=True
+        )
+
+    def test_get_defaults_when_missing(self):
+        self.MockClass._es.indices.get_settings.side_effect = [
+            {
+                'foo': {'settings': {'index.refresh_interval': '30s'}},
+                'bar': {'settings': {}},
+            },
+            {
+                'foo': {'defaults': {'index.refresh_interval': '1s'}},
+                'bar': {'defaults': {'index.refresh_interval': '1s'}},
+            },
+        ]
+
+        settings = list(
+            escli.settings.IndexSettings('_all')
+            .get('index.refresh_interval')
+        )
+
+        self.assertEqual(
+            [(s.index, s.value) for s in settings],
+            [('bar', '1s'), ('foo', '30s')]
+        )
+        self.assertEqual(
+            self.MockClass._es.indices.get_settings.call_args[1]
+            .get('filter_path'),
+            '*.defaults'
+        )
@@ -0,0 +1,358 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import elasticsearch
+
+import escli.backup
+from base_test_class import EscliTestCase
+from escli.snapshot import RecoveryFollower, RetentionRule, \
+    SnapshotFollower, SnapshotPruner, expired_snapshots, restored_indices
+
+
+def shard(node, stage, done, total):
+    return {
+        'node': node,
+        'stage': stage,
+        'stats': {
+            'processed': {'size_in_bytes': done, 'file_count': done // 10},
+            'incremental': {'size_in_bytes': total, 'file_count': total // 10},
+        }
+    }
+
+
+def status(state, shards):
+    done = sum(s['stats']['processed']['size_in_bytes']
+               for index in shards.values() for s in index.values())
+    return {'snapshots': [{
+        'state': state,
+        'stats': {
+            'processed': {'size_in_bytes': done, 'file_count': done // 10},
+            'incremental': {'size_in_bytes': 1000, 'file_count': 100},
+        },
+        'indices': dict(
+            (index, {'shards': index_shards})
+            for index, index_shards in shards.items()
+        )
+    }]}
+
+
+class TestSnapshotFollower(TestCase):
+    def test_poll(self):
+        es = MagicMock()
+        es.snapshot.status.side_effect = [
+            status('STARTED', {
+                'foo': {'0': shard('n1', 'STARTED', 100, 500),
+                        '1': shard('n2', 'STARTED', 100, 300)},
+                'bar': {'0': shard('n2', 'DONE', 200, 200)},
+            }),
+            status('STARTED', {
+                'foo': {'0': shard('n1', 'STARTED', 400, 500),
+                        '1': shard('n2', 'STARTED', 110, 300)},
+                'bar': {'0': shard('n2', 'DONE', 200, 200)},
+            }),
+        ]
+        follower = SnapshotFollower(es, 'repo', 'snap', slowest=1)
+
+        follower.poll(now=0)
+        summary = follower.poll(now=10)
+
+        self.assertEqual(summary.get('bytes'), 710)
+        self.assertEqual(summary.get('rate'), 31)
+        self.assertEqual(summary.get('eta'), 290 / 31)
+        self.assertEqual(summary.get('nodes').get('n1').get('rate'), 30)
+        self.assertEqual(summary.get('nodes').get('n2').get('bytes'), 310)
+        self.assertEqual(
+            summary.get('indices').get('foo').get('total_files'),
+            80
+        )
+        self.assertEqual(
+            [(s['index'], s['shard']) for s in summary.get('slowest')],
+            [('foo', '1')]
+        )
+        self.assertEqual(
+            es.snapshot.status.call_args[1].get('filter_path'),
+            SnapshotFollower.FILTER_PATH
+        )
+
+    def test_processed_left_out_when_done(self):
+        es = MagicMock()
+        finished = shard('n1', 'DONE', 500, 500)
+        del finished['stats']['processed']
+        es.snapshot.status.side_effect = [
+            status('STARTED', {'foo': {'0': shard('n1', 'STARTED', 400,
+                                                  500)}}),
+            {'snapshots': [{
+                'state': 'SUCCESS',
+                'stats': {'incremental': {'size_in_bytes': 500,
+                                          'file_count': 50}},
+                'indices': {'foo': {'shards': {'0': finished}}},
+            }]},
+        ]
+        follower = SnapshotFollower(es, 'repo', 'snap')
+
+        follower.poll(now=0)
+        summary = follower.poll(now=10)
+
+        self.assertEqual(summary.get('bytes'), 500)
+        self.assertEqual(summary.get('files'), 50)
+        self.assertEqual(summary.get('indices').get('foo').get('bytes'), 500)
+        self.assertEqual(summary.get('nodes').get('n1').get('rate'), 10)
+        self.assertGreaterEqual(summary.get('rate'), 0)
+
+    def test_follow_until_done(self):
+        es = MagicMock()
+        es.snapshot.status.side_effect = [
+            status('STARTED', {'foo': {'0': shard('n1', 'STARTED', 1, 2)}}),
+            status('SUCCESS', {'foo': {'0': shard('n1', 'DONE', 2, 2)}}),
+        ]
+        reports = []
+
+        summary = SnapshotFollower(es, 'repo', 'snap').follow(
+            interval=0,
+            report=reports.append
+        )
+
+        self.assertEqual(summary.get('state'), 'SUCCESS')
+        self.assertEqual(len(reports), 2)
+
+
+class TestRetention(TestCase):
+    def snapshots(self):
+        day = 86400
+        return [
+            {'id': 'nightly-{}'.format(n), 'status': 'SUCCESS',
+             'start_epoch': str(n * day - 60), 'end_epoch': str(n * day)}
+            for n in range(1, 6)
+        ] + [
+            {'id': 'hourly-1', 'status': 'SUCCESS', 'end_epoch': str(day)},
+            {'id': 'hourly-2', 'status': 'IN_PROGRESS', 'end_epoch': '0'},
+            {'id': 'manual', 'status': 'SUCCESS', 'end_epoch': '0'},
+        ]
+
+    def test_parse(self):
+        rule = RetentionRule.parse('hourly-*:keep=24,age=2d')
+
+        self.assertEqual(rule.pattern, 'hourly-*')
+        self.assertEqual(rule.keep, 24)
+        self.assertEqual(rule.max_age, 2 * 86400)
+        self.assertRaises(ValueError, RetentionRule.parse, 'foo:bar=1')
+        self.assertRaises(ValueError, RetentionRule.parse, 'nightly-*')
+        self.assertRaises(ValueError, RetentionRule.parse, 'foo:keep=x')
+        self.assertRaises(ValueError, RetentionRule.parse, 'foo:age=1y')
+
+    def test_expired(self):
+        rules = [
+            RetentionRule.parse('nightly-*:keep=3'),
+            RetentionRule.parse('hourly-*:age=1d'),
+        ]
+
+        expired = expired_snapshots(self.snapshots(), rules, now=5 * 86400)
+
+        self.assertEqual(
+            [snapshot.get('id') for snapshot, _, _ in expired],
+            ['nightly-2', 'nightly-1', 'hourly-1']
+        )
+
+
+class TestSnapshotPruner(TestCase):
+    def test_multi_delete_batches(self):
+        es = MagicMock()
+        es.info.return_value = {'version': {'number': '7.10.2'}}
+        pruner = SnapshotPruner(es, 'repo', batch_size=2)
+
+        results = list(pruner.delete(['a', 'b', 'c']))
+
+        self.assertEqual(results, [('a', None), ('b', None), ('c', None)])
+        self.assertEqual(
+            [call[1].get('snapshot') for call in
+             es.snapshot.delete.call_args_list],
+            ['a,b', 'c']
+        )
+
+    @patch('escli.snapshot.time.sleep')
+    def test_single_deletes_retry(self, sleep):
+        es = MagicMock()
+        es.info.return_value = {'version': {'number': '7.4.0'}}
+        es.snapshot.delete.side_effect = [
+            elasticsearch.TransportError(
+                503, 'concurrent_snapshot_execution_exception', {}
+            ),
+            {'acknowledged': True},
+            elasticsearch.TransportError(
+                404, 'snapshot_missing_exception', {}
+            ),
+        ]
+        pruner = SnapshotPruner(es, 'repo', workers=1)
+
+        results = dict(pruner.delete(['a', 'b']))
+
+        self.assertIsNone(results.get('a'))
+        self.assertIn('snapshot_missing_exception', results.get('b'))
+        self.assertEqual(sleep.call_count, 1)
+
+
+def recovery(shard_id, primary, recovered, total):
+    return {
+        'id': shard_id,
+        'primary': primary,
+        'stage': 'INDEX',
+        'index': {'size': {
+            'recovered_in_bytes': recovered,
+            'total_in_bytes': total
+        }},
+        'translog': {'recovered': 0, 'total': -1},
+    }
+
+
+class TestRecoveryFollower(TestCase):
+    def test_finished_shards_count_as_recovered(self):
+        es = MagicMock()
+        es.indices.recovery.side_effect = [
+            {'foo': {'shards': [recovery(0, True, 100, 400),
+                                recovery(1, True, 50, 100)]}},
+            {'foo': {'shards': [recovery(0, True, 300, 400)]}},
+        ]
+        follower = RecoveryFollower(es, ['foo'])
+
+        follower.poll(now=0)
+        summary = follower.poll(now=10)
+
+        self.assertEqual(summary.get('foo').get('active'), 1)
+        self.assertEqual(summary.get('foo').get('bytes'), 400)
+        self.assertEqual(summary.get('foo').get('rate'), 25)
+        self.assertEqual(summary.get('foo').get('eta'), 4)
+        self.assertEqual(summary.get('foo').get('translog_ops'), 0)
+        es.indices.recovery.assert_called_with(
+            index='foo',
+            active_only=True,
+            filter_path=RecoveryFollower.FILTER_PATH
+        )
+
+    def test_reached(self):
+        es = MagicMock()
+        es.cluster.health.side_effect = [
+            {'status': 'red', 'initializing_shards': 2},
+            {'status': 'yellow', 'initializing_shards': 1},
+            {'status': 'yellow', 'initializing_shards': 0},
+            {'status': 'green', 'initializing_shards': 0},
+        ]
+        follower = RecoveryFollower(es, ['foo', 'bar'])
+
+        self.assertEqual(
+            [follower.reached('yellow') for _ in range(4)],
+            [False, False, True, True]
+        )
+        self.assertEqual(es.cluster.health.call_args[1].get('index'),
+                         'foo,bar')
+        self.assertNotIn('wait_for_status', es.cluster.health.call_args[1])
+
+    def test_batches(self):
+        es = MagicMock()
+        es.indices.recovery.return_value = {}
+        es.cluster.health.return_value = {'status': 'green',
+                                          'initializing_shards': 0}
+        follower = RecoveryFollower(es, ['foo-{:04}'.format(n)
+                                         for n in range(300)])
+
+        follower.poll()
+
+        self.assertTrue(follower.reached('green'))
+        self.assertEqual(es.indices.recovery.call_count, 2)
+        self.assertEqual(es.cluster.health.call_count, 2)
+        self.assertLessEqual(
+            max(len(call[1].get('index'))
+                for call in es.indices.recovery.call_args_list),
+            2048
+        )
+
+    def test_restored_indices(self):
+        self.assertEqual(
+            restored_indices(
+                ['logs-1', 'logs-2', 'other'],
+                ['logs-*', '-logs-2'],
+                'logs-(.+)',
+                'restored-$1'
+            ),
+            ['restored-1']
+        )
+        self.assertEqual(restored_indices(['foo']), ['foo'])
+
+
+class TestSnapshotRestore(EscliTestCase):
+    def setUp(self):
+        super()._setUp('escli.backup')
+        self.restore = escli.backup.SnapshotRestore(self.app, {})
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    @patch('escli.backup.RecoveryFollower')
+    def test_replicas_after(self, follower):
+        self.MockClass._es.snapshot.get.return_value = {'snapshots': [
+            {'indices': ['logs-1', 'other']}
+        ]}
+        follower.return_value.batches = ['restored-1']
+        parsed_args = self.restore.get_parser('restore').parse_args([
+            '-r', 'repo', '--indices', 'logs-*',
+            '--rename-pattern', 'logs-(.+)',
+            '--rename-replacement', 'restored-$1',
+            '--index-setting', 'index.refresh_interval=-1',
+            '--replicas-after', '1',
+            'snap'
+        ])
+
+        with patch('builtins.print'):
+            self.restore.take_action(parsed_args)
+
+        self.assertEqual(
+            self.MockClass._es.snapshot.restore.call_args[1].get('body'),
+            {
+                'indices': 'logs-*',
+                'rename_pattern': 'logs-(.+)',
+                'rename_replacement': 'restored-$1',
+                'index_settings': {
+                    'index.refresh_interval': '-1',
+                    'index.number_of_replicas': 0
+                }
+            }
+        )
+        follower.return_value.follow.assert_called_once_with('yellow', 5)
+        self.MockClass._es.indices.put_settings.assert_called_once_with(
+            index='restored-1',
+            body={'index.number_of_replicas': 1}
+        )
+
+    @patch('escli.backup.RecoveryFollower')
+    def test_nothing_restored(self, follower):
+        self.MockClass._es.snapshot.get.return_value = {'snapshots': [
+            {'indices': ['other']}
+        ]}
+        parsed_args = self.restore.get_parser('restore').parse_args([
+            '-r', 'repo', '--indices', 'logs-*', '--follow', 'snap'
+        ])
+
+        with patch('builtins.print'), \
+                self.assertLogs('escli.backup', 'WARNING'):
+            self.restore.take_action(parsed_args)
+
+        follower.assert_not_called()
+
+
+class TestSnapshotPrune(EscliTestCase):
+    def setUp(self):
+        super()._setUp('escli.backup')
+        self.prune = escli.backup.SnapshotPrune(self.app, {})
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_invalid_rule(self):
+        parsed_args = self.prune.get_parser('prune').parse_args([
+            '-r', 'repo', '--rule', 'nightly-*'
+        ])
+
+        with self.assertLogs('escli.backup', 'CRITICAL'), \
+                self.assertRaises(SystemExit):
+            self.prune.take_action(parsed_args)
+
+        self.MockClass._es.cat.snapshots.assert_not_called()
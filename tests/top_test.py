@@ -0,0 +1,79 @@
+from unittest import TestCase
+
+from escli.top import COLUMNS, NodeRates, filter_path, format_row, \
+    format_value, sort_rows
+
+
+def stats(name, indexed, young, old, queue):
+    return {
+        'name': name,
+        'indices': {'indexing': {'index_total': indexed}},
+        'jvm': {'gc': {'collectors': {
+            'young': {'collection_time_in_millis': young},
+            'old': {'collection_time_in_millis': old},
+        }}},
+        'thread_pool': {'write': {'queue': queue}},
+    }
+
+
+class TestNodeRates(TestCase):
+    def column(self, header):
+        return [column.header for column in COLUMNS].index(header) + 1
+
+    def test_filter_path(self):
+        paths = filter_path().split(',')
+
+        self.assertIn('nodes.*.name', paths)
+        self.assertIn(
+            'nodes.*.jvm.gc.collectors.old.collection_time_in_millis',
+            paths
+        )
+
+    def test_update(self):
+        rates = NodeRates()
+        first = rates.update({'nodes': {
+            'a': stats('node-1', 1000, 100, 0, 5),
+        }}, 100.0)
+        second = rates.update({'nodes': {
+            'a': stats('node-1', 1500, 150, 50, 2),
+            'b': stats('node-2', 10, 0, 0, 0),
+        }}, 110.0)
+
+        self.assertIsNone(first[0][self.column('Index/s')])
+        self.assertEqual(first[0][self.column('WQueue')], 5)
+        node_1, node_2 = second
+        self.assertEqual(node_1[self.column('Index/s')], 50.0)
+        # Young and old collections add up
+        self.assertEqual(node_1[self.column('GC ms/s')], 10.0)
+        self.assertEqual(node_1[self.column('WQueue')], 2)
+        self.assertIsNone(node_2[self.column('Index/s')])
+
+    def test_counter_reset(self):
+        rates = NodeRates()
+        rates.update({'nodes': {'a': stats('node-1', 1000, 0, 0, 0)}}, 0.0)
+        rows = rates.update(
+            {'nodes': {'a': stats('node-1', 20, 0, 0, 0)}},
+            10.0
+        )
+
+        self.assertEqual(rows[0][self.column('Index/s')], 2.0)
+
+    def test_sort_rows(self):
+        rows = [['b', 1.0], ['a', None], ['c', 3.0]]
+
+        self.assertEqual(sort_rows(rows, 1), [['c', 3.0], ['b', 1.0],
+                                              ['a', None]])
+        self.assertEqual(sort_rows(rows, 1, reverse=False),
+                         [['b', 1.0], ['c', 3.0], ['a', None]])
+        self.assertEqual([row[0] for row in sort_rows(rows, 0)],
+                         ['a', 'b', 'c'])
+
+    def test_format(self):
+        self.assertEqual(format_value(None, 'rate'), '-')
+        self.assertEqual(format_value(2.25, 'rate'), '2.2')
+        self.assertEqual(format_value(2048, 'bytes'), '2.0KB')
+        self.assertEqual(format_value(75, 'gauge'), '75')
+
+        row = format_row(['node-1'] + [None] * len(COLUMNS), 8)
+        self.assertEqual(len(row), 8 + sum(c.width for c in COLUMNS))
+        self.assertTrue(row.startswith('node-1  '))
@@ -0,0 +1,220 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+import elasticsearch
+
+import escli.stats
+from base_test_class import EscliTestCase
+from escli.tsdb import StatsStore, filter_path, node_values
+
+
+def node_stats(indexed, heap):
+    return {
+        'cluster_name': 'test',
+        'nodes': {
+            'abcd': {
+                'name': 'node-1',
+                'indices': {'indexing': {'index_total': indexed}},
+                'jvm': {'mem': {'heap_used_percent': heap}},
+            },
+        },
+    }
+
+
+class TestStatsStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = StatsStore(os.path.join(self.directory, 'stats.sqlite'))
+        self.now = int(time.time()) // 3600 * 3600 - 3600
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def record(self, offset, indexed, heap):
+        self.store.record(
+            'test',
+            'node',
+            node_values(node_stats(indexed, heap)),
+            self.now + offset
+        )
+
+    def test_filter_path(self):
+        self.assertIn('nodes.*.indices.indexing.index_total',
+                      filter_path('node').split(','))
+        self.assertIn('indices.*.primaries.docs.count',
+                      filter_path('index').split(','))
+
+    def test_rates(self):
+        self.record(0, 1000, 50)
+        self.record(10, 1100, 60)
+        self.record(20, 1300, 40)
+
+        self.assertEqual(
+            self.store.query('node', 'indexing', self.now, self.now + 20,
+                             step=10),
+            [(self.now + 10, 'node-1', 10.0), (self.now + 20, 'node-1', 20.0)]
+        )
+        # Gauges average over the time they cover
+        self.assertEqual(
+            self.store.query('node', 'heap.percent', self.now,
+                             self.now + 20, step=20),
+            [(self.now, 'node-1', 60.0), (self.now + 20, 'node-1', 40.0)]
+        )
+
+    def test_counter_reset(self):
+        self.record(0, 1000, 50)
+        self.record(10, 100, 50)
+
+        self.assertEqual(
+            self.store.query('node', 'indexing', self.now, self.now + 10,
+                             step=10),
+            [(self.now + 10, 'node-1', 10.0)]
+        )
+
+    def test_downsampling(self):
+        self.record(0, 0, 50)
+        for sample in range(1, 13):
+            self.record(sample * 10, sample * 60, 50)
+
+        # One minute buckets hold the sum of their samples
+        self.assertEqual(
+            self.store.resolution(self.now, self.now + 120, 60),
+            60
+        )
+        self.assertEqual(
+            self.store.query('node', 'indexing', self.now, self.now + 120,
+                             step=60),
+            [(self.now, 'node-1', 6.0), (self.now + 60, 'node-1', 6.0),
+             (self.now + 120, 'node-1', 6.0)]
+        )
+
+    def test_resolution(self):
+        now = time.time()
+        resolution = self.store.resolution
+
+        self.assertEqual(resolution(now - 3600, now, 30), 0)
+        self.assertEqual(resolution(now - 3600, now, 7200), 3600)
+        # Raw samples are gone, minutes are finer than hours
+        self.assertEqual(resolution(now - 2 * 86400, now, 30), 60)
+        # Computed by the caller a moment before
+        self.assertEqual(resolution(now - 7 * 86400 - 1, now, 60), 60)
+        self.assertEqual(resolution(now - 30 * 86400, now, 60), 3600)
+        self.assertEqual(resolution(now - 900 * 86400, now, 60), 3600)
+
+    def test_bucket_holding_start(self):
+        self.record(0, 0, 50)
+        for sample in range(1, 13):
+            self.record(sample * 10, sample * 60, 50)
+
+        self.assertEqual(
+            self.store.query('node', 'indexing', self.now + 30,
+                             self.now + 120, step=60)[0],
+            (self.now, 'node-1', 6.0)
+        )
+
+    def test_reopen(self):
+        self.record(0, 1000, 50)
+        self.store.close()
+        self.store = StatsStore(os.path.join(self.directory, 'stats.sqlite'))
+        self.record(10, 1100, 50)
+
+        self.assertEqual(
+            self.store.query('node', 'indexing', self.now, self.now + 10,
+                             step=10),
+            [(self.now + 10, 'node-1', 10.0)]
+        )
+
+    def test_prune(self):
+        self.record(0, 1000, 50)
+        self.record(10, 1100, 50)
+        self.store.prune(self.now + 2 * 86400)
+
+        self.assertEqual(
+            self.store.connection.execute(
+                'SELECT resolution, COUNT(*) FROM samples'
+                ' GROUP BY resolution'
+            ).fetchall(),
+            [(60, 2), (3600, 2)]
+        )
+
+
+class TestStatsRecord(EscliTestCase):
+    def setUp(self):
+        super()._setUp('escli.stats')
+        self.directory = tempfile.mkdtemp()
+        self.MockClass._es.nodes.stats.side_effect = [
+            node_stats(1000, 50),
+            node_stats(1100, 50),
+        ]
+        self.record = escli.stats.StatsRecord(self.app, {})
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def test_record(self):
+        database = os.path.join(self.directory, 'stats.sqlite')
+        parsed_args = self.record.get_parser('record').parse_args([
+            '--count', '2',
+            '--interval', '0',
+            '--no-indices',
+            '--database', database
+        ])
+
+        self.record.take_action(parsed_args)
+
+        self.assertEqual(self.MockClass._es.nodes.stats.call_count, 2)
+        self.assertEqual(
+            self.MockClass._es.nodes.stats.call_args[1].get('filter_path'),
+            filter_path('node')
+        )
+        self.MockClass._es.indices.stats.assert_not_called()
+        store = StatsStore(database)
+        self.assertEqual(
+            [entity for _, entity, _ in store.query(
+                'node', 'indexing', time.time() - 60
+            )],
+            ['node-1']
+        )
+        store.close()
+
+    def test_failed_sample(self):
+        database = os.path.join(self.directory, 'stats.sqlite')
+        self.MockClass._es.nodes.stats.side_effect = [
+            node_stats(1000, 50),
+            elasticsearch.ConnectionTimeout('TIMEOUT', 'timed out', None),
+            node_stats(1100, 50),
+        ]
+        parsed_args = self.record.get_parser('record').parse_args([
+            '--count', '3',
+            '--interval', '0',
+            '--no-indices',
+            '--database', database
+        ])
+
+        with self.assertLogs('escli.stats', 'WARNING'):
+            self.record.take_action(parsed_args)
+
+        self.assertEqual(self.MockClass._es.nodes.stats.call_count, 3)
+
+
+class TestStatsQuery(EscliTestCase):
+    def setUp(self):
+        super()._setUp('escli.stats')
+        self.query = escli.stats.StatsQuery(self.app, {})
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_unknown_metric(self):
+        parsed_args = self.query.get_parser('query').parse_args([
+            'indexed', '--database', os.devnull
+        ])
+
+        with self.assertLogs('escli.stats', 'CRITICAL'), \
+                self.assertRaises(SystemExit):
+            self.query.take_action(parsed_args)